@@ -0,0 +1,152 @@
+"""
+Benchmark /api/stockdata/ latency while /api/unusual_range/ GARCH fits run concurrently.
+
+A probe issues --probes stock data requests, one every --probe-interval seconds, and
+reports p50/p99 latency in three setups:
+
+  - idle: no anomaly load.
+  - threads: --clients anomaly clients in a loop, fits on threads in the serving process
+    (the previous asyncio.to_thread behaviour; STOCKDATA_ANALYTICS_PROCESSES=0).
+  - processes: the same load, fits on the analytics process pool (--processes workers).
+
+yfinance is stubbed out and the stockdata cache is a dummy cache, so every stock data
+request reads the store and every anomaly request runs a full GARCH fit.
+
+Usage (from backend/):
+    python benchmarks/bench_analytics_load.py [--probes 200] [--clients 4] [--bars 5000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockcompass.settings")
+
+import django
+from django.conf import settings
+
+settings.CACHES["stockdata"] = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+django.setup()
+
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import setup_test_environment
+
+from stockdata.analytics import garch_fits
+from stockdata.pool import AnalyticsPool
+
+
+class InstantTicker:
+    """yf.Ticker stand-in returning a fixed daily history without waiting."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, start=None, **kwargs):
+        index = pd.date_range("2024-01-02", periods=250, freq="B", tz="America/New_York")
+        close = 100 + np.arange(len(index), dtype=float)
+        data = pd.DataFrame(
+            {"Open": close, "High": close, "Low": close, "Close": close, "Volume": [1000] * len(index)},
+            index=index,
+        )
+        if start is not None:
+            data = data[data.index.tz_localize(None) >= pd.Timestamp(start)]
+        return data
+
+    def get_cashflow(self, freq="yearly"):
+        return pd.DataFrame({"2024-09-30": [1.0e9]}, index=["FreeCashFlow"])
+
+    def get_incomestmt(self):
+        return pd.DataFrame({"2024-09-30": [6.0, 4.0e9, 2.0e9]}, index=["BasicEPS", "TotalRevenue", "GrossProfit"])
+
+
+def anomaly_body(bars, seed):
+    rng = np.random.default_rng(seed)
+    scale = np.where(np.arange(bars) % 100 < 10, 3.0, 1.0)
+    prices = 100 + np.cumsum(rng.normal(0, 1, bars) * scale)
+    time_axis = np.datetime64("2000-01-03") + np.arange(bars)
+    return {"data": {"time": time_axis.astype(str).tolist(), "price": prices.tolist()}}
+
+
+async def anomaly_client(client, body, stop):
+    while not stop.is_set():
+        response = await client.post("/api/unusual_range/", body, content_type="application/json")
+        assert response.status_code in (200, 500), response.content
+
+
+async def probe(client, probes, interval):
+    latencies = []
+    for i in range(probes):
+        started = time.perf_counter()
+        response = await client.get(f"/api/stockdata/?stockname=P{i % 10}&period=1y&interval=1d")
+        assert response.json()["status_code"] == 200, response.content
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(max(interval - latencies[-1], 0))
+    return latencies
+
+
+async def measure(args, clients):
+    client = AsyncClient()
+    stop = asyncio.Event()
+    load = [
+        asyncio.create_task(anomaly_client(client, anomaly_body(args.bars, seed), stop))
+        for seed in range(clients)
+    ]
+    try:
+        return await probe(client, args.probes, args.probe_interval)
+    finally:
+        stop.set()
+        await asyncio.gather(*load)
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<22} p50 {p50 * 1000:8.1f} ms   p99 {p99 * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--bars", type=int, default=5000)
+    parser.add_argument("--processes", type=int, default=2)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"{args.probes} probes, {args.clients} anomaly clients x {args.bars} bars, {os.cpu_count()} CPUs")
+        with mock.patch("stockdata.utils.yf.Ticker", InstantTicker):
+            asyncio.run(measure(args, 0))  # store the probe tickers first
+            report("idle", asyncio.run(measure(args, 0)))
+
+            pools = [
+                ("threads", AnalyticsPool(processes=0, max_pending=64, timeout=120)),
+                (f"processes ({args.processes})", AnalyticsPool(
+                    processes=args.processes, max_pending=64, timeout=120, niceness=settings.STOCKDATA_ANALYTICS_NICENESS
+                )),
+            ]
+            for label, pool in pools:
+                pool.warm_up()
+                garch_fits.pool = pool
+                try:
+                    report(label, asyncio.run(measure(args, args.clients)))
+                    stats = pool.stats()
+                    print(f"{'':<22} {stats['completed']} fits, queue wait p99 {stats['wait_p99'] * 1000:.1f} ms")
+                finally:
+                    pool.shutdown()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Concurrency benchmark for /api/stockdata/: WSGI worker threads vs. native async under ASGI.
+
+yfinance is replaced by a stub that blocks for --latency seconds per call, like a real
+upstream round trip. Every request asks for a different ticker, so neither the response
+cache nor single-flight coalescing kicks in and every request waits on "upstream".
+
+  - WSGI: django.test.Client driven by a pool of --workers threads; a worker is held for
+    the whole upstream wait, as with a threaded WSGI server.
+  - ASGI: django.test.AsyncClient, all requests in flight on one event loop through the
+    ASGI handler.
+
+Usage (from backend/):
+    python benchmarks/bench_asgi.py [--requests 200] [--workers 8] [--latency 1.0]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockcompass.settings")
+
+import django
+from django.conf import settings
+
+# A file-backed test database, so WSGI worker threads can write concurrently.
+settings.DATABASES["default"]["TEST"] = {"NAME": os.path.join(tempfile.mkdtemp(), "bench.sqlite3")}
+settings.DATABASES["default"]["OPTIONS"] = {"timeout": 60}
+django.setup()
+
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+
+
+class SlowTicker:
+    """yf.Ticker stand-in whose calls block like network round trips."""
+
+    latency = 1.0
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def history(self, **kwargs):
+        time.sleep(self.latency)
+        index = pd.date_range("2025-01-02", periods=20, freq="B", tz="America/New_York")
+        close = [100.0 + i for i in range(len(index))]
+        return pd.DataFrame(
+            {"Open": close, "High": close, "Low": close, "Close": close, "Volume": [1000] * len(index)},
+            index=index,
+        )
+
+    def get_cashflow(self, freq="yearly"):
+        time.sleep(self.latency)
+        return pd.DataFrame({"2024-09-30": [1.0e9]}, index=["FreeCashFlow"])
+
+    def get_incomestmt(self):
+        time.sleep(self.latency)
+        return pd.DataFrame({"2024-09-30": [6.0, 4.0e9, 2.0e9]}, index=["BasicEPS", "TotalRevenue", "GrossProfit"])
+
+
+def path(prefix, i):
+    return f"/api/stockdata/?stockname={prefix}{i}&period=1mo&interval=1d"
+
+
+def run_wsgi(requests, workers):
+    client = Client()
+
+    def call(i):
+        started = time.perf_counter()
+        response = client.get(path("W", i))
+        assert response.status_code == 200 and response.json()["status_code"] == 200, response.content
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(call, range(requests)))
+
+
+async def run_asgi(requests):
+    client = AsyncClient()
+
+    async def call(i):
+        started = time.perf_counter()
+        response = await client.get(path("A", i))
+        assert response.status_code == 200 and response.json()["status_code"] == 200, response.content
+        return time.perf_counter() - started
+
+    return await asyncio.gather(*(call(i) for i in range(requests)))
+
+
+def report(label, requests, elapsed, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<22} {requests / elapsed:8.1f} req/s   p50 {p50:6.2f} s   p99 {p99:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    SlowTicker.latency = args.latency
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"{args.requests} requests, upstream latency {args.latency}s per call")
+        with mock.patch("stockdata.utils.yf.Ticker", SlowTicker):
+            started = time.perf_counter()
+            latencies = run_wsgi(args.requests, args.workers)
+            report(f"WSGI ({args.workers} threads)", args.requests, time.perf_counter() - started, latencies)
+
+            started = time.perf_counter()
+            latencies = asyncio.run(run_asgi(args.requests))
+            report("ASGI (async views)", args.requests, time.perf_counter() - started, latencies)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
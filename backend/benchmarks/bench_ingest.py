@@ -0,0 +1,165 @@
+"""
+Benchmark the StockData ingest path: derived columns + DB write, in rows/sec.
+
+Compares three paths:
+
+  - row-wise: the original path (DataFrame.apply for pe, dict mappings for the yearly
+    fundamentals, one StockData instance per row via iterrows, one bulk_create).
+  - vectorized: the same derivation column-wise (derive_bar_columns, and
+    fundamental_columns joining the yearly figures onto every bar) + bar_rows +
+    upsert_bar_rows.
+  - fundamentals split: the current ingest, which stores price-derived columns only;
+    fundamentals live in their own table and are joined at read time.
+
+StockData no longer has the fundamentals columns, so the first two paths compute them as
+they did and store the remaining columns. Runs against a throwaway test database created
+from the project settings.
+
+Usage (from backend/):
+    python benchmarks/bench_ingest.py [--rows 200000] [--batch-size 2000]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockcompass.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from stockdata.models import StockData
+from stockdata.utils import (
+    UPSERT_FIELDS,
+    bar_rows,
+    derive_bar_columns,
+    fundamental_columns,
+    fundamentals_by_year,
+    upsert_bar_rows,
+)
+
+
+def make_history(rows):
+    index = pd.date_range("2015-01-02 09:30", periods=rows, freq="min", tz="America/New_York")
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, rows))
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close + 0.05,
+            "Low": close - 0.05,
+            "Close": close,
+            "Volume": rng.integers(1_000, 100_000, rows),
+        },
+        index=index,
+    )
+
+
+def make_statements():
+    years = pd.to_datetime([f"{year}-09-30" for year in range(2014, 2026)])
+    cashflow = pd.DataFrame([np.linspace(5e10, 1e11, len(years))], index=["FreeCashFlow"], columns=years)
+    income = pd.DataFrame(
+        [np.linspace(2, 7, len(years)), np.linspace(2e11, 4e11, len(years)), np.linspace(8e10, 1.8e11, len(years))],
+        index=["BasicEPS", "TotalRevenue", "GrossProfit"],
+        columns=years,
+    )
+    return cashflow, income
+
+
+def legacy_ingest(data, cf_df, income_stmt_df):
+    """The pre-vectorization path: dict mappings, apply(axis=1), iterrows + bulk_create."""
+    data['pct_change'] = data['Close'].pct_change(periods=-1).fillna(0) * 100
+    data['year'] = data.index.year
+    fcf_mapping = {pd.to_datetime(col).year: value for col, value in cf_df.loc["FreeCashFlow"].items()}
+    eps_mapping = {}
+    profit_margin_mapping = {}
+    for period_label, row in income_stmt_df.T.iterrows():
+        year = pd.to_datetime(period_label).year
+        eps_mapping[year] = row.get("BasicEPS", None)
+        profit_margin_mapping[year] = row["GrossProfit"] / row["TotalRevenue"]
+    data['free_cash_flow'] = data['year'].map(fcf_mapping).fillna(0)
+    data['eps'] = data['year'].map(eps_mapping)
+    data['profit_margin'] = data['year'].map(profit_margin_mapping)
+    data['market_cap'] = data['Volume'] * data['Close']
+    data['pe'] = data.apply(lambda row: 0 if (row['eps'] in [None, 0]) else row['Close'] / row['eps'], axis=1)
+    records = [
+        StockData(
+            ticker="BENCH",
+            interval="1m",
+            timestamp=timestamp.to_pydatetime().replace(tzinfo=None),
+            open_price=row['Open'],
+            high_price=row['High'],
+            low_price=row['Low'],
+            close_price=row['Close'],
+            volume=int(row['Volume']),
+            pct_change=row['pct_change'],
+            market_cap=row['market_cap'],
+        )
+        for timestamp, row in data.iterrows()
+    ]
+    StockData.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=["ticker", "interval", "timestamp"],
+        update_fields=UPSERT_FIELDS,
+    )
+
+
+def vectorized_ingest(data, cf_df, income_stmt_df, batch_size):
+    data = derive_bar_columns(data)
+    for name, values in fundamental_columns(
+        data.index.year, data['Close'], fundamentals_by_year(cf_df, income_stmt_df)
+    ).items():
+        data[name] = values
+    upsert_bar_rows(bar_rows("BENCH", "1m", data), batch_size=batch_size)
+
+
+def split_ingest(data, batch_size):
+    data = derive_bar_columns(data)
+    upsert_bar_rows(bar_rows("BENCH", "1m", data), batch_size=batch_size)
+
+
+def timed(label, func, rows):
+    StockData.objects.all().delete()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    assert StockData.objects.count() == rows
+    print(f"{label:<12} {elapsed:8.2f} s  {rows / elapsed:12,.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    # The row-wise path stores naive datetimes, which warns once per distinct value.
+    warnings.filterwarnings("ignore", message=".*received a naive datetime")
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        history = make_history(args.rows)
+        cf_df, income_stmt_df = make_statements()
+        print(f"{args.rows:,} bars, {connection.vendor}, batch size {args.batch_size}")
+        before = timed("row-wise", lambda: legacy_ingest(history.copy(), cf_df, income_stmt_df), args.rows)
+        after = timed("vectorized", lambda: vectorized_ingest(history.copy(), cf_df, income_stmt_df, args.batch_size), args.rows)
+        print(f"speedup      {before / after:8.1f}x")
+        split = timed("split", lambda: split_ingest(history.copy(), args.batch_size), args.rows)
+        print(f"split vs vectorized {after / split:5.1f}x")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark prompt compaction of fetched news: prompt tokens and latency before and after.
+
+For every fixture (a recorded get_news_gdelt result) builds the gpt-4o enhancement prompt
+three ways and reports its tokens and the time to build it:
+
+  - repr (previous): the articles DataFrame interpolated as is. pandas truncates every
+    cell to 50 characters, so the model saw little more than the links.
+  - full text: every article's whole text as link/content pairs.
+  - compacted: the most relevant sentences within each --budgets token budget
+    (compact_company_news).
+
+With --openai the enhancement request is also sent for each variant (needs API_OPENAI)
+and the end-to-end latency of the call is reported.
+
+Fixtures are JSON files in benchmarks/fixtures/ named news_*.json. Record one with:
+    python benchmarks/bench_news_compaction.py --record AAPL 2025-01-27 2025-01-31
+
+Usage (from backend/):
+    python benchmarks/bench_news_compaction.py [--budgets 500 1000 3000] [--openai]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockcompass.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from newsdata.compaction import estimate_tokens
+from newsdata.message import (
+    api_enhancement_request_openai,
+    compact_company_news,
+    enhancement_messages,
+    format_news,
+    ticker_to_company_name,
+)
+from newsdata.news_gdelt import get_news_gdelt
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def record(ticker, start, end):
+    company = ticker_to_company_name(ticker)
+    news = get_news_gdelt(company, start, end)
+    path = os.path.join(FIXTURES, f"news_{ticker}_{start}_{end}.json")
+    with open(path, "w") as f:
+        json.dump(
+            {"ticker": ticker, "company": company, "start": start, "end": end,
+             "articles": news[["url", "content"]].to_dict("records")},
+            f,
+            indent=2,
+        )
+    print(f"recorded {len(news)} articles to {path}")
+
+
+def prompt_tokens(fixture, fetched_news):
+    messages = enhancement_messages(fixture["ticker"], fixture["start"], fixture["end"], ["explanation"], [], fetched_news)
+    return int(estimate_tokens([message["content"] for message in messages]).sum())
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budgets", type=int, nargs="+", default=[500, 1000, 3000])
+    parser.add_argument("--openai", action="store_true", help="also time the gpt-4o enhancement call")
+    parser.add_argument("--record", nargs=3, metavar=("TICKER", "START", "END"))
+    args = parser.parse_args()
+
+    if args.record:
+        record(*args.record)
+        return
+
+    print(f"{'fixture':<36} {'prompt':<18} {'articles':>8} {'tokens':>8} {'build':>10} {'gpt-4o':>10}")
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "news_*.json"))):
+        with open(path) as f:
+            fixture = json.load(f)
+        news = pd.DataFrame(fixture["articles"], columns=["url", "content"])
+        variants = [
+            ("repr (previous)", len(news), *timed(lambda: f"{news}")),
+            ("full text", len(news), *timed(format_news, news)),
+        ]
+        for budget in args.budgets:
+            compacted, elapsed = timed(
+                compact_company_news, news, fixture["ticker"], fixture["company"], fixture["start"], fixture["end"], budget
+            )
+            variants.append((f"compacted ({budget})", len(compacted), format_news(compacted), elapsed))
+
+        name = os.path.basename(path)[:-5]
+        for label, articles, fetched_news, elapsed in variants:
+            latency = ""
+            if args.openai:
+                _, seconds = timed(
+                    api_enhancement_request_openai, settings.API_OPENAI, fixture["ticker"], fixture["start"],
+                    fixture["end"], ["explanation"], [], fetched_news,
+                )
+                latency = f"{seconds:.2f}s"
+            tokens = prompt_tokens(fixture, fetched_news)
+            print(f"{name:<36} {label:<18} {articles:>8} {tokens:>8} {elapsed * 1000:>8.2f}ms {latency:>10}")
+
+
+if __name__ == "__main__":
+    main()
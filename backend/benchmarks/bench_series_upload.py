@@ -0,0 +1,105 @@
+"""
+Benchmark decoding of /api/unusual_range/ series uploads: JSON vs. binary bodies.
+
+For --sizes points each, builds the same minute-bar series as a JSON body of ISO strings
+and as an application/x-price-series body, then reports the time to turn each body into
+(times, prices) arrays:
+
+  - json (per-point): orjson plus one np.datetime64 per string (the previous parser).
+  - json (vectorized): orjson plus one datetime64[ns] conversion (parse_times).
+  - raw binary: np.frombuffer views of the body (decode_series).
+  - arrow: an Arrow IPC stream (decode_series), when pyarrow is installed.
+
+Usage (from backend/):
+    python benchmarks/bench_series_upload.py [--sizes 10000 100000 1000000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockcompass.settings")
+
+import django
+
+django.setup()
+
+from stockdata.series_codec import (
+    ARROW_STREAM_CONTENT_TYPE,
+    RAW_SERIES_CONTENT_TYPE,
+    decode_series,
+    parse_times,
+)
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def make_series(size):
+    times = np.datetime64("2000-01-03T14:30") + np.arange(size) * np.timedelta64(1, "m")
+    prices = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, size))
+    return times.astype("datetime64[ms]"), prices
+
+
+def arrow_body(times, prices):
+    table = pa.table({"time": pa.array(times), "price": pa.array(prices)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def per_point(body):
+    data = orjson.loads(body)["data"]
+    return np.array([np.datetime64(t) for t in data["time"]]), np.array(data["price"], dtype=float)
+
+
+def vectorized(body):
+    data = orjson.loads(body)["data"]
+    return parse_times(data["time"]), np.asarray(data["price"], dtype=float)
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'points':>10} {'format':<20} {'body':>10} {'decode':>12}")
+    for size in args.sizes:
+        times, prices = make_series(size)
+        json_body = orjson.dumps({"data": {"time": times.astype(str).tolist(), "price": prices.tolist()}})
+        raw_body = times.astype("<i8").tobytes() + prices.astype("<f8").tobytes()
+        cases = [
+            ("json (per-point)", json_body, per_point),
+            ("json (vectorized)", json_body, vectorized),
+            ("raw binary", raw_body, lambda body: decode_series(body, RAW_SERIES_CONTENT_TYPE)),
+        ]
+        if pa is not None:
+            cases.append(
+                ("arrow", arrow_body(times, prices), lambda body: decode_series(body, ARROW_STREAM_CONTENT_TYPE))
+            )
+        for label, body, decode in cases:
+            elapsed = best_of(args.repeat, decode, body)
+            print(f"{size:>10} {label:<20} {len(body) / 1e6:>8.1f}MB {elapsed * 1000:>10.2f}ms")
+    if pa is None:
+        print("pyarrow is not installed; arrow uploads skipped")
+
+
+if __name__ == "__main__":
+    main()
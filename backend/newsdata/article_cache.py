@@ -0,0 +1,117 @@
+# newsdata/article_cache.py
+"""
+Cache of extracted article texts, shared by every news request.
+
+The same publisher URLs recur across tickers and overlapping date ranges, so texts are
+stored in the database keyed by the hash of the normalized URL. URLs that are gone or had no
+text are cached too (with no text) and only retried after ``ARTICLE_NEGATIVE_TTL``; transient
+failures are not cached. The
+cache holds at most ``ARTICLE_CACHE_MAX_ENTRIES`` entries; beyond that the least recently
+used ones are evicted.
+
+Functions here are blocking (sync ORM); the news pipeline calls them from its worker
+threads.
+"""
+import datetime
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ArticleText
+
+ARTICLE_CACHE_MAX_ENTRIES = getattr(settings, "NEWS_ARTICLE_CACHE_MAX_ENTRIES", 20000)
+ARTICLE_NEGATIVE_TTL = datetime.timedelta(seconds=getattr(settings, "NEWS_ARTICLE_NEGATIVE_TTL", 6 * 3600))
+
+# Query parameters that only track the click and never change the article.
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ocid", "cmpid", "ref", "taid"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """
+    Canonical form of an article URL: lowercase scheme and host without "www." or the
+    default port, no fragment, no tracking parameters, remaining parameters sorted and no
+    trailing slash on the path.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def url_hash(url):
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def cached_texts(urls):
+    """
+    Look up many URLs in one query and mark the hits as used.
+
+    Returns:
+        dict: url -> text (None for a negative entry that is not due for a retry yet), for
+        the URLs that do not need to be fetched.
+    """
+    hashes = {url: url_hash(url) for url in urls}
+    entries = {entry.url_hash: entry for entry in ArticleText.objects.filter(url_hash__in=set(hashes.values()))}
+    now = timezone.now()
+    hits = {}
+    for url, key in hashes.items():
+        entry = entries.get(key)
+        if entry is None:
+            continue
+        if entry.text is None and now - entry.fetched_at >= ARTICLE_NEGATIVE_TTL:
+            continue
+        hits[url] = entry.text
+    if hits:
+        ArticleText.objects.filter(url_hash__in=[hashes[url] for url in hits]).update(used_at=now)
+    return hits
+
+
+def store_texts(texts):
+    """
+    Store fetched texts (url -> text, None when the URL is gone or had no text) and evict
+    the least recently used entries beyond ``ARTICLE_CACHE_MAX_ENTRIES``.
+    """
+    if not texts:
+        return
+    now = timezone.now()
+    ArticleText.objects.bulk_create(
+        [
+            ArticleText(url_hash=url_hash(url), url=url, text=text or None, fetched_at=now, used_at=now)
+            for url, text in texts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["url_hash"],
+        update_fields=["url", "text", "fetched_at", "used_at"],
+    )
+    evict(ARTICLE_CACHE_MAX_ENTRIES)
+
+
+def evict(max_entries):
+    """
+    Delete the least recently used entries beyond ``max_entries``.
+
+    Returns:
+        int: Number of entries deleted.
+    """
+    # used_at of the oldest entry that may stay; everything used before it goes.
+    boundary = ArticleText.objects.order_by("-used_at", "-id").values_list("used_at", "id")[max_entries:max_entries + 1]
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+    used_at, entry_id = boundary[0]
+    stale = ArticleText.objects.filter(used_at__lt=used_at) | ArticleText.objects.filter(used_at=used_at, id__lte=entry_id)
+    deleted, _ = stale.delete()
+    return deleted
@@ -0,0 +1,124 @@
+# newsdata/compaction.py
+"""
+Extractive compaction of fetched news articles into a prompt token budget.
+
+Articles are split into sentences and every sentence is scored by the TF-IDF cosine
+similarity to a query made of the ticker, the company name, the months and years of the
+date window and a few terms that explain stock moves. Sentences are then packed round
+robin (every article's best sentence first, then every article's second best, ...) until
+the budget is used up, so no single long article crowds the others out. Kept sentences are
+returned in their original order.
+
+Token counts use tiktoken's gpt-4o encoding when tiktoken is installed and four characters
+per token otherwise.
+"""
+import datetime
+import math
+import re
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+PROMPT_TOKEN_BUDGET = getattr(settings, "NEWS_PROMPT_TOKEN_BUDGET", 3000)
+
+# Shorter fragments are bylines, captions and navigation rather than sentences.
+MIN_SENTENCE_CHARS = 25
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[\"'“A-Z0-9])|\s*\n+\s*")
+MOVE_TERMS = "shares stock earnings revenue profit sales guidance outlook forecast analyst upgrade downgrade"
+CORPORATE_SUFFIXES = re.compile(r"\b(inc|corp|corporation|co|company|ltd|plc|group|holdings)\b\.?", re.IGNORECASE)
+
+_encoding = None
+
+
+def estimate_tokens(texts):
+    """
+    Token counts of ``texts`` (list of str) as an int array.
+    """
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return np.array([len(tokens) for tokens in _encoding.encode_batch(list(texts))], dtype=int)
+    return np.array([math.ceil(len(text) / 4) for text in texts], dtype=int)
+
+
+def split_sentences(text):
+    return [s for s in SENTENCE_BOUNDARY.split(text.strip()) if len(s) >= MIN_SENTENCE_CHARS]
+
+
+def news_query(ticker, company, start, end):
+    """
+    Query text the sentences are scored against.
+    """
+    start, end = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+    months = pd.period_range(start, end, freq="M")
+    dates = {f"{month.strftime('%B')} {month.year}" for month in months}
+    return " ".join([ticker, CORPORATE_SUFFIXES.sub(" ", company), *sorted(dates), MOVE_TERMS])
+
+
+def compact_news(news, query, budget=None, overhead=lambda url: 0):
+    """
+    Keep the sentences of ``news`` most relevant to ``query`` within ``budget`` tokens.
+
+    Parameters:
+        news (pd.DataFrame): Articles with "url" and "content" columns (get_news_gdelt).
+        query (str): Text to score sentences against (see ``news_query``).
+        budget (int): Token budget of the whole news block (default:
+            ``NEWS_PROMPT_TOKEN_BUDGET``).
+        overhead (callable): Tokens spent on an article besides its sentences (its link and
+            separators in the prompt), given its URL.
+
+    Returns:
+        pd.DataFrame: "url" and compacted "content" of the articles with at least one kept
+        sentence, in input order.
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    empty = pd.DataFrame({"url": pd.Series(dtype=object), "content": pd.Series(dtype=object)})
+    if news.empty:
+        return empty
+
+    urls = news["url"].tolist()
+    rows = [
+        (article, position, sentence)
+        for article, text in enumerate(news["content"].tolist())
+        for position, sentence in enumerate(split_sentences(str(text)))
+    ]
+    sentences = pd.DataFrame(rows, columns=["article", "position", "sentence"])
+    # Syndicated copies of a story repeat the same sentences; keep the first one.
+    sentences = sentences.drop_duplicates("sentence", ignore_index=True)
+    if sentences.empty:
+        return empty
+
+    vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True)
+    try:
+        matrix = vectorizer.fit_transform(sentences["sentence"])
+    except ValueError:
+        # Only stop words: nothing to score.
+        return empty
+    # Rows are L2-normalized, so the dot product is the cosine similarity.
+    sentences["score"] = (matrix @ vectorizer.transform([query]).T).toarray().ravel()
+    sentences = sentences[sentences["score"] > 0].copy()
+    sentences["rank"] = sentences.groupby("article")["score"].rank(method="first", ascending=False)
+    sentences["tokens"] = estimate_tokens(sentences["sentence"]) + 1
+    sentences = sentences.sort_values(["rank", "score"], ascending=[True, False])
+
+    kept = []
+    opened = set()
+    remaining = budget
+    for article, tokens, index in zip(sentences["article"], sentences["tokens"], sentences.index):
+        cost = tokens if article in opened else tokens + overhead(urls[article])
+        if cost <= remaining:
+            remaining -= cost
+            opened.add(article)
+            kept.append(index)
+
+    kept = sentences.loc[kept].sort_values(["article", "position"])
+    contents = kept.groupby("article", sort=True)["sentence"].agg(" ".join)
+    return pd.DataFrame({"url": [urls[article] for article in contents.index], "content": contents.tolist()})
@@ -0,0 +1,245 @@
+# newsdata/explanations.py
+import asyncio
+import contextvars
+import datetime
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from stockdata.singleflight import SingleFlight
+from .message import (
+    api_data_request,
+    fetch_company_news,
+    format_news,
+    generate_data_openai,
+    stream_enhancement_openai,
+)
+from .models import NewsExplanation
+
+# Bump whenever the pipeline changes what it returns; cached results of other versions are
+# ignored.
+NEWS_PIPELINE_VERSION = 2
+
+# A cached explanation is served as is for EXPLANATION_TTL seconds. After that, and up to
+# EXPLANATION_MAX_STALE seconds, it is still served at once while a refresh runs in the
+# background; older entries are recomputed before answering.
+EXPLANATION_TTL = getattr(settings, "NEWS_EXPLANATION_TTL", 24 * 3600)
+EXPLANATION_MAX_STALE = getattr(settings, "NEWS_EXPLANATION_MAX_STALE", 7 * 24 * 3600)
+
+# Concurrent requests for the same explanation share one pipeline run.
+explanation_flight = SingleFlight("generate_explanation")
+
+# Background refreshes run on their own long-lived event loop thread: the loop of the
+# request that triggered one may not outlive its response (async_to_sync under WSGI or
+# runserver cancels leftover tasks). Refreshes are referenced until they finish.
+_refresh_loop = None
+_refresh_loop_lock = threading.Lock()
+_refreshes = set()
+# Streamed pipeline runs, referenced until they finish even if their client went away.
+_streams = set()
+
+
+def explanation_key(stock, start, end):
+    """
+    Normalized (ticker, start date, end date) of a news request.
+    """
+    return (
+        stock.strip().upper(),
+        datetime.date.fromisoformat(start.strip()),
+        datetime.date.fromisoformat(end.strip()),
+    )
+
+
+async def _load(key):
+    ticker, start, end = key
+    return await NewsExplanation.objects.filter(
+        ticker=ticker, start=start, end=end, pipeline_version=NEWS_PIPELINE_VERSION
+    ).afirst()
+
+
+async def _save(key, content):
+    """
+    Store a finished explanation (UPDATE, then INSERT if it is new).
+    """
+    ticker, start, end = key
+    entry = NewsExplanation.objects.filter(
+        ticker=ticker, start=start, end=end, pipeline_version=NEWS_PIPELINE_VERSION
+    )
+    values = {"content": content, "updated_at": timezone.now()}
+    if not await entry.aupdate(**values):
+        try:
+            await NewsExplanation.objects.acreate(
+                ticker=ticker, start=start, end=end, pipeline_version=NEWS_PIPELINE_VERSION, **values
+            )
+        except IntegrityError:
+            # A concurrent request stored it first.
+            await entry.aupdate(**values)
+
+
+async def _generate(key):
+    ticker, start, end = key
+    # The pipeline is blocking (HTTP fetches, newspaper3k, OpenAI client), so it runs in a
+    # worker thread while the event loop keeps serving other requests.
+    content = await asyncio.to_thread(
+        generate_data_openai,
+        settings.API_PER,
+        settings.API_OPENAI,
+        ticker,
+        start.isoformat(),
+        end.isoformat(),
+    )
+    await _save(key, content)
+    return content
+
+
+async def refresh_explanation(key):
+    """
+    Run the pipeline for ``key`` (coalesced with any run already in flight) and store it.
+    """
+    return await explanation_flight.do(key, _generate, key)
+
+
+def _background_loop():
+    global _refresh_loop
+    with _refresh_loop_lock:
+        if _refresh_loop is None:
+            _refresh_loop = asyncio.new_event_loop()
+            threading.Thread(target=_refresh_loop.run_forever, name="news-refresh", daemon=True).start()
+        return _refresh_loop
+
+
+def _refresh_in_background(key):
+    # Scheduled from an empty context: the request's context carries asgiref's executor for
+    # thread-sensitive ORM calls, which goes away with the response.
+    future = contextvars.Context().run(
+        asyncio.run_coroutine_threadsafe, refresh_explanation(key), _background_loop()
+    )
+    _refreshes.add(future)
+    future.add_done_callback(_refreshes.discard)
+    # A failed refresh leaves the stale entry in place; the next request retries.
+    future.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+
+async def _cached(key):
+    """
+    (content, "fresh" or "stale") of a servable cached explanation, or None. Serving a
+    stale one starts its background refresh.
+    """
+    entry = await _load(key)
+    if entry is None:
+        return None
+    age = (timezone.now() - entry.updated_at).total_seconds()
+    if age < EXPLANATION_TTL:
+        return entry.content, "fresh"
+    if age < EXPLANATION_MAX_STALE:
+        _refresh_in_background(key)
+        return entry.content, "stale"
+    return None
+
+
+async def get_explanation(stock, start, end):
+    """
+    News explanation of ``stock`` between ``start`` and ``end`` (ISO dates), served from
+    the persisted cache with stale-while-revalidate.
+
+    Returns:
+        tuple: (content, cache status: "fresh", "stale" or "miss").
+    """
+    key = explanation_key(stock, start, end)
+    cached = await _cached(key)
+    if cached is not None:
+        return cached
+    return await refresh_explanation(key), "miss"
+
+
+async def stream_explanation(stock, start, end):
+    """
+    The news pipeline as a stream of (event, data) pairs, for Server-Sent Events.
+
+    A cached explanation (fresh or stale, see ``get_explanation``) is sent as a single
+    "done" event. Otherwise Perplexity and the GDELT article search run concurrently and a
+    "stage" event is sent as each finishes, followed by one "token" event per gpt-4o text
+    delta and a final "done" event with the whole explanation, which is also cached.
+
+    The run is shared through ``explanation_flight``: a stream (or plain request) for an
+    explanation already being generated waits for that run and gets only its "done" event.
+    A run outlives a client that goes away, so the others still get, and the cache still
+    stores, its result.
+    """
+    key = explanation_key(stock, start, end)
+    cached = await _cached(key)
+    if cached is not None:
+        yield "done", {"complex": cached[0], "cache": cached[1]}
+        return
+
+    # Filled only when this stream leads the run.
+    events = asyncio.Queue()
+    run = asyncio.ensure_future(explanation_flight.do(key, _stream_generate, key, events))
+    _streams.add(run)
+    run.add_done_callback(_streams.discard)
+    run.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    while True:
+        next_event = asyncio.ensure_future(events.get())
+        try:
+            done, _ = await asyncio.wait({next_event, run}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not next_event.done():
+                next_event.cancel()
+        if next_event not in done:
+            break
+        yield next_event.result()
+    while not events.empty():
+        yield events.get_nowait()
+
+    yield "done", {"complex": run.result(), "cache": "miss"}
+
+
+async def _stream_generate(key, events):
+    """
+    Run the pipeline for ``key``, putting its "stage" and "token" events on ``events``,
+    and store the result.
+    """
+    ticker, start_date, end_date = key
+    start, end = start_date.isoformat(), end_date.isoformat()
+    # The Perplexity and GDELT/newspaper3k clients are blocking; they run in worker threads
+    # only for the duration of those calls.
+    stages = {
+        asyncio.ensure_future(asyncio.to_thread(api_data_request, settings.API_PER, ticker, start, end)): "perplexity",
+        asyncio.ensure_future(asyncio.to_thread(fetch_company_news, ticker, start, end)): "articles",
+    }
+    results = {}
+    pending = set(stages)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage = stages[task]
+                results[stage] = task.result()
+                if stage == "perplexity":
+                    events.put_nowait(("stage", {"stage": stage, "citations": len(results[stage]["citations"])}))
+                else:
+                    events.put_nowait(("stage", {"stage": stage, "articles": len(results[stage])}))
+    finally:
+        # A stage failed: drop the other one.
+        for task in pending:
+            task.cancel()
+
+    parts = []
+    async for text in stream_enhancement_openai(
+        settings.API_OPENAI,
+        ticker,
+        start,
+        end,
+        results["perplexity"]["content"],
+        results["perplexity"]["citations"],
+        format_news(results["articles"]),
+    ):
+        parts.append(text)
+        events.put_nowait(("token", {"text": text}))
+
+    content = "".join(parts)
+    await _save(key, content)
+    return content
@@ -0,0 +1,149 @@
+# newsdata/fetcher.py
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+# Publishers often refuse the default httpx agent; article downloads present a browser.
+ARTICLE_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0 Safari/537.36"
+)
+
+
+class HttpFetcher:
+    """
+    Process-wide HTTP client of the news pipeline (Perplexity and article downloads).
+
+    One ``httpx.AsyncClient`` runs on a dedicated event loop thread, so connections are
+    kept alive and reused by every request of the process, whichever thread or event loop
+    it comes from. At most ``max_connections`` requests are in flight in total and at most
+    ``max_per_host`` to any one host; the rest wait for a slot. Besides the connect and
+    read timeouts, every request has a deadline covering the wait for its slots, the
+    connection, redirects and the whole body.
+
+    The loop and the client are created on first use.
+    """
+
+    def __init__(self, max_connections, max_per_host, connect_timeout, read_timeout, deadline, transport=None):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=None)
+        self.deadline = deadline
+        self.transport = transport
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._slots = None
+        # host -> [semaphore, users]; only touched on the fetcher loop.
+        self._hosts = {}
+        self.counts = {"requests": 0, "failed": 0, "timed_out": 0}
+
+    def _start(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="news-http", daemon=True).start()
+                self._client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                    ),
+                    follow_redirects=True,
+                    transport=self.transport,
+                )
+                self._slots = asyncio.Semaphore(self.max_connections)
+                self._loop = loop
+            return self._loop
+
+    async def _send(self, method, url, deadline, kwargs):
+        host = urlsplit(url).hostname or ""
+        entry = self._hosts.setdefault(host, [asyncio.Semaphore(self.max_per_host), 0])
+        entry[1] += 1
+        self.counts["requests"] += 1
+        try:
+            # The deadline also bounds the wait for a slot. The host's slot is taken first:
+            # a request queued behind a busy host holds none of the global slots, so requests
+            # to other hosts go ahead.
+            async with asyncio.timeout(deadline or self.deadline):
+                async with entry[0], self._slots:
+                    response = await self._client.request(method, url, **kwargs)
+                    await response.aread()
+                    return response
+        except TimeoutError:
+            self.counts["timed_out"] += 1
+            raise TimeoutError(f"{method} {url} exceeded its {deadline or self.deadline}s deadline")
+        except Exception:
+            self.counts["failed"] += 1
+            raise
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._hosts[host]
+
+    def _submit(self, method, url, deadline, kwargs):
+        return asyncio.run_coroutine_threadsafe(self._send(method, url, deadline, kwargs), self._start())
+
+    def request(self, method, url, deadline=None, **kwargs):
+        """
+        Send a request from blocking code (e.g. a pipeline worker thread) and wait for it.
+        Keyword arguments are passed to ``httpx.AsyncClient.request``.
+
+        Returns:
+            httpx.Response: The response, with its body read.
+
+        Raises:
+            TimeoutError: The request did not finish within ``deadline`` seconds (default:
+                the fetcher's deadline).
+            httpx.HTTPError: Connection or protocol failure.
+        """
+        return self._submit(method, url, deadline, kwargs).result()
+
+    async def arequest(self, method, url, deadline=None, **kwargs):
+        """
+        Like ``request``, awaited from any event loop. Cancelling the caller cancels the
+        request.
+        """
+        return await asyncio.wrap_future(self._submit(method, url, deadline, kwargs))
+
+    def fetch_all(self, urls, deadline=None, **kwargs):
+        """
+        GET many URLs concurrently (within the connection limits) and wait for all of them.
+
+        Returns:
+            dict: url -> ``httpx.Response``, or the exception raised for that URL.
+        """
+        futures = {url: self._submit("GET", url, deadline, kwargs) for url in dict.fromkeys(urls)}
+        results = {}
+        for url, future in futures.items():
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                results[url] = e
+        return results
+
+    def stats(self):
+        return {
+            "max_connections": self.max_connections,
+            "max_per_host": self.max_per_host,
+            "active_hosts": len(self._hosts),
+            **self.counts,
+        }
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+
+http_fetcher = HttpFetcher(
+    max_connections=getattr(settings, "NEWS_HTTP_MAX_CONNECTIONS", 64),
+    max_per_host=getattr(settings, "NEWS_HTTP_MAX_PER_HOST", 4),
+    connect_timeout=getattr(settings, "NEWS_HTTP_CONNECT_TIMEOUT", 5.0),
+    read_timeout=getattr(settings, "NEWS_HTTP_READ_TIMEOUT", 10.0),
+    deadline=getattr(settings, "NEWS_HTTP_DEADLINE", 20.0),
+)
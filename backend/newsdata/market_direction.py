@@ -1,70 +1,301 @@
+import contextlib
 import os
+import threading
+import time
 import pandas as pd
 import numpy as np
 import asyncio
 import yfinance as yf
 import scipy.stats
 from arch import arch_model
+from django.conf import settings
+
+from stockdata.singleflight import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within the process.
+    fcntl = None
 
 #############################################
-# 1. Market Data Access and Calculation
+# 1. Market Data Store
 #############################################
 
+# Indices kept up to date by update_market_indices: the S&P 500, the Dow and the SPDR
+# sector ETFs.
+MARKET_INDICES = (
+    "^GSPC", "^DJI",
+    "XLB", "XLC", "XLE", "XLF", "XLI", "XLK", "XLP", "XLRE", "XLU", "XLV", "XLY",
+)
+
+# Stored columns and their dtypes. "time" is the session date as naive exchange wall time
+# in nanoseconds, like the stock data store.
+MARKET_COLUMNS = {
+    "time": "<i8",
+    "Open": "<f8",
+    "High": "<f8",
+    "Low": "<f8",
+    "Close": "<f8",
+    "Volume": "<f8",
+    "daily_return": "<f8",
+    "volatility": "<f8",
+}
+VOLATILITY_WINDOW = 30
+
+# Seconds before an index that ends before a requested date is downloaded again.
+MARKET_REFRESH_TTL = getattr(settings, "MARKET_DATA_REFRESH_TTL", 3600)
+
+# Serializes appends between the threads of this process; _store_lock between processes.
+_write_lock = threading.Lock()
+_loaded = {}
+# (index, root) -> monotonic time of the last download attempt by ensure_market_series.
+_refresh_attempts = {}
+market_flight = SingleFlight("market_series")
+
+
+def market_data_dir(index_symbol, root=None):
+    """
+    Directory holding the column files of one index.
+    """
+    root = root or getattr(settings, "MARKET_DATA_DIR", "market_data")
+    return os.path.join(root, index_symbol.replace("^", "_").upper())
+
+
+def _column_path(directory, column):
+    return os.path.join(directory, f"{column}.{MARKET_COLUMNS[column][1:]}")
+
+
+@contextlib.contextmanager
+def _store_lock(directory):
+    """
+    Exclusive lock on the store of one index, held across worker processes (flock on a lock
+    file in its directory).
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _stored_length(directory):
+    """
+    Number of complete rows: the shortest column, so a write interrupted between columns
+    is ignored (and overwritten by the next append).
+    """
+    sizes = []
+    for column, dtype in MARKET_COLUMNS.items():
+        path = _column_path(directory, column)
+        sizes.append(os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0)
+    return min(sizes)
+
+
+class MarketSeries:
+    """
+    Read-only view of a stored index: one memory-mapped NumPy array per column, in
+    ascending time order. ``times`` is ``datetime64[ns]``.
+    """
+
+    def __init__(self, index_symbol, columns):
+        self.index_symbol = index_symbol
+        self.columns = columns
+        self.times = columns["time"].view("datetime64[ns]")
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def to_frame(self):
+        """
+        The series as a DataFrame indexed by date, like the former CSV.
+        """
+        return pd.DataFrame(
+            {column: values for column, values in self.columns.items() if column != "time"},
+            index=pd.DatetimeIndex(self.times, name="Date"),
+            copy=False,
+        )
+
+
+def _map_columns(directory, length):
+    return {
+        column: np.memmap(_column_path(directory, column), dtype=dtype, mode="r", shape=(length,))
+        for column, dtype in MARKET_COLUMNS.items()
+    }
+
+
+def _derive_columns(close, previous_close, previous_returns):
+    """
+    daily_return (in percent) and the rolling volatility of new closes, continuing the
+    stored series: ``previous_close`` is the last stored close (NaN if none) and
+    ``previous_returns`` the stored daily returns of the preceding window.
+    """
+    closes = np.concatenate([[previous_close], close])
+    returns = (closes[1:] / closes[:-1] - 1) * 100
+    window = pd.Series(np.concatenate([previous_returns, returns]))
+    volatility = window.rolling(window=VOLATILITY_WINDOW).std().to_numpy()
+    return returns, volatility[len(previous_returns):]
+
+
+def append_market_data(index_symbol, data, root=None):
+    """
+    Blocking: add downloaded sessions to the store of ``index_symbol``.
+
+    Rows from the first downloaded session on replace the stored ones (the latest session
+    is re-downloaded to pick up its final values); only those and the new rows are
+    written, and their derived columns are computed from the stored trailing window.
+    Files only ever grow, so processes that have them mapped keep valid views. Appends to
+    one index are serialized across threads and worker processes.
+
+    Parameters:
+        index_symbol (str): Market index ticker.
+        data (pd.DataFrame): yfinance history (Open/High/Low/Close/Volume) in time order.
+
+    Returns:
+        int: Number of rows stored for the index afterwards.
+    """
+    directory = market_data_dir(index_symbol, root)
+    index = data.index.tz_localize(None) if data.index.tz is not None else data.index
+    times = index.to_numpy(dtype="datetime64[ns]").astype("<i8")
+
+    os.makedirs(directory, exist_ok=True)
+    with _write_lock, _store_lock(directory):
+        # Read the length only once the lock is held: another process may have appended
+        # while this one waited.
+        length = _stored_length(directory)
+        stored = _map_columns(directory, length) if length else None
+        position = int(np.searchsorted(stored["time"], times[0])) if stored is not None else 0
+
+        previous_close = stored["Close"][position - 1] if position else np.nan
+        previous_returns = (
+            np.array(stored["daily_return"][max(position - VOLATILITY_WINDOW + 1, 0):position])
+            if position else np.empty(0)
+        )
+        daily_return, volatility = _derive_columns(data["Close"].to_numpy(dtype=float), previous_close, previous_returns)
+        values = {
+            "Open": data["Open"], "High": data["High"], "Low": data["Low"], "Close": data["Close"],
+            "Volume": data["Volume"], "daily_return": daily_return, "volatility": volatility,
+        }
+        del stored
+
+        # Write the time column last: a row only counts once all of its columns are stored.
+        for column, dtype in [*MARKET_COLUMNS.items()][1:] + [("time", MARKET_COLUMNS["time"])]:
+            column_values = times if column == "time" else values[column]
+            path = _column_path(directory, column)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(position * np.dtype(dtype).itemsize)
+                f.write(np.asarray(column_values, dtype=dtype).tobytes())
+        return max(length, position + len(times))
+
+
 async def fetch_and_store_market_data(
     index_symbol="^GSPC",  # S&P 500 ticker in yfinance; use "^DJI" for DJIA if preferred
     period="max",          # Get full historical data
     interval="1d",
-    csv_file="market_data.csv"
+    root=None,
 ):
     """
     Asynchronously fetch market index data, calculate daily returns and rolling volatility,
-    and store the results in a CSV file.
-    
+    and append them to the index's column store.
+
+    The full ``period`` is only downloaded for an index not stored yet; afterwards only the
+    sessions since the latest stored one are fetched and appended.
+
     Parameters:
         index_symbol (str): Market index ticker (default is S&P500).
-        period (str): Time period for the data.
+        period (str): Time period for the first download.
         interval (str): Data interval.
-        csv_file (str): File path to store the CSV.
-        
+        root (str): Store directory (default: settings.MARKET_DATA_DIR).
+
     Returns:
-        pd.DataFrame: The fetched and computed market data.
+        MarketSeries: The stored series of the index.
     """
     ticker = yf.Ticker(index_symbol)
+    stored = load_market_series(index_symbol, root=root, missing_ok=True)
     # Fetch historical data asynchronously.
-    data = await asyncio.to_thread(ticker.history, period=period, interval=interval)
-    
+    if stored is None or not len(stored):
+        data = await asyncio.to_thread(ticker.history, period=period, interval=interval)
+    else:
+        last = pd.Timestamp(stored.times[-1])
+        data = await asyncio.to_thread(ticker.history, start=last.strftime("%Y-%m-%d"), interval=interval)
+
     if data.empty:
+        if stored is not None and len(stored):
+            return stored
         raise ValueError(f"No data found for {index_symbol}")
-    
-    # Calculate daily returns (in percentage).
-    data['daily_return'] = data['Close'].pct_change() * 100
-    # Calculate rolling volatility (using a 30-day window, for example).
-    data['volatility'] = data['daily_return'].rolling(window=30).std()
-    
-    # Store the data to CSV.
-    data.to_csv(csv_file)
-    print(f"Market data for {index_symbol} saved to {csv_file}")
-    return data
+
+    await asyncio.to_thread(append_market_data, index_symbol, data.sort_index(), root)
+    return load_market_series(index_symbol, root=root)
+
+
+async def update_market_indices(index_symbols=MARKET_INDICES, root=None):
+    """
+    Bring every index in ``index_symbols`` up to date concurrently.
+
+    Returns:
+        dict: index symbol -> MarketSeries, or the exception that stopped its update.
+    """
+    results = await asyncio.gather(
+        *(fetch_and_store_market_data(symbol, root=root) for symbol in index_symbols),
+        return_exceptions=True,
+    )
+    return dict(zip(index_symbols, results))
 
 #############################################
-# 2. Load Market Data from CSV
+# 2. Load Market Data
 #############################################
 
-def load_market_data(csv_file="market_data.csv"):
+def load_market_series(index_symbol="^GSPC", root=None, missing_ok=False):
     """
-    Load market data from a CSV file.
-    
+    The stored series of an index as memory-mapped columns.
+
+    Each process maps an index once and reuses the mapping until the store grows, so
+    repeated loads only cost a file size check.
+
     Parameters:
-        csv_file (str): Path to the CSV file.
-        
+        index_symbol (str): Market index ticker.
+        root (str): Store directory (default: settings.MARKET_DATA_DIR).
+        missing_ok (bool): Return None instead of raising when nothing is stored.
+
+    Returns:
+        MarketSeries: Read-only column views.
+    """
+    directory = market_data_dir(index_symbol, root)
+    try:
+        time_size = os.path.getsize(_column_path(directory, "time"))
+    except OSError:
+        time_size = 0
+    if not time_size:
+        if missing_ok:
+            return None
+        raise FileNotFoundError(f"No market data stored for {index_symbol}. Please run fetch_and_store_market_data first.")
+
+    cached = _loaded.get(directory)
+    if cached is not None and cached[0] == time_size:
+        return cached[1]
+    length = _stored_length(directory)
+    series = MarketSeries(index_symbol, _map_columns(directory, length))
+    _loaded[directory] = (time_size, series)
+    return series
+
+
+def load_market_data(index_symbol="^GSPC", root=None):
+    """
+    Load market data from the column store.
+
+    Parameters:
+        index_symbol (str): Market index ticker.
+        root (str): Store directory (default: settings.MARKET_DATA_DIR).
+
     Returns:
         pd.DataFrame: The market data.
     """
-    if os.path.exists(csv_file):
-        data = pd.read_csv(csv_file, index_col=0, parse_dates=True)
-        return data
-    else:
-        raise FileNotFoundError(f"{csv_file} does not exist. Please run fetch_and_store_market_data first.")
+    return load_market_series(index_symbol, root=root).to_frame()
 
 #############################################
 # 3. Compare Stock vs. Market Movement
@@ -102,6 +333,167 @@ def analyze_stock_vs_market_direction(stock_data, market_data, start_date, end_d
     same_direction = (stock_return * market_return) > 0
     return same_direction
 
+#############################################
+# 4. Batched Event Study
+#############################################
+
+# Sessions before a window used to estimate the market model, the fewest accepted (with
+# fewer the window falls back to the market-adjusted model: alpha 0, beta 1), and the
+# two-sided critical value below which an abnormal return is attributed to the market.
+ESTIMATION_WINDOW = 250
+MIN_ESTIMATION_SESSIONS = 30
+ABNORMAL_CRIT_VALUE = scipy.stats.norm.ppf(1 - 0.05 / 2)
+
+
+def daily_closes(times, closes):
+    """
+    Last close of every session of a (possibly intraday) series.
+
+    Parameters:
+        times (np.ndarray): datetime64 bar times, ascending.
+        closes (np.ndarray): Close prices.
+
+    Returns:
+        tuple: (datetime64[D] session dates, float64 closes).
+    """
+    dates = np.asarray(times).astype("datetime64[D]")
+    last = np.r_[dates[1:] != dates[:-1], True] if len(dates) else np.zeros(0, dtype=bool)
+    return dates[last], np.asarray(closes, dtype=float)[last]
+
+
+def event_study(stock_times, stock_closes, market, windows, estimation_window=ESTIMATION_WINDOW):
+    """
+    Compare a stock with the market over many (start, end) windows in one vectorized pass.
+
+    Stock and market closes are aligned on their common sessions; each window is located
+    with ``searchsorted`` and spans its first to last common session (inclusive, like
+    ``analyze_stock_vs_market_direction``). A market model ``r_stock = alpha + beta *
+    r_market`` is fitted by OLS on the ``estimation_window`` daily returns before each
+    window, with prefix sums, so every window costs O(1) whatever its length.
+
+    Parameters:
+        stock_times (np.ndarray): datetime64 times of the stock closes, ascending.
+        stock_closes (np.ndarray): Stock close prices.
+        market (MarketSeries): Stored market index series.
+        windows (list): (start, end) date pairs (strings or datetime-likes).
+        estimation_window (int): Daily returns used to fit the market model.
+
+    Returns:
+        dict: Arrays with one entry per window: "stock_return" and "market_return"
+        (fractional, over the window), "beta", "abnormal_return" (cumulative, against the
+        market model), "t_stat" of the abnormal return, "same_direction" and
+        "market_driven" (abnormal return not significant at 5%). Windows without two
+        common sessions are NaN/False; windows with too short an estimation period get
+        no t_stat and are never market_driven.
+    """
+    stock_dates, stock_closes = daily_closes(stock_times, stock_closes)
+    market_dates, market_closes = daily_closes(market.times, market["Close"])
+    dates, stock_at, market_at = np.intersect1d(stock_dates, market_dates, assume_unique=True, return_indices=True)
+    stock_closes = stock_closes[stock_at]
+    market_closes = market_closes[market_at]
+
+    # Return into session k + 1 is at position k; prefix sums over returns and products.
+    stock_returns = stock_closes[1:] / stock_closes[:-1] - 1
+    market_returns = market_closes[1:] / market_closes[:-1] - 1
+    sums = {
+        name: np.r_[0.0, np.cumsum(values)]
+        for name, values in {
+            "x": market_returns,
+            "y": stock_returns,
+            "xx": market_returns * market_returns,
+            "xy": market_returns * stock_returns,
+            "yy": stock_returns * stock_returns,
+        }.items()
+    }
+
+    def window_sum(name, lo, hi):
+        return sums[name][hi] - sums[name][lo]
+
+    starts = np.array([np.datetime64(start, "D") for start, _ in windows], dtype="datetime64[D]")
+    ends = np.array([np.datetime64(end, "D") for _, end in windows], dtype="datetime64[D]")
+    first = np.searchsorted(dates, starts, side="left")
+    last = np.searchsorted(dates, ends, side="right") - 1
+    valid = last > first
+    first = np.where(valid, first, 0)
+    last = np.where(valid, last, 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stock_return = np.where(valid, stock_closes[last] / stock_closes[first] - 1, np.nan)
+        market_return = np.where(valid, market_closes[last] / market_closes[first] - 1, np.nan)
+
+        # Market model on the returns before the window: positions [lo, first).
+        lo = np.maximum(first - estimation_window, 0)
+        m = (first - lo).astype(float)
+        sx, sy = window_sum("x", lo, first), window_sum("y", lo, first)
+        sxx, sxy, syy = window_sum("xx", lo, first), window_sum("xy", lo, first), window_sum("yy", lo, first)
+        beta = (m * sxy - sx * sy) / (m * sxx - sx * sx)
+        alpha = (sy - beta * sx) / m
+        residual_var = (syy - alpha * sy - beta * sxy) / (m - 2)
+        estimated = (m >= MIN_ESTIMATION_SESSIONS) & np.isfinite(beta) & (residual_var > 0)
+        beta = np.where(estimated, beta, 1.0)
+        alpha = np.where(estimated, alpha, 0.0)
+        residual_var = np.where(estimated, residual_var, np.nan)
+
+        # Cumulative abnormal return over the window's returns: positions [first, last).
+        n = (last - first).astype(float)
+        abnormal = window_sum("y", first, last) - n * alpha - beta * window_sum("x", first, last)
+        t_stat = abnormal / np.sqrt(residual_var * n)
+
+    abnormal = np.where(valid, abnormal, np.nan)
+    t_stat = np.where(valid, t_stat, np.nan)
+    return {
+        "stock_return": stock_return,
+        "market_return": market_return,
+        "beta": np.where(valid, beta, np.nan),
+        "abnormal_return": abnormal,
+        "t_stat": t_stat,
+        "same_direction": valid & (stock_return * market_return > 0),
+        "market_driven": valid & (np.abs(t_stat) < ABNORMAL_CRIT_VALUE),
+    }
+
+
+async def _refresh_market_series(index_symbol, root):
+    _refresh_attempts[(index_symbol, root)] = time.monotonic()
+    return await fetch_and_store_market_data(index_symbol, root=root)
+
+
+async def ensure_market_series(index_symbol="^GSPC", until=None, root=None):
+    """
+    The stored series of an index, downloading or extending it first when nothing is
+    stored or it ends before ``until`` (a date).
+
+    A stored series that ends early is extended at most once per ``MARKET_REFRESH_TTL``
+    (the stock may trade on days the index has no session yet, or ever), and concurrent
+    callers share one download.
+    """
+    market = load_market_series(index_symbol, root=root, missing_ok=True)
+    if market is not None and (until is None or market.times[-1] >= np.datetime64(until, "D")):
+        return market
+    attempted = _refresh_attempts.get((index_symbol, root))
+    if market is not None and attempted is not None and time.monotonic() - attempted < MARKET_REFRESH_TTL:
+        return market
+    return await market_flight.do((index_symbol, root), _refresh_market_series, index_symbol, root)
+
+
+async def market_events(times, closes, windows, index_symbol="^GSPC", root=None):
+    """
+    ``event_study`` of a stock's windows against a stored index, as one dict per window
+    (NaN figures become None), for API responses.
+    """
+    if not windows:
+        return []
+    until = np.asarray(times).max() if len(times) else None
+    market = await ensure_market_series(index_symbol, until=until, root=root)
+    study = event_study(times, closes, market, windows)
+    events = []
+    for i, (start, end) in enumerate(windows):
+        event = {"start": start, "end": end}
+        for name, values in study.items():
+            value = values[i].item()
+            event[name] = None if isinstance(value, float) and np.isnan(value) else value
+        events.append(event)
+    return events
+
 #############################################
 # Example Usage
 #############################################
@@ -113,7 +505,7 @@ def analyze_stock_vs_market_direction(stock_data, market_data, start_date, end_d
 # Suppose you already have a DataFrame `stock_data` for your single stock.
 # And you have an abnormal period identified, e.g., start_date and end_date (strings in "YYYY-MM-DD" format).
 
-# Load market data from CSV.
+# Load market data from the column store.
 # market_df = load_market_data()
 
 # Compare the movement in the given period.
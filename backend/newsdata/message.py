@@ -2,13 +2,21 @@ import os
 import json
 import yfinance as yf
 from argparse import ArgumentParser
-import requests
 import concurrent.futures
-from openai import OpenAI
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+from .compaction import compact_news, estimate_tokens, news_query
+from .fetcher import http_fetcher
 from .news_gdelt import get_news_gdelt
 
+# Perplexity searches before answering, so it gets longer than the fetcher's defaults.
+PERPLEXITY_DEADLINE = getattr(settings, "NEWS_PERPLEXITY_DEADLINE", 60.0)
+
+
 def send_post_request(url, payload, headers):
-    response = requests.post(url, json=payload, headers=headers)
+    response = http_fetcher.request(
+        "POST", url, json=payload, headers=headers, deadline=PERPLEXITY_DEADLINE, timeout=PERPLEXITY_DEADLINE
+    )
     try:
         return response.json()
     except json.decoder.JSONDecodeError:
@@ -56,9 +64,10 @@ def api_data_request(api_key, stock, start, end):
 
 
 
-def api_enhancement_request_openai(api_key, stock, start, end, explanations, references, fetched_news):
-    client = OpenAI(api_key=api_key)
-    
+def enhancement_messages(stock, start, end, explanations, references, fetched_news):
+    """
+    Chat messages asking gpt-4o to enhance the Perplexity explanations with the fetched news.
+    """
     setting =  """ You will be provided with a list of citations to various news sources and a text string describing possible explanations 
     for a volitility change in stock performance. Your job is to analyze this string and then rethink the provided explanations. 
     Check each of the sites and enhance the explanations by providing additional details and context. 
@@ -82,24 +91,43 @@ def api_enhancement_request_openai(api_key, stock, start, end, explanations, ref
         JUST THE EXPLANATIONS.
         \\n explanations: {explanations}, \\n references: {references} 
         \\n news articles: {fetched_news}"""
-    
-    payload = {
-        "model": "gpt-4o",
-        "messages": [{"role": "system", "content": setting}, {"role": "user", "content": query}],
-        "response_format": {"type": 'json_object'},
-    }
+
+    return [
+        {'role':'system', "content": setting},
+        {'role':"user", "content": query}
+    ]
+
+
+def api_enhancement_request_openai(api_key, stock, start, end, explanations, references, fetched_news):
+    client = OpenAI(api_key=api_key)
     const_response = client.chat.completions.create(
         model='gpt-4o',
-        messages=[
-            {'role':'system', "content": setting},
-            {'role':"user", "content": query}
-        ],
+        messages=enhancement_messages(stock, start, end, explanations, references, fetched_news),
         stream=False
     )
 
     return const_response
 
 
+async def stream_enhancement_openai(api_key, stock, start, end, explanations, references, fetched_news):
+    """
+    Async generator over the text deltas of the gpt-4o enhancement, as they arrive.
+    Uses the async client, so a stream holds no thread while waiting for tokens.
+    """
+    client = AsyncOpenAI(api_key=api_key)
+    stream = await client.chat.completions.create(
+        model='gpt-4o',
+        messages=enhancement_messages(stock, start, end, explanations, references, fetched_news),
+        stream=True
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+
 def create_key_value_pairs(links, contents):
     """
     Organizes links and contents into a key-value pair format.
@@ -124,6 +152,33 @@ def create_key_value_pairs(links, contents):
     return "\n---\n".join(output)
 
 
+def compact_company_news(news, stock, company, start, end, budget=None):
+    """
+    Keep the sentences of the fetched articles most relevant to the stock and date range,
+    within ``budget`` prompt tokens (see ``newsdata.compaction``).
+    """
+    def overhead(url):
+        return int(estimate_tokens([f"- Link: {url}\n- Content: \n---\n"])[0])
+
+    return compact_news(news, news_query(stock, company, start, end), budget, overhead)
+
+
+def fetch_company_news(stock, start, end):
+    """
+    GDELT articles about the company behind ``stock``, compacted to the prompt token
+    budget.
+    """
+    company = ticker_to_company_name(stock)
+    return compact_company_news(get_news_gdelt(company, start, end), stock, company, start, end)
+
+
+def format_news(news):
+    """
+    News block of the enhancement prompt: one link/content pair per article.
+    """
+    return create_key_value_pairs(news["url"].tolist(), news["content"].tolist()) if len(news) else ""
+
+
 def ticker_to_company_name(ticker):
     try:
         stock = yf.Ticker(ticker)
@@ -139,15 +194,11 @@ def generate_data_openai(api_key_perplexity, api_key_openai, stock, start, end):
     def fetch_simple_explanations():
         return api_data_request(api_key_perplexity, stock, start, end)
 
-    # Function to fetch company news
-    def fetch_company_news():
-        return get_news_gdelt(ticker_to_company_name(stock), start, end)
-
     # Run both tasks concurrently
     with concurrent.futures.ThreadPoolExecutor() as executor:
         # Submit tasks to the executor
         future_simple_explanations = executor.submit(fetch_simple_explanations)
-        future_company_news = executor.submit(fetch_company_news)
+        future_company_news = executor.submit(fetch_company_news, stock, start, end)
 
         # Wait for both tasks to complete and retrieve results
         simple_explanations = future_simple_explanations.result()
@@ -155,7 +206,8 @@ def generate_data_openai(api_key_perplexity, api_key_openai, stock, start, end):
 
     # Enhance explanations using OpenAI
     complex_explanations = api_enhancement_request_openai(
-        api_key_openai, stock, start, end, simple_explanations['content'], simple_explanations["citations"], company_news
+        api_key_openai, stock, start, end, simple_explanations['content'], simple_explanations["citations"],
+        format_news(company_news)
     )
     return complex_explanations.choices[0].message.content
 
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsdata', '0002_alter_newsdata_banner_image_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsExplanation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=16)),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('pipeline_version', models.PositiveIntegerField()),
+                ('content', models.TextField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='newsexplanation',
+            constraint=models.UniqueConstraint(fields=('ticker', 'start', 'end', 'pipeline_version'), name='unique_newsexplanation_range'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsdata', '0003_newsexplanation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=64, unique=True)),
+                ('url', models.TextField()),
+                ('text', models.TextField(default=None, null=True)),
+                ('fetched_at', models.DateTimeField()),
+                ('used_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
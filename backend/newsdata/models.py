@@ -11,3 +11,43 @@ class NewsData(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class NewsExplanation(models.Model):
+    """
+    Finished news explanation of one ticker's move over a date range, as returned by the
+    news pipeline. Entries of an older ``pipeline_version`` are never served.
+    """
+    ticker = models.CharField(max_length=16)
+    start = models.DateField()
+    end = models.DateField()
+    pipeline_version = models.PositiveIntegerField()
+    content = models.TextField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ticker", "start", "end", "pipeline_version"],
+                name="unique_newsexplanation_range",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ticker} {self.start} -> {self.end} (v{self.pipeline_version})"
+
+
+class ArticleText(models.Model):
+    """
+    Extracted text of a news article, keyed by the hash of its normalized URL. ``text`` is
+    None for URLs that failed or had no text (a negative entry, retried after a while).
+    """
+    url_hash = models.CharField(max_length=64, unique=True)
+    url = models.TextField()
+    text = models.TextField(null=True, default=None)
+    fetched_at = models.DateTimeField()
+    # Last time a news request used the entry; the least recently used ones are evicted.
+    used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.url} ({'no text' if self.text is None else f'{len(self.text)} chars'})"
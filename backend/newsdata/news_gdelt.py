@@ -1,10 +1,15 @@
 from gdeltdoc import GdeltDoc, Filters
 import pandas as pd
-import requests
 from newspaper import Article
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 
+from .article_cache import cached_texts, store_texts
+from .fetcher import ARTICLE_USER_AGENT, http_fetcher
+
+# Statuses negatively cached like a page without text; anything else that is not a 200
+# (429, 5xx, other 4xx) may be transient and is retried on the next request.
+PERMANENT_FAILURES = {404, 410}
+
 
 def get_news_gdelt(kw, sd, ed, nr=20):
 
@@ -24,11 +29,11 @@ def get_news_gdelt(kw, sd, ed, nr=20):
     articles = articles[articles["language"] == "English"]
 
 
-    # Function to extract article text using newspaper3k
-    def extract_article_text(url):
+    # Function to extract article text from downloaded HTML using newspaper3k
+    def extract_article_text(url, html):
         try:
             article = Article(url)
-            article.download()
+            article.download(input_html=html)
             article.parse()
             if not article.text:
                 return None
@@ -36,32 +41,31 @@ def get_news_gdelt(kw, sd, ed, nr=20):
         except:
             return None
 
-    # Main function to process a list of URLs
-    def process_articles(df, max_workers=100):
+    # Main function to process a list of URLs: texts come from the article cache where
+    # possible and only the remaining URLs are downloaded, through the shared fetcher.
+    def process_articles(df):
         # Extract the first column as a list of URLs
         urls = df['url'].tolist()
+        texts = cached_texts(urls)
+        missing = [url for url in dict.fromkeys(urls) if url not in texts]
 
-        # Prepare the results DataFrame
-        results = []
-
-        # Process URLs in parallel
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_url = {
-                executor.submit(extract_article_text, url): url
-                for url in urls
-            }
-
-            for future in as_completed(future_to_url):
-                url = future_to_url[future]
-                try:
-                    result = future.result()
-                    results.append(result)
-                except Exception as e:
-                    print(f"Error processing {url}: {e}")
-                    results.append({"url": url, "text": None})
+        fetched = {}
+        if missing:
+            responses = http_fetcher.fetch_all(missing, headers={"User-Agent": ARTICLE_USER_AGENT})
+            for url, response in responses.items():
+                if isinstance(response, Exception):
+                    # Timeouts and connection errors are transient: not cached, retried on
+                    # the next request.
+                    print(f"Error processing {url}: {response}")
+                elif response.status_code == 200:
+                    fetched[url] = extract_article_text(url, response.text)
+                elif response.status_code in PERMANENT_FAILURES:
+                    fetched[url] = None
+            store_texts(fetched)
+        texts.update(fetched)
 
-        # Convert results to a DataFrame
-        results_df = pd.DataFrame(results, columns=["content"])
+        # One row per input URL, in input order.
+        results_df = pd.DataFrame({"content": [texts.get(url) for url in urls]}, index=df.index)
         return results_df
 
 
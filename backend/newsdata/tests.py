@@ -0,0 +1,590 @@
+import asyncio
+import datetime
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import httpx
+import numpy as np
+import orjson
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from stockdata import analytics
+from stockdata.pool import AnalyticsPool
+from . import article_cache, explanations, market_direction, message
+from .article_cache import normalize_url
+from .compaction import compact_news, estimate_tokens, news_query
+from .fetcher import HttpFetcher
+from .market_direction import (
+    append_market_data,
+    event_study,
+    fetch_and_store_market_data,
+    load_market_data,
+    load_market_series,
+)
+from .models import ArticleText, NewsExplanation
+from .news_gdelt import get_news_gdelt
+
+
+def make_index_history(periods, start="2024-01-02", base=4000.0, seed=0):
+    index = pd.date_range(start, periods=periods, freq="B", tz="America/New_York")
+    close = base + np.cumsum(np.random.default_rng(seed).normal(0, 20, periods))
+    return pd.DataFrame(
+        {"Open": close, "High": close + 5, "Low": close - 5, "Close": close, "Volume": [1e9] * periods},
+        index=index,
+    )
+
+
+class FakeIndexTicker:
+    """
+    Minimal stand-in for yf.Ticker serving a fixed index history.
+    """
+
+    def __init__(self, history):
+        self._history = history
+        self.history_calls = []
+
+    def history(self, period=None, interval="1d", start=None):
+        self.history_calls.append({"period": period, "start": start})
+        data = self._history
+        if start is not None:
+            data = data[data.index.tz_localize(None) >= pd.Timestamp(start)]
+        return data.copy()
+
+
+class MarketDataStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def fetch(self, history, symbol="^GSPC"):
+        fake = FakeIndexTicker(history)
+        with mock.patch("newsdata.market_direction.yf.Ticker", return_value=fake):
+            async_to_sync(fetch_and_store_market_data)(symbol, root=self.root)
+        return fake
+
+    def test_incremental_appends_match_a_full_download(self):
+        history = make_index_history(120)
+        # The first download ends mid-session; its last bar changes once the session closes.
+        partial = history.iloc[:80].copy()
+        partial.iloc[-1, partial.columns.get_loc("Close")] += 50
+        self.fetch(partial)
+        fake = self.fetch(history)
+
+        self.assertEqual(pd.Timestamp(fake.history_calls[0]["start"]), history.index[79].tz_localize(None).normalize())
+        expected = history.copy()
+        expected["daily_return"] = expected["Close"].pct_change() * 100
+        expected["volatility"] = expected["daily_return"].rolling(window=30).std()
+        stored = load_market_data("^GSPC", root=self.root)
+        np.testing.assert_array_equal(stored.index, history.index.tz_localize(None))
+        np.testing.assert_allclose(stored[expected.columns].to_numpy(), expected.to_numpy(), equal_nan=True)
+
+    def test_loads_reuse_the_mapping_until_the_store_grows(self):
+        history = make_index_history(60)
+        self.fetch(history.iloc[:50])
+        self.fetch(history.iloc[:40], symbol="^DJI")
+
+        first = load_market_series("^GSPC", root=self.root)
+        self.assertIs(load_market_series("^GSPC", root=self.root), first)
+        self.assertEqual(len(load_market_series("^DJI", root=self.root)), 40)
+
+        self.fetch(history)
+        grown = load_market_series("^GSPC", root=self.root)
+        self.assertIsNot(grown, first)
+        self.assertEqual(len(grown), 60)
+        self.assertEqual(len(first), 50)
+
+    def test_extensions_are_throttled_and_coalesced(self):
+        fake = FakeIndexTicker(make_index_history(50))
+        after_end = np.datetime64("2030-01-01")
+
+        async def ensure(count):
+            return await asyncio.gather(*[
+                market_direction.ensure_market_series("^GSPC", until=after_end, root=self.root) for _ in range(count)
+            ])
+
+        with mock.patch("newsdata.market_direction.yf.Ticker", return_value=fake):
+            # Concurrent requests share one download; later ones within the TTL serve the
+            # stored series even though it ends before the requested date.
+            first = async_to_sync(ensure)(3)
+            again = async_to_sync(ensure)(1)
+            self.assertEqual(len(fake.history_calls), 1)
+            self.assertEqual({len(market) for market in first + again}, {50})
+
+            with mock.patch.object(market_direction, "MARKET_REFRESH_TTL", 0):
+                async_to_sync(ensure)(1)
+        self.assertEqual(len(fake.history_calls), 2)
+
+    def test_appends_wait_for_the_store_lock_of_other_processes(self):
+        history = make_index_history(60)
+        self.fetch(history.iloc[:40])
+        directory = market_direction.market_data_dir("^GSPC", self.root)
+
+        appended = threading.Event()
+
+        def append():
+            market_direction.append_market_data("^GSPC", history.iloc[39:], self.root)
+            appended.set()
+
+        # A separate open file description stands in for another worker process.
+        with open(os.path.join(directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            writer = threading.Thread(target=append)
+            writer.start()
+            self.assertFalse(appended.wait(0.2))
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        writer.join(5)
+
+        self.assertTrue(appended.is_set())
+        stored = load_market_data("^GSPC", root=self.root)
+        np.testing.assert_array_equal(stored.index, history.index.tz_localize(None))
+
+    def test_missing_index_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            load_market_series("^GSPC", root=self.root)
+
+
+class EventStudyTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.market_history = make_index_history(400)
+        append_market_data("^GSPC", self.market_history, root=self.root)
+        self.market = load_market_series("^GSPC", root=self.root)
+
+        # A stock with beta 1.5 to the market plus noise, and two stock-specific jumps.
+        rng = np.random.default_rng(1)
+        market_returns = self.market_history["Close"].pct_change().fillna(0).to_numpy()
+        stock_returns = 0.0002 + 1.5 * market_returns + rng.normal(0, 0.002, len(market_returns))
+        stock_returns[300:303] += 0.05
+        stock_returns[350:352] -= 0.04
+        self.stock_times = self.market_history.index.tz_localize(None).to_numpy()
+        self.stock_closes = 50 * np.cumprod(1 + stock_returns)
+
+    def test_matches_per_window_regression(self):
+        dates = self.market_history.index.strftime("%Y-%m-%d")
+        windows = [(dates[300], dates[303]), (dates[349], dates[352]), (dates[200], dates[210]), (dates[10], dates[12])]
+
+        study = event_study(self.stock_times, self.stock_closes, self.market, windows, estimation_window=250)
+
+        market_close = self.market_history["Close"].to_numpy()
+        stock_returns = self.stock_closes[1:] / self.stock_closes[:-1] - 1
+        market_returns = market_close[1:] / market_close[:-1] - 1
+        for i, (start, end) in enumerate(windows[:3]):
+            first, last = dates.get_loc(start), dates.get_loc(end)
+            beta, alpha = np.polyfit(market_returns[max(first - 250, 0):first], stock_returns[max(first - 250, 0):first], 1)
+            expected = np.sum(stock_returns[first:last] - alpha - beta * market_returns[first:last])
+            self.assertAlmostEqual(study["beta"][i], beta)
+            self.assertAlmostEqual(study["abnormal_return"][i], expected)
+            self.assertAlmostEqual(study["stock_return"][i], self.stock_closes[last] / self.stock_closes[first] - 1)
+        # The jumps are abnormal; the quiet window moves with the market.
+        self.assertEqual(study["market_driven"][:3].tolist(), [False, False, True])
+        # Too little history before the window: market-adjusted, never market_driven.
+        self.assertEqual(study["beta"][3], 1.0)
+        self.assertFalse(study["market_driven"][3])
+
+    def test_anomaly_endpoint_reports_and_filters_market_moves(self):
+        pool = AnalyticsPool(processes=0, max_pending=4, timeout=30)
+        body = {
+            "data": {"time": self.market_history.index.strftime("%Y-%m-%d").tolist(), "price": self.stock_closes.tolist()},
+            "market": "^GSPC",
+        }
+        with override_settings(MARKET_DATA_DIR=self.root), mock.patch.object(analytics.garch_fits, "pool", pool):
+            reported = self.client.post("/api/unusual_range/", body, content_type="application/json").json()
+            filtered = self.client.post(
+                "/api/unusual_range/", {**body, "exclude_market_moves": True}, content_type="application/json"
+            ).json()
+
+        self.assertEqual(reported["status_code"], 200)
+        self.assertEqual([[e["start"], e["end"]] for e in reported["events"]], reported["unusual_ranges"])
+        self.assertEqual(
+            filtered["unusual_ranges"],
+            [[e["start"], e["end"]] for e in reported["events"] if not e["market_driven"]],
+        )
+
+
+class ExplanationRequests:
+    """
+    Counting stand-in for the news pipeline and a /api/news/ request helper.
+    """
+    def setUp(self):
+        self.runs = 0
+
+    def pipeline(self, api_key_perplexity, api_key_openai, stock, start, end):
+        self.runs += 1
+        return f'{{"text_summary": "{stock} {start} {end} run {self.runs}"}}'
+
+    async def get(self):
+        response = await self.async_client.get(
+            "/api/news/", {"stockname": "aapl", "start": '"2025-01-02"', "end": "2025-01-10"}
+        )
+        return response.json()
+
+
+@override_settings(API_PER="perplexity-key", API_OPENAI="openai-key")
+class NewsExplanationCacheTests(ExplanationRequests, TestCase):
+    async def test_entries_of_other_pipeline_versions_are_ignored(self):
+        with mock.patch.object(explanations, "generate_data_openai", self.pipeline):
+            await self.get()
+            with mock.patch.object(explanations, "NEWS_PIPELINE_VERSION", explanations.NEWS_PIPELINE_VERSION + 1):
+                bumped = await self.get()
+
+        self.assertEqual(bumped["cache"], "miss")
+        self.assertEqual(await NewsExplanation.objects.acount(), 2)
+
+
+
+@override_settings(API_PER="perplexity-key", API_OPENAI="openai-key")
+class NewsExplanationRefreshTests(ExplanationRequests, TransactionTestCase):
+    """
+    The background refresh writes from its own thread, so these tests need committed
+    transactions.
+    """
+
+    async def test_repeat_requests_are_served_from_the_cache(self):
+        with mock.patch.object(explanations, "generate_data_openai", self.pipeline):
+            first = await self.get()
+            second = await self.get()
+
+            self.assertEqual((first["cache"], second["cache"]), ("miss", "fresh"))
+            self.assertEqual(second["complex"], first["complex"])
+            self.assertEqual(self.runs, 1)
+
+            # Past the TTL the stale answer is served at once and refreshed in the background.
+            await NewsExplanation.objects.aupdate(
+                updated_at=datetime.datetime.now(datetime.timezone.utc)
+                - datetime.timedelta(seconds=explanations.EXPLANATION_TTL + 60)
+            )
+            stale = await self.get()
+            await asyncio.gather(*map(asyncio.wrap_future, explanations._refreshes))
+            refreshed = await self.get()
+
+        self.assertEqual(stale["cache"], "stale")
+        self.assertEqual(stale["complex"], first["complex"])
+        self.assertEqual(refreshed["cache"], "fresh")
+        self.assertIn("run 2", refreshed["complex"])
+        self.assertEqual(self.runs, 2)
+
+    def test_stale_entries_are_refreshed_under_wsgi(self):
+        params = {"stockname": "aapl", "start": "2025-01-02", "end": "2025-01-10"}
+        with mock.patch.object(explanations, "generate_data_openai", self.pipeline):
+            self.client.get("/api/news/", params)
+            NewsExplanation.objects.update(
+                updated_at=datetime.datetime.now(datetime.timezone.utc)
+                - datetime.timedelta(seconds=explanations.EXPLANATION_TTL + 60)
+            )
+            # async_to_sync ends the request's event loop with the response; the refresh
+            # must not depend on it.
+            stale = self.client.get("/api/news/", params).json()
+            for refresh in list(explanations._refreshes):
+                refresh.result(timeout=5)
+            refreshed = self.client.get("/api/news/", params).json()
+
+        self.assertEqual(stale["cache"], "stale")
+        self.assertEqual(refreshed["cache"], "fresh")
+        self.assertIn("run 2", refreshed["complex"])
+
+@override_settings(API_PER="perplexity-key", API_OPENAI="openai-key")
+class NewsStreamTests(TestCase):
+    async def stream(self):
+        response = await self.async_client.get(
+            "/api/news/stream/", {"stockname": "AAPL", "start": "2025-01-02", "end": "2025-01-10"}
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = []
+        for block in body.split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if lines:
+                events.append((lines["event"], orjson.loads(lines["data"])))
+        return events
+
+    async def test_stages_then_tokens_then_cached_result(self):
+        async def tokens(*args):
+            for text in ['{"text_summary": ', '"rallied"}']:
+                yield text
+
+        perplexity = {"citations": ["https://example.com/a"], "content": ["explanation"]}
+        articles = pd.DataFrame({"url": ["https://example.com/b"], "content": ["text"]})
+        with mock.patch.object(explanations, "api_data_request", return_value=perplexity), \
+                mock.patch.object(explanations, "fetch_company_news", return_value=articles), \
+                mock.patch.object(explanations, "stream_enhancement_openai", tokens):
+            streamed = await self.stream()
+            cached = await self.stream()
+
+        names = [event for event, _ in streamed]
+        self.assertEqual(sorted(names[:2]), ["stage", "stage"])
+        self.assertEqual({data["stage"] for _, data in streamed[:2]}, {"perplexity", "articles"})
+        self.assertEqual(names[2:], ["token", "token", "done"])
+        self.assertEqual(streamed[-1][1], {"complex": '{"text_summary": "rallied"}', "cache": "miss"})
+        self.assertEqual(cached, [("done", {"complex": '{"text_summary": "rallied"}', "cache": "fresh"})])
+
+    async def test_concurrent_streams_share_one_completion(self):
+        completions = []
+
+        async def tokens(*args):
+            completions.append(args)
+            for text in ['{"text_summary": ', '"rallied"}']:
+                await asyncio.sleep(0.05)
+                yield text
+
+        perplexity = {"citations": [], "content": ["explanation"]}
+        with mock.patch.object(explanations, "api_data_request", return_value=perplexity), \
+                mock.patch.object(explanations, "fetch_company_news", return_value=pd.DataFrame()), \
+                mock.patch.object(explanations, "stream_enhancement_openai", tokens):
+            first, second = await asyncio.gather(self.stream(), self.stream())
+
+        self.assertEqual(len(completions), 1)
+        done = ("done", {"complex": '{"text_summary": "rallied"}', "cache": "miss"})
+        self.assertEqual((first[-1], second[-1]), (done, done))
+        # One of them led the run and streamed it; the other waited for its result.
+        self.assertEqual(sorted([len(first), len(second)]), [1, 5])
+
+    async def test_failures_end_the_stream_with_an_error_event(self):
+        with mock.patch.object(explanations, "api_data_request", side_effect=RuntimeError("rate limited")), \
+                mock.patch.object(explanations, "fetch_company_news", return_value=pd.DataFrame()):
+            events = await self.stream()
+
+        self.assertEqual(events[-1], ("error", {"error": "rate limited"}))
+
+
+class FakeArticle:
+    """
+    Minimal stand-in for newspaper.Article: the text of a URL is its last path segment,
+    and URLs containing "broken" yield no text.
+    """
+    downloads = []
+
+    def __init__(self, url):
+        self.url = url
+        self.text = ""
+
+    def download(self, input_html=None):
+        FakeArticle.downloads.append(self.url)
+
+    def parse(self):
+        if "broken" not in self.url:
+            self.text = f"text of {self.url.rstrip('/').rsplit('/', 1)[-1]}"
+
+
+def make_fetcher(handler, **limits):
+    options = {"max_connections": 8, "max_per_host": 2, "connect_timeout": 1.0, "read_timeout": 1.0, "deadline": 5.0}
+    options.update(limits)
+    return HttpFetcher(transport=httpx.MockTransport(handler), **options)
+
+
+class ArticleCacheTests(TestCase):
+    def setUp(self):
+        FakeArticle.downloads = []
+        self.fetcher = make_fetcher(lambda request: httpx.Response(200, text="<html></html>"))
+        self.addCleanup(self.fetcher.close)
+
+    def search(self, urls):
+        found = pd.DataFrame({"url": urls, "language": ["English"] * len(urls)})
+        with mock.patch("newsdata.news_gdelt.GdeltDoc") as gdelt, \
+                mock.patch("newsdata.news_gdelt.Article", FakeArticle), \
+                mock.patch("newsdata.news_gdelt.http_fetcher", self.fetcher):
+            gdelt.return_value.article_search.return_value = found
+            return get_news_gdelt("Apple", "2025-01-02", "2025-01-10")
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            normalize_url("HTTPS://www.Reuters.com:443/markets/apple-rally/?utm_source=x&b=2&a=1#top"),
+            "https://reuters.com/markets/apple-rally?a=1&b=2",
+        )
+        self.assertEqual(normalize_url("http://cnbc.com:8080/a"), "http://cnbc.com:8080/a")
+
+    def test_texts_are_fetched_once_across_requests(self):
+        first = self.search(["https://reuters.com/a", "https://cnbc.com/b", "https://cnbc.com/broken"])
+        second = self.search(["https://www.reuters.com/a/?utm_medium=feed", "https://cnbc.com/broken", "https://ft.com/c"])
+
+        self.assertEqual(first["content"].tolist(), ["text of a", "text of b"])
+        self.assertEqual(first["url"].tolist(), ["https://reuters.com/a", "https://cnbc.com/b"])
+        self.assertEqual(second["content"].tolist(), ["text of a", "text of c"])
+        # Only the new URL was downloaded again; the broken one is negatively cached.
+        self.assertEqual(sorted(FakeArticle.downloads[3:]), ["https://ft.com/c"])
+
+        # Past the negative TTL the broken URL is retried.
+        ArticleText.objects.filter(text=None).update(
+            fetched_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        )
+        self.search(["https://cnbc.com/broken"])
+        self.assertEqual(FakeArticle.downloads[-1], "https://cnbc.com/broken")
+
+    def test_only_permanent_failures_are_negatively_cached(self):
+        def handler(request):
+            if request.url.path == "/busy":
+                return httpx.Response(503)
+            if request.url.path == "/limited":
+                return httpx.Response(429)
+            if request.url.path == "/gone":
+                return httpx.Response(404)
+            if request.url.path == "/slow":
+                raise httpx.ReadTimeout("timed out", request=request)
+            return httpx.Response(200, text="<html></html>")
+
+        self.fetcher = make_fetcher(handler)
+        self.addCleanup(self.fetcher.close)
+        urls = ["https://a.com/busy", "https://a.com/limited", "https://a.com/gone", "https://a.com/slow", "https://a.com/ok"]
+        self.assertEqual(self.search(urls)["content"].tolist(), ["text of ok"])
+
+        self.assertEqual(
+            dict(ArticleText.objects.values_list("url", "text")),
+            {"https://a.com/gone": None, "https://a.com/ok": "text of ok"},
+        )
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with mock.patch.object(article_cache, "ARTICLE_CACHE_MAX_ENTRIES", 3):
+            self.search(["https://a.com/1", "https://a.com/2", "https://a.com/3"])
+            for day, url in enumerate(["https://a.com/1", "https://a.com/2", "https://a.com/3"], start=1):
+                ArticleText.objects.filter(url=url).update(
+                    used_at=datetime.datetime(2020, 1, day, tzinfo=datetime.timezone.utc)
+                )
+            self.search(["https://a.com/1"])  # a hit: now the most recently used
+            self.search(["https://a.com/4"])
+
+        self.assertEqual(
+            sorted(ArticleText.objects.values_list("url", flat=True)),
+            ["https://a.com/1", "https://a.com/3", "https://a.com/4"],
+        )
+
+
+class HttpFetcherTests(SimpleTestCase):
+    def test_requests_respect_the_global_and_per_host_caps(self):
+        active = {"all": 0, "a.com": 0, "b.com": 0}
+        peaks = dict(active)
+
+        async def handler(request):
+            host = request.url.host
+            for name in ("all", host):
+                active[name] += 1
+                peaks[name] = max(peaks[name], active[name])
+            await asyncio.sleep(0.02)
+            for name in ("all", host):
+                active[name] -= 1
+            return httpx.Response(200, text=request.url.path)
+
+        fetcher = make_fetcher(handler, max_connections=3, max_per_host=2)
+        self.addCleanup(fetcher.close)
+        urls = [f"https://{host}/{i}" for host in ("a.com", "b.com") for i in range(6)]
+        responses = fetcher.fetch_all(urls)
+
+        self.assertEqual([responses[url].text for url in urls], [f"/{i}" for i in range(6)] * 2)
+        self.assertEqual(peaks, {"all": 3, "a.com": 2, "b.com": 2})
+        self.assertEqual(fetcher.stats()["active_hosts"], 0)
+
+    def test_slow_requests_hit_the_deadline(self):
+        async def handler(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200)
+
+        fetcher = make_fetcher(handler, deadline=0.05)
+        self.addCleanup(fetcher.close)
+
+        with self.assertRaises(TimeoutError):
+            fetcher.request("GET", "https://slow.com/")
+        self.assertIsInstance(fetcher.fetch_all(["https://slow.com/a"])["https://slow.com/a"], TimeoutError)
+        self.assertEqual(fetcher.stats()["timed_out"], 2)
+
+    def test_waiting_for_a_slot_counts_against_the_deadline(self):
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200)
+
+        # Four requests to one host run one after the other; the last would end after 0.2s.
+        fetcher = make_fetcher(handler, max_per_host=1, deadline=0.15)
+        self.addCleanup(fetcher.close)
+        responses = fetcher.fetch_all([f"https://slow.com/{i}" for i in range(4)])
+
+        self.assertEqual([type(response) for response in responses.values()][:2], [httpx.Response] * 2)
+        self.assertIsInstance(responses["https://slow.com/3"], TimeoutError)
+
+    def test_a_saturated_host_does_not_delay_other_hosts(self):
+        async def handler(request):
+            if request.url.host == "slow.com":
+                await asyncio.sleep(0.3)
+            return httpx.Response(200)
+
+        fetcher = make_fetcher(handler, max_connections=2, max_per_host=1)
+        self.addCleanup(fetcher.close)
+        slow = [fetcher._submit("GET", f"https://slow.com/{i}", None, {}) for i in range(2)]
+        time.sleep(0.05)
+        started = time.perf_counter()
+        response = fetcher.request("GET", "https://fast.com/")
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, 0.15)
+        self.assertEqual([future.result().status_code for future in slow], [200, 200])
+
+    def test_perplexity_requests_share_the_fetcher(self):
+        def handler(request):
+            self.assertEqual(request.headers["Authorization"], "Bearer key")
+            body = {"choices": [{"message": {"content": "Earnings beat"}}], "citations": ["https://reuters.com/a"]}
+            return httpx.Response(200, json=body)
+
+        fetcher = make_fetcher(handler)
+        self.addCleanup(fetcher.close)
+        with mock.patch.object(message, "http_fetcher", fetcher):
+            result = message.api_data_request("key", "AAPL", "2025-01-02", "2025-01-10")
+
+        self.assertEqual(result, {"citations": ["https://reuters.com/a"], "content": ["Earnings beat"]})
+        self.assertEqual(fetcher.stats()["requests"], 1)
+
+
+class NewsCompactionTests(SimpleTestCase):
+    boilerplate = (
+        "Sign up for our daily newsletter to get the top stories delivered to your inbox. "
+        "We use cookies to personalise content and to analyse our traffic on this website. "
+    )
+    news = pd.DataFrame({
+        "url": ["https://reuters.com/apple-results", "https://cnbc.com/markets-wrap"],
+        "content": [
+            boilerplate + "Apple reported record services revenue in January 2025, beating analyst forecasts. "
+            "The company also raised its outlook for the March quarter on strong iPhone sales.",
+            "Oil prices slipped as traders weighed new supply data from the Gulf region today. "
+            "Apple shares rose 3% after the earnings report lifted the broader technology sector. " + boilerplate * 5,
+        ],
+    })
+    query = news_query("AAPL", "Apple Inc.", "2025-01-27", "2025-01-31")
+
+    def test_keeps_relevant_sentences_in_their_original_order(self):
+        compacted = compact_news(self.news, self.query, budget=1000)
+
+        self.assertEqual(compacted["url"].tolist(), self.news["url"].tolist())
+        self.assertEqual(compacted["content"].tolist(), [
+            "Apple reported record services revenue in January 2025, beating analyst forecasts. "
+            "The company also raised its outlook for the March quarter on strong iPhone sales.",
+            "Apple shares rose 3% after the earnings report lifted the broader technology sector.",
+        ])
+
+    def test_every_article_gets_its_best_sentence_before_any_second_one(self):
+        best = [
+            "Apple reported record services revenue in January 2025, beating analyst forecasts.",
+            "Apple shares rose 3% after the earnings report lifted the broader technology sector.",
+        ]
+        # Room for both best sentences (one separator token each), not for a third one.
+        budget = int(estimate_tokens(best).sum()) + 2
+        compacted = compact_news(self.news, self.query, budget=budget)
+
+        self.assertEqual(compacted["content"].tolist(), best)
+        self.assertEqual(compact_news(self.news, self.query, budget=0).shape, (0, 2))
+
+    def test_pipeline_sends_the_compacted_news(self):
+        perplexity = {"citations": [], "content": ["explanation"]}
+        reply = mock.MagicMock()
+        reply.choices[0].message.content = "enhanced"
+        with mock.patch.object(message, "api_data_request", return_value=perplexity), \
+                mock.patch.object(message, "ticker_to_company_name", return_value="Apple Inc."), \
+                mock.patch.object(message, "get_news_gdelt", return_value=self.news), \
+                mock.patch.object(message, "api_enhancement_request_openai", return_value=reply) as enhance:
+            result = message.generate_data_openai("per", "openai", "AAPL", "2025-01-27", "2025-01-31")
+
+        fetched_news = enhance.call_args.args[-1]
+        self.assertEqual(result, "enhanced")
+        self.assertIn("- Link: https://reuters.com/apple-results", fetched_news)
+        self.assertIn("Apple shares rose 3%", fetched_news)
+        self.assertNotIn("newsletter", fetched_news)
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import news_api
+from .views import news_api, news_stream_api
 
 urlpatterns = [
     path('api/news/', news_api, name='news_api'),
+    path('api/news/stream/', news_stream_api, name='news_stream_api'),
 ]
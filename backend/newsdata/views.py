@@ -1,40 +1,34 @@
-from django.http import JsonResponse
-from .message import generate_data_openai
 from django.conf import settings
-from asgiref.sync import async_to_sync
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from stockcompass.api import async_api_view, json_response, sse_response
+from .explanations import get_explanation, stream_explanation
 
-@api_view(['GET'])
-def news_api(request):
+@async_api_view(['GET'])
+async def news_api(request):
     try:
-        stockname = request.query_params.get('stockname', 'AAPL')
-        start = request.query_params.get('start', '2025-01-01')
-        end = request.query_params.get('end', '2025-01-10')
+        stockname = request.GET.get('stockname', 'AAPL')
+        start = request.GET.get('start', '2025-01-01')
+        end = request.GET.get('end', '2025-01-10')
         
         # Remove quotes from dates if present
         start = start.replace('"', '')
         end = end.replace('"', '')
         
         if not settings.API_PER or not settings.API_OPENAI:
-            return Response({
+            return json_response({
                 "status_code": 500,
                 "error": "API keys not configured"
             }, status=500)
         
-        complex_res = generate_data_openai(
-            settings.API_PER,
-            settings.API_OPENAI,
-            stockname,
-            start,
-            end
-        )
+        # Served from the explanation cache when another request already ran the pipeline
+        # for this range; the pipeline itself runs in a worker thread.
+        complex_res, cache_status = await get_explanation(stockname, start, end)
         
         response_data = {
             "status_code": 200,
-            "complex": complex_res
+            "complex": complex_res,
+            "cache": cache_status
         }
-        return Response(response_data)
+        return json_response(response_data)
     
     except Exception as e:
         error_data = {
@@ -44,4 +38,30 @@ def news_api(request):
             "end": end,
             "error": str(e)
         }
-        return Response(error_data, status=500)
+        return json_response(error_data, status=500)
+
+
+@async_api_view(['GET'])
+async def news_stream_api(request):
+    """
+    Streaming variant of /api/news/ (same query parameters), as Server-Sent Events:
+
+      event: stage   data: {"stage": "perplexity", "citations": 5}
+      event: stage   data: {"stage": "articles", "articles": 12}
+      event: token   data: {"text": "..."}          (one per gpt-4o text delta)
+      event: done    data: {"complex": "...", "cache": "miss"}
+
+    A cached explanation is sent as a lone "done" event, and so is one that another request
+    is already generating, once it finishes. Failures end the stream with an "error" event.
+    """
+    stockname = request.GET.get('stockname', 'AAPL')
+    start = request.GET.get('start', '2025-01-01').replace('"', '')
+    end = request.GET.get('end', '2025-01-10').replace('"', '')
+
+    if not settings.API_PER or not settings.API_OPENAI:
+        return json_response({
+            "status_code": 500,
+            "error": "API keys not configured"
+        }, status=500)
+
+    return sse_response(stream_explanation(stockname, start, end))
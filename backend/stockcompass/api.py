@@ -0,0 +1,82 @@
+# stockcompass/api.py
+"""
+Helpers for the native async JSON endpoints of the project's apps.
+
+Django REST framework's ``api_view`` only wraps sync functions, so these endpoints are
+plain ``async def`` Django views: under an ASGI server they run on the event loop and
+never pin a worker thread while waiting on upstream APIs.
+"""
+import functools
+
+import orjson
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+def json_response(data, status=200):
+    """
+    Render ``data`` with orjson (NumPy arrays and scalars included; NaN becomes null).
+    """
+    return HttpResponse(
+        orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        content_type="application/json",
+    )
+
+
+def sse_response(events):
+    """
+    Stream ``events``, an async iterable of (event name, JSON-serializable data) pairs, as
+    Server-Sent Events.
+
+    A comment line is sent first so clients get the headers and first byte immediately.
+    Under ASGI the stream is driven by the event loop: no thread is held while it waits.
+    An exception raised by ``events`` ends the stream with an "error" event.
+    """
+    async def stream():
+        yield b": stream open\n\n"
+        try:
+            async for event, data in events:
+                payload = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+                yield b"event: %s\ndata: %s\n\n" % (event.encode(), payload)
+        except Exception as e:
+            yield b"event: error\ndata: %s\n\n" % orjson.dumps({"error": str(e)})
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Tell nginx-style proxies not to buffer the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def json_body(request):
+    """
+    Parse a JSON request body; an empty body is an empty object.
+    """
+    if not request.body:
+        return {}
+    return orjson.loads(request.body)
+
+
+def async_api_view(methods):
+    """
+    Decorator for async JSON endpoints: rejects other HTTP methods with 405 and exempts the
+    view from CSRF checks (the API is called cross-origin with JSON, like the DRF views
+    it replaces).
+
+    Parameters:
+        methods (list): Allowed HTTP methods, e.g. ["GET"].
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({
+                    "status_code": 405,
+                    "error": f"Method {request.method} not allowed"
+                }, status=405)
+            return await view(request, *args, **kwargs)
+
+        # Set directly: Django 4.2's csrf_exempt wraps the view in a sync function.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
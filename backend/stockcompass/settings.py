@@ -89,6 +89,74 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The "stockdata" alias holds finished API payloads. The local-memory backend evicts the
+# least recently used entry once MAX_ENTRIES is reached (CULL_FREQUENCY == MAX_ENTRIES
+# drops one entry at a time). Set STOCKDATA_CACHE_BACKEND/LOCATION to share it between
+# processes, e.g. with Redis (and adjust OPTIONS for that backend). The "garch" alias holds
+# estimated GARCH params (stockdata.analytics.GarchFitCache) apart from the payloads, so
+# fits neither evict responses nor skew their hit rate.
+
+STOCKDATA_CACHE_MAX_ENTRIES = int(os.getenv("STOCKDATA_CACHE_MAX_ENTRIES", "1024"))
+STOCKDATA_GARCH_CACHE_MAX_ENTRIES = int(os.getenv("STOCKDATA_GARCH_CACHE_MAX_ENTRIES", "1024"))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'stockdata': {
+        'BACKEND': os.getenv("STOCKDATA_CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv("STOCKDATA_CACHE_LOCATION", 'stockdata-responses'),
+        'OPTIONS': {
+            'MAX_ENTRIES': STOCKDATA_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': STOCKDATA_CACHE_MAX_ENTRIES,
+        },
+    },
+    'garch': {
+        'BACKEND': os.getenv("STOCKDATA_GARCH_CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv("STOCKDATA_GARCH_CACHE_LOCATION", 'stockdata-garch-fits'),
+        'OPTIONS': {
+            'MAX_ENTRIES': STOCKDATA_GARCH_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': STOCKDATA_GARCH_CACHE_MAX_ENTRIES,
+        },
+    },
+}
+
+
+# Rows per executemany batch when upserting downloaded bars into StockData.
+STOCKDATA_INGEST_BATCH_SIZE = int(os.getenv("STOCKDATA_INGEST_BATCH_SIZE", "2000"))
+
+
+# Threads for blocking yfinance calls. Requests await them without holding a worker, so
+# this bounds concurrent upstream waits per process, not concurrent requests.
+STOCKDATA_UPSTREAM_THREADS = int(os.getenv("STOCKDATA_UPSTREAM_THREADS", "256"))
+
+
+# Rolling indicators materialized per bar at ingest (stockdata.indicators): comma-separated
+# <kind>_<window> names, kinds sma, return, volatility and rsi.
+STOCKDATA_INDICATORS = os.getenv("STOCKDATA_INDICATORS", "sma_20,sma_50,return_20,volatility_30,rsi_14").split(",")
+
+
+# Seconds the static ticker metadata (currency, exchange, long name) stays cached.
+STOCKDATA_STATIC_METADATA_TTL = int(os.getenv("STOCKDATA_STATIC_METADATA_TTL", str(7 * 24 * 3600)))
+
+
+# New observations a series may gain while its GARCH fit is only warm-started; beyond
+# that the fit is redone from scratch.
+STOCKDATA_GARCH_REFIT_EVERY = int(os.getenv("STOCKDATA_GARCH_REFIT_EVERY", "50"))
+
+
+# Worker processes for CPU-bound analytics (0 runs them on threads in this process), the
+# most tasks queued or running before requests are turned away, and the per-task timeout.
+STOCKDATA_ANALYTICS_PROCESSES = int(os.getenv("STOCKDATA_ANALYTICS_PROCESSES", "2"))
+STOCKDATA_ANALYTICS_MAX_PENDING = int(os.getenv("STOCKDATA_ANALYTICS_MAX_PENDING", "32"))
+STOCKDATA_ANALYTICS_TIMEOUT = float(os.getenv("STOCKDATA_ANALYTICS_TIMEOUT", "30"))
+
+# Analytics workers run this much below the web process's CPU priority (os.nice).
+STOCKDATA_ANALYTICS_NICENESS = int(os.getenv("STOCKDATA_ANALYTICS_NICENESS", "10"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -134,6 +202,35 @@ NEWS_API_KEYS = os.getenv("NEWS_API_KEYS", "demo").split(",")
 NEWS_API_BASE_URL = os.getenv("NEWS_API_BASE_URL",)
 NEWS_DATA_SOURCE = "ALPHA"
 
+# Seconds a cached news explanation is served as fresh, and up to which age a stale one is
+# still served while it is refreshed in the background.
+NEWS_EXPLANATION_TTL = int(os.getenv("NEWS_EXPLANATION_TTL", str(24 * 3600)))
+NEWS_EXPLANATION_MAX_STALE = int(os.getenv("NEWS_EXPLANATION_MAX_STALE", str(7 * 24 * 3600)))
+
+# Article texts kept in the news article cache (least recently used evicted first), and
+# seconds before a URL that failed or had no text is tried again.
+NEWS_ARTICLE_CACHE_MAX_ENTRIES = int(os.getenv("NEWS_ARTICLE_CACHE_MAX_ENTRIES", "20000"))
+NEWS_ARTICLE_NEGATIVE_TTL = int(os.getenv("NEWS_ARTICLE_NEGATIVE_TTL", str(6 * 3600)))
+
+# Shared HTTP client of the news pipeline (newsdata.fetcher): requests in flight in total
+# and per host, connect/read timeouts and the overall deadline of one request, in seconds.
+# Perplexity calls get their own, longer deadline.
+NEWS_HTTP_MAX_CONNECTIONS = int(os.getenv("NEWS_HTTP_MAX_CONNECTIONS", "64"))
+NEWS_HTTP_MAX_PER_HOST = int(os.getenv("NEWS_HTTP_MAX_PER_HOST", "4"))
+NEWS_HTTP_CONNECT_TIMEOUT = float(os.getenv("NEWS_HTTP_CONNECT_TIMEOUT", "5"))
+NEWS_HTTP_READ_TIMEOUT = float(os.getenv("NEWS_HTTP_READ_TIMEOUT", "10"))
+NEWS_HTTP_DEADLINE = float(os.getenv("NEWS_HTTP_DEADLINE", "20"))
+NEWS_PERPLEXITY_DEADLINE = float(os.getenv("NEWS_PERPLEXITY_DEADLINE", "60"))
+
+# Prompt tokens the fetched news articles may take in the gpt-4o enhancement request; the
+# most relevant sentences are kept (newsdata.compaction).
+NEWS_PROMPT_TOKEN_BUDGET = int(os.getenv("NEWS_PROMPT_TOKEN_BUDGET", "3000"))
+
+# Column store of market index series (newsdata.market_direction).
+MARKET_DATA_DIR = os.getenv("MARKET_DATA_DIR", str(BASE_DIR / "market_data"))
+# Seconds before an index series that ends before a requested date is downloaded again.
+MARKET_DATA_REFRESH_TTL = int(os.getenv("MARKET_DATA_REFRESH_TTL", "3600"))
+
 # session
 SESSION_ID = 'DEFAULT_SESSION'
 
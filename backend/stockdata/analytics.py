@@ -0,0 +1,514 @@
+# stockdata/analytics.py
+import hashlib
+import threading
+import warnings
+
+import numpy as np
+import scipy.stats
+from arch import arch_model
+from arch.utility.exceptions import StartingValueWarning
+from django.conf import settings
+
+from .cache import ResponseCache, interval_ttl, response_cache
+from .detector import garch_volatility, live_ranges, seed_detector
+from .models import StockWatermark
+from .pool import analytics_pool
+from .series_codec import decode_json_series
+from .utils import fetch_price_yf, load_closes, normalize_ticker
+
+# Warm-started fits drift from a clean fit over time; refit from scratch once the series has
+# moved this many observations away from the last full fit.
+GARCH_REFIT_EVERY = getattr(settings, "STOCKDATA_GARCH_REFIT_EVERY", 50)
+GARCH_FIT_TTL = 7 * 24 * 3600
+# Ranges computed from stored bars only change when a new bar arrives.
+STORED_RANGES_TTL = 24 * 3600
+
+
+def fit_garch(changes, starting_values=None):
+    """
+    Blocking: fit a GARCH(1,1) model with a constant mean to ``changes``.
+
+    Returns:
+        tuple: (params as [mu, omega, alpha, beta], conditional volatility array).
+    """
+    result = arch_model(changes, vol='Garch', p=1, q=1).fit(disp='off', starting_values=starting_values)
+    return result.params.to_numpy(), np.asarray(result.conditional_volatility)
+
+
+# Warm starts are pulled this far inside arch's GARCH(1,1) bounds (omega within
+# [1e-8, 10] x the mean squared residual, alpha + beta <= 1), which it checks inclusively.
+GARCH_START_MAX_PERSISTENCE = 0.99
+GARCH_START_OMEGA_RANGE = (1e-6, 9.0)
+
+
+def feasible_starting_values(changes, params):
+    """
+    ``params`` ([mu, omega, alpha, beta] of a previous fit) clipped into the interior of the
+    region arch accepts as starting values for ``changes``. A previous fit on the boundary
+    (alpha + beta close to 1) or on a series of another scale would otherwise be ignored.
+    """
+    mu, omega, alpha, beta = np.asarray(params, dtype=float)
+    scale = float(np.mean((changes - np.mean(changes)) ** 2))
+    alpha, beta = np.clip([alpha, beta], 0.0, 1.0)
+    persistence = alpha + beta
+    if persistence > GARCH_START_MAX_PERSISTENCE:
+        alpha, beta = np.array([alpha, beta]) * GARCH_START_MAX_PERSISTENCE / persistence
+    omega = np.clip(omega, *(scale * np.array(GARCH_START_OMEGA_RANGE)))
+    return np.array([mu, omega, alpha, beta])
+
+
+def warm_fit_garch(changes, params):
+    """
+    Blocking: ``fit_garch`` started from a previous fit's ``params``.
+
+    Returns:
+        tuple: (params, conditional volatility, whether arch accepted the starting values;
+        when it did not, the fit started from arch's own).
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", StartingValueWarning)
+            return (*fit_garch(changes, feasible_starting_values(changes, params)), True)
+    except StartingValueWarning:
+        return (*fit_garch(changes), False)
+
+
+# Starting value grid of the batched estimator, as used by arch for GARCH(1,1): alpha and
+# persistence (alpha + beta), picked per series by the likelihood at the start.
+GARCH_START_ALPHAS = (0.01, 0.05, 0.1, 0.2)
+GARCH_START_PERSISTENCE = (0.5, 0.7, 0.9, 0.98)
+
+# arch's backcast: exponentially weighted mean of the first squared residuals.
+BACKCAST_WEIGHT = 0.94
+BACKCAST_OBS = 75
+
+
+def _left_align(changes):
+    """
+    Move the observations of every row to its start, preserving their order.
+
+    Returns:
+        tuple: (aligned values with zeros after each row's end, observation mask, row
+        lengths, column order that maps aligned positions back to the input).
+    """
+    valid = ~np.isnan(changes)
+    order = np.argsort(~valid, axis=1, kind="stable")
+    lengths = valid.sum(axis=1)
+    mask = np.arange(changes.shape[1]) < lengths[:, None]
+    aligned = np.where(mask, np.take_along_axis(changes, order, axis=1), 0.0)
+    return aligned, mask, lengths, order
+
+
+def _backcasts(resids, lengths):
+    tau = np.arange(min(BACKCAST_OBS, resids.shape[1]))
+    weights = np.where(tau < lengths[:, None], BACKCAST_WEIGHT ** tau, 0.0)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.sum(weights * resids[:, :tau.size] ** 2, axis=1)
+
+
+def _beta_filter(inputs, beta, initial):
+    """
+    h[t] = beta * h[t - 1] + inputs[t] along the first (time) axis, with h[-1] = initial.
+    One vectorized step per time index, across all series at once.
+    """
+    out = np.empty_like(inputs)
+    previous = initial
+    for t in range(inputs.shape[0]):
+        np.multiply(beta, previous, out=out[t])
+        out[t] += inputs[t]
+        previous = out[t]
+    return out
+
+
+def _garch_variance(mu, omega, alpha, beta, y, backcast):
+    """
+    Residuals, squared residuals and GARCH(1,1) conditional variances of time-major ``y``.
+    """
+    resids = y - mu
+    squared = resids * resids
+    shocks = np.empty_like(y)
+    shocks[0] = omega + alpha * backcast
+    shocks[1:] = omega + alpha * squared[:-1]
+    variance = _beta_filter(shocks, beta, backcast)
+    np.maximum(variance, 1e-12, out=variance)
+    return resids, squared, variance
+
+
+def _unpack_garch(theta):
+    """
+    Unconstrained parameters -> (mu, omega, alpha, beta, persistence, alpha share).
+    omega > 0 and alpha, beta >= 0 with alpha + beta < 1 hold by construction.
+    """
+    mu, log_omega, persistence_logit, share_logit = theta
+    persistence = 1.0 / (1.0 + np.exp(-persistence_logit))
+    share = 1.0 / (1.0 + np.exp(-share_logit))
+    return mu, np.exp(log_omega), persistence * share, persistence * (1 - share), persistence, share
+
+
+def _garch_loglik(theta, y, mask, backcast):
+    mu, omega, alpha, beta, _, _ = _unpack_garch(theta)
+    _, squared, variance = _garch_variance(mu, omega, alpha, beta, y, backcast)
+    return -0.5 * np.sum(mask * (np.log(variance) + squared / variance), axis=0)
+
+
+def _garch_scores(theta, y, mask, backcast, per_obs=False):
+    """
+    Gaussian log-likelihood (up to a constant) and its gradient in ``theta``, using forward
+    sensitivities of the variance recursion. With ``per_obs`` the gradient is returned per
+    observation (T x 4 x N) for outer-product Hessian estimates.
+    """
+    mu, omega, alpha, beta, persistence, share = _unpack_garch(theta)
+    resids, squared, variance = _garch_variance(mu, omega, alpha, beta, y, backcast)
+    inverse = 1.0 / variance
+    loglik = -0.5 * np.sum(mask * (np.log(variance) + squared * inverse), axis=0)
+
+    # d variance[t] / d (mu, omega, alpha, beta) follow the same beta recursion.
+    nobs, count = y.shape
+    inputs = np.empty((nobs, 4, count))
+    inputs[0, 0] = 0.0
+    inputs[1:, 0] = -2 * alpha * resids[:-1]
+    inputs[:, 1] = 1.0
+    inputs[0, 2] = backcast
+    inputs[1:, 2] = squared[:-1]
+    inputs[0, 3] = backcast
+    inputs[1:, 3] = variance[:-1]
+    sensitivities = _beta_filter(inputs, beta, np.zeros((4, count)))
+    sensitivities *= (-0.5 * mask * (inverse - squared * inverse * inverse))[:, None, :]
+    sensitivities[:, 0] += mask * resids * inverse
+
+    # Chain rule from (mu, omega, alpha, beta) to theta.
+    jacobian = np.zeros((4, 4, count))
+    jacobian[0, 0] = 1.0
+    jacobian[1, 1] = omega
+    d_persistence = persistence * (1 - persistence)
+    d_share = share * (1 - share)
+    jacobian[2, 2] = share * d_persistence
+    jacobian[2, 3] = persistence * d_share
+    jacobian[3, 2] = (1 - share) * d_persistence
+    jacobian[3, 3] = -persistence * d_share
+    if per_obs:
+        return loglik, np.einsum("tkn,kjn->tjn", sensitivities, jacobian)
+    return loglik, np.einsum("kn,kjn->jn", sensitivities.sum(axis=0), jacobian)
+
+
+def fit_garch_batch(changes, maxiter=200, tol=1e-9):
+    """
+    Blocking: fit a constant-mean GARCH(1,1) model to every row of a (series x time) array
+    in one vectorized maximum likelihood run.
+
+    Rows may have different lengths: NaN marks missing observations, and each row's
+    remaining observations are left-aligned and masked, so the estimates equal fitting the
+    row's observations alone. Estimation follows arch (same backcast, starting value grid
+    and Gaussian likelihood) and agrees with ``fit_garch`` to about 1e-3 relative in the
+    parameters; every row is optimized separately with BFGS, started from an outer product
+    of gradients Hessian, with its own line search and convergence test.
+
+    Parameters:
+        changes (array-like): N x T price changes, NaN where a series has no observation.
+        maxiter (int): Maximum BFGS iterations.
+        tol (float): Stop a row once its predicted likelihood gain per observation is below
+            this.
+
+    Returns:
+        tuple: (N x 4 params as [mu, omega, alpha, beta], N x T conditional volatility in
+        the input's positions, NaN where missing). Rows with fewer than two observations
+        or no variation get NaN.
+    """
+    changes = np.atleast_2d(np.asarray(changes, dtype=float))
+    count, width = changes.shape
+    params = np.full((count, 4), np.nan)
+    volatility = np.full((count, width), np.nan)
+
+    aligned, mask, lengths, order = _left_align(changes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = aligned.sum(axis=1) / lengths
+        scale = np.sqrt(np.sum(np.where(mask, aligned - mean[:, None], 0.0) ** 2, axis=1) / lengths)
+    usable = np.flatnonzero((lengths >= 2) & (scale > 0))
+    if usable.size == 0:
+        return params, volatility
+
+    # Estimate on standardized rows; mu and omega are scaled back at the end.
+    lengths, scale = lengths[usable], scale[usable]
+    z = aligned[usable] / scale[:, None]
+    z_mean = mean[usable] / scale
+    mask_rows = mask[usable]
+    backcast = _backcasts(np.where(mask_rows, z - z_mean[:, None], 0.0), lengths)
+    y = np.ascontiguousarray(z.T)
+    obs_mask = np.ascontiguousarray(mask_rows.T).astype(float)
+    count = usable.size
+
+    # Best start per row from arch's grid (standardized residual variance is 1).
+    best = np.full(count, -np.inf)
+    theta = np.zeros((4, count))
+    for alpha in GARCH_START_ALPHAS:
+        for persistence in GARCH_START_PERSISTENCE:
+            candidate = np.array([
+                z_mean,
+                np.full(count, np.log(1 - persistence)),
+                np.full(count, np.log(persistence / (1 - persistence))),
+                np.full(count, np.log(alpha / (persistence - alpha))),
+            ])
+            loglik = _garch_loglik(candidate, y, obs_mask, backcast)
+            better = loglik > best
+            best = np.where(better, loglik, best)
+            theta = np.where(better, candidate, theta)
+
+    # Minimize f = -loglik / n per row; the inverse Hessian starts from the gradient outer product.
+    loglik, per_obs = _garch_scores(theta, y, obs_mask, backcast, per_obs=True)
+    objective = -loglik / lengths
+    gradient = per_obs.sum(axis=0) / lengths
+    outer = np.einsum("tkn,tln->nkl", per_obs, per_obs) / lengths[:, None, None]
+    inverse_hessian = np.linalg.inv(outer + 1e-10 * np.eye(4))
+
+    active = np.arange(count)
+    for _ in range(maxiter):
+        if active.size == 0:
+            break
+        th, grad, inv_h, obj, n = theta[:, active], gradient[:, active], inverse_hessian[active], objective[active], lengths[active]
+        rows = (y[:, active], obs_mask[:, active], backcast[active])
+        step = np.einsum("nkl,ln->kn", inv_h, grad)
+        slope = np.sum(grad * step, axis=0)
+        converged = slope <= tol
+
+        # Backtracking (Armijo) line search, per row.
+        step_size = np.ones(active.size)
+        loglik_new, grad_new = _garch_scores(th + step, *rows)
+        obj_new, grad_new = -loglik_new / n, grad_new / n
+        failing = ~(obj_new <= obj - 1e-4 * slope)
+        shortened = np.zeros(active.size, dtype=bool)
+        for _ in range(30):
+            if not failing.any():
+                break
+            idx = np.flatnonzero(failing)
+            step_size[idx] *= 0.5
+            trial = th[:, idx] + step_size[idx] * step[:, idx]
+            obj_new[idx] = -_garch_loglik(trial, rows[0][:, idx], rows[1][:, idx], rows[2][idx]) / n[idx]
+            shortened[idx] = True
+            failing[idx] = ~(obj_new[idx] <= obj[idx] - 1e-4 * step_size[idx] * slope[idx])
+        idx = np.flatnonzero(shortened & ~failing)
+        if idx.size:
+            trial = th[:, idx] + step_size[idx] * step[:, idx]
+            grad_new[:, idx] = _garch_scores(trial, rows[0][:, idx], rows[1][:, idx], rows[2][idx])[1] / n[idx]
+
+        # BFGS update of the inverse Hessian of f (whose gradient is -grad).
+        accepted = ~failing
+        s = np.where(accepted, step_size * step, 0.0)
+        y_diff = grad - grad_new
+        curvature = np.sum(s * y_diff, axis=0)
+        update = accepted & (curvature > 1e-12)
+        rho = np.where(update, 1.0 / np.where(update, curvature, 1.0), 0.0)
+        left = np.eye(4) - rho[:, None, None] * np.einsum("kn,ln->nkl", s, y_diff)
+        updated = np.einsum("nkl,nlm,npm->nkp", left, inv_h, left) + rho[:, None, None] * np.einsum("kn,ln->nkl", s, s)
+
+        inverse_hessian[active] = np.where(update[:, None, None], updated, inv_h)
+        theta[:, active] = th + s
+        gradient[:, active] = np.where(accepted, grad_new, grad)
+        objective[active] = np.where(accepted, obj_new, obj)
+        active = active[~(converged | failing)]
+
+    mu, omega, alpha, beta, _, _ = _unpack_garch(theta)
+    params[usable] = np.stack([mu * scale, omega * scale ** 2, alpha, beta], axis=1)
+    _, _, variance = _garch_variance(mu, omega, alpha, beta, y, backcast)
+    aligned_volatility = np.where(mask_rows, np.sqrt(variance.T) * scale[:, None], np.nan)
+    rows_volatility = np.full((usable.size, width), np.nan)
+    np.put_along_axis(rows_volatility, order[usable], aligned_volatility, axis=1)
+    volatility[usable] = rows_volatility
+    return params, volatility
+
+
+def series_fingerprint(changes):
+    return hashlib.blake2b(np.ascontiguousarray(changes, dtype=float).tobytes(), digest_size=16).hexdigest()
+
+
+class GarchFitCache:
+    """
+    Estimated GARCH(1,1) params per (ticker, interval, series fingerprint).
+
+    An unchanged series reuses its params and skips the optimizer. A changed series of a
+    known ticker/interval warm-starts from the latest params, until ``refit_every`` new
+    observations have come in since the last full fit. A series that grew counts its added
+    observations; one that changed at the same length (a rolling window moving on) counts
+    at least one. Warm starts are clipped into arch's feasible region; one arch still
+    rejects runs from its own starting values and counts as a fallback, not as warm. Fits
+    run on ``pool`` (an ``AnalyticsPool``). Counters are per process.
+    """
+
+    def __init__(self, cache, pool, refit_every=GARCH_REFIT_EVERY):
+        self.cache = cache
+        self.pool = pool
+        self.refit_every = refit_every
+        self._lock = threading.Lock()
+        self.counts = {"reused": 0, "warm": 0, "fallback": 0, "full": 0}
+
+    def _count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    async def conditional_volatility(self, changes, ticker=None, interval=None):
+        """
+        GARCH(1,1) conditional volatility of ``changes``, fitting only when needed.
+        """
+        return (await self.fit(changes, ticker=ticker, interval=interval))[1]
+
+    async def fit(self, changes, ticker=None, interval=None):
+        """
+        (params, conditional volatility) of ``changes``, fitting only when needed.
+        """
+        fingerprint = series_fingerprint(changes)
+        series = (ticker or "-", interval or "-")
+        exact_key = self.cache.make_key("garch", *series, fingerprint)
+
+        params = await self.cache.aget(exact_key)
+        if params is not None:
+            self._count("reused")
+            params = np.asarray(params)
+            return params, await self.pool.run(garch_volatility, changes, params)
+
+        # Only a named series has a previous fit worth starting from.
+        latest_key = self.cache.make_key("garch", *series) if ticker else None
+        latest = await self.cache.aget(latest_key) if latest_key else None
+        nobs = len(changes)
+        since_refit = 0
+        if latest is not None and "since_refit" in latest:
+            since_refit = latest["since_refit"] + max(nobs - latest["nobs"], 1)
+        if 0 < since_refit < self.refit_every:
+            params, volatility, warm = await self.pool.run(warm_fit_garch, changes, latest["params"])
+            self._count("warm" if warm else "fallback")
+            if not warm:
+                since_refit = 0
+        else:
+            self._count("full")
+            params, volatility = await self.pool.run(fit_garch, changes)
+            since_refit = 0
+
+        await self.cache.aset(exact_key, params.tolist(), GARCH_FIT_TTL)
+        if latest_key:
+            await self.cache.aset(
+                latest_key, {"params": params.tolist(), "nobs": nobs, "since_refit": since_refit}, GARCH_FIT_TTL
+            )
+        return params, volatility
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+# Fits have their own cache alias, apart from the response payloads.
+garch_fit_cache = ResponseCache(getattr(settings, "STOCKDATA_GARCH_CACHE_ALIAS", "garch"), prefix="stockdata")
+garch_fits = GarchFitCache(garch_fit_cache, analytics_pool)
+
+
+async def unusual_ranges(data, confidence_level=0.05, ticker=None, interval=None):
+    """
+    Identify unusual date ranges using GARCH-based volatility and a statistical test.
+    No machine learning is used.
+
+    When ``ticker``/``interval`` name the series, GARCH fits are cached and warm-started
+    across calls (see ``GarchFitCache``).
+    """
+    # Validate and prepare data
+    times, prices = decode_json_series(data)
+    return await detect_unusual_ranges(times, prices, confidence_level, ticker=ticker, interval=interval)
+
+
+async def detect_unusual_ranges(times, prices, confidence_level=0.05, ticker=None, interval=None):
+    """
+    ``unusual_ranges`` on NumPy arrays: datetime64 ``times`` and float ``prices``.
+    """
+    if len(prices) < 2:
+        raise ValueError("Not enough price data to compute daily changes.")
+
+    # Compute daily changes and dates
+    daily_changes = np.diff(prices)
+
+    # Fit GARCH model (or reuse a cached fit)
+    forecast = await garch_fits.conditional_volatility(daily_changes, ticker=ticker, interval=interval)
+    return group_unusual_ranges(times, daily_changes, forecast, confidence_level)
+
+
+def group_unusual_ranges(times, daily_changes, forecast, confidence_level=0.05):
+    """
+    Flag the changes beyond the GARCH threshold and group them into formatted ranges.
+    """
+    daily_dates = times[1:]
+
+    # Compute critical value for the specified confidence level
+    crit_value = scipy.stats.norm.ppf(1 - confidence_level / 2)
+
+    # Identify unusual dates using GARCH-based volatility and statistical test
+    mask = (np.abs(daily_changes) > (crit_value * forecast))
+    unusual_dates = daily_dates[mask]
+
+    if unusual_dates.size == 0:
+        raise Exception("No unusual dates found with the specified threshold.")
+
+    # Sort the unusual dates
+    unusual_dates = np.sort(unusual_dates)
+
+    # Compute gaps between consecutive unusual dates
+    gaps = np.diff(unusual_dates)
+    gaps_in_days = gaps.astype('timedelta64[D]').astype(int)
+
+    # Group unusual dates into ranges based on gaps
+    gap_threshold = np.mean(gaps_in_days) + np.std(gaps_in_days)
+    gap_indices = np.where(gaps_in_days > gap_threshold)[0]
+
+    if gap_indices.size == 0:
+        ranges = [(unusual_dates[0], unusual_dates[-1])]
+    else:
+        start_indices = np.r_[0, gap_indices + 1]
+        end_indices = np.r_[gap_indices, unusual_dates.size - 1]
+        ranges = [(unusual_dates[s], unusual_dates[e]) for s, e in zip(start_indices, end_indices) if s != e]
+
+    # Format and adjust ranges
+    max_date = times.max()
+    adjusted_ranges = []
+    for start, end in ranges:
+        if start == end:
+            if start < max_date:
+                end = start + np.timedelta64(2, 'D')
+            else:
+                start = start - np.timedelta64(2, 'D')
+        adjusted_ranges.append((str(start.astype('M8[D]')), str(end.astype('M8[D]'))))
+
+    return adjusted_ranges
+
+
+async def stored_unusual_ranges(stock_name, period="1y", interval="1d", confidence_level=0.05):
+    """
+    ``unusual_ranges`` of a stored series, read straight from StockData.
+
+    The series is brought up to date first (within the interval's TTL a repeated request
+    does not even do that), and results are cached per (ticker, interval, period, last
+    bar). A new bar is flagged by the series' streaming detector (``live_ranges``) without
+    fitting; GARCH is only fitted again, reseeding the detector, when there is no usable
+    detector or it has taken ``garch_fits.refit_every`` bars since its last fit.
+    """
+    ticker = normalize_ticker(stock_name)
+    request_key = response_cache.make_key("unusual", ticker, period, interval, confidence_level)
+    ranges = await response_cache.aget(request_key)
+    if ranges is not None:
+        return ranges
+
+    fetch_result = await fetch_price_yf(ticker_symbol=ticker, period=period, interval=interval)
+    if fetch_result is None:
+        raise ValueError(f"No price data for {ticker}")
+    watermark = await StockWatermark.objects.aget(ticker=ticker, interval=interval)
+    result_key = response_cache.make_key(
+        "unusual", ticker, period, interval, confidence_level, watermark.last_timestamp.isoformat()
+    )
+    ranges = await response_cache.aget(result_key)
+    if ranges is None:
+        ranges = await live_ranges(ticker, period, interval, confidence_level, garch_fits.refit_every)
+    if ranges is None:
+        times, prices = await load_closes(ticker, interval, since=fetch_result["window_start"])
+        if len(prices) < 2:
+            raise ValueError("Not enough price data to compute daily changes.")
+        params, forecast = await garch_fits.fit(np.diff(prices), ticker=ticker, interval=interval)
+        # The streaming detector of the series restarts from this fit; bar ingest keeps it
+        # current until the next one.
+        await seed_detector(ticker, interval, times, prices, params, forecast, period=period)
+        ranges = group_unusual_ranges(times, np.diff(prices), forecast, confidence_level)
+    await response_cache.aset(result_key, ranges, STORED_RANGES_TTL)
+    await response_cache.aset(request_key, ranges, interval_ttl(interval))
+    return ranges
@@ -0,0 +1,134 @@
+# stockdata/cache.py
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .utils import interval_delta
+
+# US equity session used to decide when a bar can still change.
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = datetime.time(9, 30)
+MARKET_CLOSE = datetime.time(16, 0)
+
+# Never cache for less than this, so a burst inside one second still shares an entry.
+MIN_TTL_SECONDS = 1
+
+
+def _next_weekday(day):
+    day += datetime.timedelta(days=1)
+    while day.weekday() >= 5:
+        day += datetime.timedelta(days=1)
+    return day
+
+
+def _next_session_boundary(now, boundary):
+    """
+    Next weekday occurrence of ``boundary`` (market-local time) strictly after ``now``.
+    """
+    day = now.date()
+    candidate = datetime.datetime.combine(day, boundary, tzinfo=MARKET_TZ)
+    if day.weekday() >= 5 or candidate <= now:
+        candidate = datetime.datetime.combine(_next_weekday(day), boundary, tzinfo=MARKET_TZ)
+    return candidate
+
+
+def market_is_open(now=None):
+    now = (now or datetime.datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def interval_ttl(interval, now=None):
+    """
+    Seconds a payload built from ``interval`` bars stays fresh.
+
+    Intraday bars change every bar while the market is open and not at all while it is
+    closed; daily and longer bars only change at the next session close.
+
+    Parameters:
+        interval (str): yfinance interval string, e.g. '1m', '60m', '1d'.
+        now (datetime, optional): Reference time, defaults to the current time.
+
+    Returns:
+        int: Time-to-live in seconds.
+    """
+    now = (now or datetime.datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    step = interval_delta(interval)
+    if step < datetime.timedelta(days=1):
+        if market_is_open(now):
+            until_close = _next_session_boundary(now, MARKET_CLOSE) - now
+            ttl = min(step, until_close)
+        else:
+            ttl = _next_session_boundary(now, MARKET_OPEN) - now
+    else:
+        ttl = _next_session_boundary(now, MARKET_CLOSE) - now
+    return max(int(ttl.total_seconds()), MIN_TTL_SECONDS)
+
+
+class ResponseCache:
+    """
+    Read-through cache for finished API payloads on top of a Django cache alias.
+
+    Size bound and eviction come from the backend configuration (see ``CACHES`` in
+    settings; the default local-memory backend evicts least recently used entries).
+    Hit/miss counters are kept per process.
+    """
+
+    def __init__(self, alias, prefix):
+        self.alias = alias
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def make_key(self, *parts):
+        return ":".join([self.prefix, *(str(part) for part in parts)])
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    async def aget(self, key):
+        value = await self.backend.aget(key)
+        self._count(value is not None)
+        return value
+
+    async def aget_first(self, *keys):
+        """
+        (key, value) of the first of ``keys`` that is cached, or (None, None); counted as
+        one lookup whichever key answers.
+        """
+        for key in keys:
+            value = await self.backend.aget(key)
+            if value is not None:
+                self._count(True)
+                return key, value
+        self._count(False)
+        return None, None
+
+    async def aset(self, key, value, ttl):
+        await self.backend.aset(key, value, timeout=ttl)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+            }
+
+
+response_cache = ResponseCache(
+    getattr(settings, "STOCKDATA_CACHE_ALIAS", "stockdata"),
+    prefix="stockdata",
+)
@@ -0,0 +1,303 @@
+# stockdata/detector.py
+"""
+Streaming GARCH anomaly detector of stored series, kept up to date at bar ingest.
+
+``stored_unusual_ranges`` seeds a series' detector whenever it fits GARCH params to the
+stored closes; from then on ``advance_detector`` (called by ``utils._store_bars``) feeds it
+each new bar in O(1) and saves it, and ``stored_unusual_ranges`` serves its flags
+(``live_ranges``) without fitting again until the detector is due for a refit.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+import scipy.stats
+from arch import arch_model
+
+from .models import AnomalyDetectorState, StockData
+
+# Live flags use the default confidence level of unusual_ranges.
+DETECTOR_CONFIDENCE_LEVEL = 0.05
+
+
+def garch_volatility(changes, params):
+    """
+    Blocking: conditional volatility of ``changes`` under fixed GARCH(1,1) params, without
+    running the optimizer.
+    """
+    return np.asarray(arch_model(changes, vol='Garch', p=1, q=1).fix(params).conditional_volatility)
+
+
+def _time_text(value):
+    return None if value is None else str(value)
+
+
+def _parse_time(value):
+    return None if value is None else np.datetime64(value)
+
+
+class StreamingAnomalyDetector:
+    """
+    Incremental version of ``unusual_ranges`` for one series: O(1) work per new bar.
+
+    Holds fixed GARCH(1,1) params, the variance forecast for the next bar and the last
+    price. Each new bar is flagged with the same test as ``unusual_ranges`` (absolute
+    change above ``crit_value`` conditional standard deviations) and the variance forecast
+    is rolled forward one step.
+
+    Flagged bars are grouped into ranges as they arrive: a flag whose gap (in days) to the
+    previous flag exceeds the running mean + standard deviation of all gaps so far
+    (Welford) closes the open range and starts a new one. ``unusual_ranges`` applies the
+    final gap threshold to all gaps at once, so ranges closed early on can differ from a
+    full recomputation; bars themselves are flagged identically.
+
+    The whole state is plain JSON via ``to_dict``/``from_dict``.
+    """
+
+    def __init__(self, mu, omega, alpha, beta, variance, last_price, last_time, crit_value):
+        self.mu = float(mu)
+        self.omega = float(omega)
+        self.alpha = float(alpha)
+        self.beta = float(beta)
+        # Conditional variance forecast for the next bar.
+        self.variance = float(variance)
+        self.last_price = float(last_price)
+        self.last_time = np.datetime64(last_time)
+        self.crit_value = float(crit_value)
+        self.closed_ranges = []
+        self.range_start = None
+        self.range_end = None
+        self.range_flags = 0
+        self.flag_count = 0
+        # Welford accumulators of the day gaps between consecutive flags.
+        self.gap_count = 0
+        self.gap_mean = 0.0
+        self.gap_m2 = 0.0
+        # Bars fed through update() since the params were fitted.
+        self.updates = 0
+        # Period of the stored window the detector was seeded from, if any.
+        self.period = None
+
+    @classmethod
+    def from_history(cls, times, prices, params, confidence_level=0.05, volatility=None):
+        """
+        Detector that has already seen ``times``/``prices`` under GARCH ``params``
+        ([mu, omega, alpha, beta], e.g. from ``fit_garch``). ``volatility`` is the
+        conditional volatility of the price changes under those params, when the caller
+        already has it.
+        """
+        times = np.asarray(times, dtype="datetime64")
+        prices = np.asarray(prices, dtype=float)
+        if len(prices) < 2:
+            raise ValueError("Not enough price data to compute daily changes.")
+        changes = np.diff(prices)
+        mu, omega, alpha, beta = (float(value) for value in params)
+        if volatility is None:
+            volatility = garch_volatility(changes, np.asarray(params, dtype=float))
+        resid = changes[-1] - mu
+        detector = cls(
+            mu, omega, alpha, beta,
+            variance=omega + alpha * resid * resid + beta * volatility[-1] ** 2,
+            last_price=prices[-1],
+            last_time=times[-1],
+            crit_value=scipy.stats.norm.ppf(1 - confidence_level / 2),
+        )
+        flagged = np.abs(changes) > detector.crit_value * volatility
+        for flag_time in np.sort(times[1:][flagged]):
+            detector._record_flag(flag_time)
+        return detector
+
+    def update(self, time, price):
+        """
+        Ingest one new bar; returns True when its change is flagged as unusual.
+        """
+        change = float(price) - self.last_price
+        flagged = abs(change) > self.crit_value * np.sqrt(self.variance)
+        resid = change - self.mu
+        self.variance = self.omega + self.alpha * resid * resid + self.beta * self.variance
+        self.last_price = float(price)
+        self.last_time = np.datetime64(time)
+        self.updates += 1
+        if flagged:
+            self._record_flag(self.last_time)
+        return bool(flagged)
+
+    def _record_flag(self, flag_time):
+        self.flag_count += 1
+        if self.range_start is None:
+            self.range_start = self.range_end = flag_time
+            self.range_flags = 1
+            return
+        gap = int((flag_time - self.range_end).astype("timedelta64[D]").astype(int))
+        self.gap_count += 1
+        delta = gap - self.gap_mean
+        self.gap_mean += delta / self.gap_count
+        self.gap_m2 += delta * (gap - self.gap_mean)
+        threshold = self.gap_mean + np.sqrt(self.gap_m2 / self.gap_count)
+        if gap > threshold:
+            # Like unusual_ranges, a group of a single flag does not make a range.
+            if self.range_flags > 1:
+                self.closed_ranges.append((self.range_start, self.range_end))
+            self.range_start = flag_time
+            self.range_flags = 0
+        self.range_end = flag_time
+        self.range_flags += 1
+
+    def ranges(self):
+        """
+        Closed ranges plus the open one, formatted like ``unusual_ranges``.
+        """
+        ranges = list(self.closed_ranges)
+        if self.range_flags > 1 or (self.flag_count == 1 and self.range_start is not None):
+            ranges.append((self.range_start, self.range_end))
+        adjusted_ranges = []
+        for start, end in ranges:
+            if start == end:
+                if start < self.last_time:
+                    end = start + np.timedelta64(2, 'D')
+                else:
+                    start = start - np.timedelta64(2, 'D')
+            adjusted_ranges.append((str(start.astype('M8[D]')), str(end.astype('M8[D]'))))
+        return adjusted_ranges
+
+    def to_dict(self):
+        return {
+            "mu": self.mu,
+            "omega": self.omega,
+            "alpha": self.alpha,
+            "beta": self.beta,
+            "variance": self.variance,
+            "last_price": self.last_price,
+            "last_time": _time_text(self.last_time),
+            "crit_value": self.crit_value,
+            "closed_ranges": [[_time_text(start), _time_text(end)] for start, end in self.closed_ranges],
+            "range_start": _time_text(self.range_start),
+            "range_end": _time_text(self.range_end),
+            "range_flags": self.range_flags,
+            "flag_count": self.flag_count,
+            "gap_count": self.gap_count,
+            "gap_mean": self.gap_mean,
+            "gap_m2": self.gap_m2,
+            "updates": self.updates,
+            "period": self.period,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        detector = cls(
+            state["mu"], state["omega"], state["alpha"], state["beta"],
+            variance=state["variance"],
+            last_price=state["last_price"],
+            last_time=state["last_time"],
+            crit_value=state["crit_value"],
+        )
+        detector.closed_ranges = [(_parse_time(start), _parse_time(end)) for start, end in state["closed_ranges"]]
+        detector.range_start = _parse_time(state["range_start"])
+        detector.range_end = _parse_time(state["range_end"])
+        detector.range_flags = state["range_flags"]
+        detector.flag_count = state["flag_count"]
+        detector.gap_count = state["gap_count"]
+        detector.gap_mean = state["gap_mean"]
+        detector.gap_m2 = state["gap_m2"]
+        detector.updates = state.get("updates", 0)
+        detector.period = state.get("period")
+        return detector
+
+
+async def load_detector(ticker_symbol, interval):
+    """
+    Stored detector of a series, or None.
+    """
+    row = await AnomalyDetectorState.objects.filter(ticker=ticker_symbol, interval=interval).afirst()
+    return None if row is None else StreamingAnomalyDetector.from_dict(row.state)
+
+
+async def save_detector(ticker_symbol, interval, detector):
+    await AnomalyDetectorState.objects.aupdate_or_create(
+        ticker=ticker_symbol, interval=interval, defaults={"state": detector.to_dict()}
+    )
+
+
+def _stored_time(value):
+    return pd.Timestamp(value).tz_localize("UTC")
+
+
+async def seed_detector(ticker_symbol, interval, times, prices, params, volatility, period=None):
+    """
+    Store a fresh detector of a series from its stored closes (the ``period`` window), the
+    GARCH ``params`` fitted to them and the resulting conditional ``volatility``.
+
+    The newest bar is left out: it may still be a partial bar that the next delta fetch
+    rewrites, and a bar the detector has seen cannot be revised. ``advance_detector`` feeds
+    it once a newer bar is stored.
+    """
+    if len(prices) < 3:
+        return None
+    detector = StreamingAnomalyDetector.from_history(
+        times[:-1], prices[:-1], params, DETECTOR_CONFIDENCE_LEVEL, volatility=volatility[:-1]
+    )
+    detector.period = period
+    await save_detector(ticker_symbol, interval, detector)
+    return detector
+
+
+async def advance_detector(ticker_symbol, interval):
+    """
+    Feed a series' detector the stored bars after its last bar, except the newest one (see
+    ``seed_detector``), and save it. Series without a detector are left alone.
+
+    Returns:
+        int: Number of bars ingested.
+    """
+    detector = await load_detector(ticker_symbol, interval)
+    if detector is None:
+        return 0
+    rows = await _bars_after(ticker_symbol, interval, detector.last_time)
+    for stamp, close in rows[:-1]:
+        detector.update(stamp, close)
+    if len(rows) < 2:
+        return 0
+    await save_detector(ticker_symbol, interval, detector)
+    return len(rows) - 1
+
+
+async def _bars_after(ticker_symbol, interval, last_time):
+    bars = StockData.objects.filter(
+        ticker=ticker_symbol, interval=interval, close_price__isnull=False,
+        timestamp__gt=_stored_time(last_time),
+    ).order_by("timestamp").values_list("timestamp", "close_price")
+    return [(np.datetime64(stamp.replace(tzinfo=None), "ns"), close) async for stamp, close in bars]
+
+
+async def live_ranges(ticker_symbol, period, interval, confidence_level, max_updates):
+    """
+    Unusual ranges of a stored series from its streaming detector, without fitting GARCH.
+
+    The stored detector is caught up with the bars it has not seen, newest one included,
+    on a copy (the stored state never sees a bar that may still change).
+
+    Returns:
+        list | None: Ranges formatted like ``unusual_ranges``; None when the detector
+        cannot serve them: there is none, it was seeded from another period's window or at
+        another confidence level, or it has taken ``max_updates`` bars since its params were
+        fitted and is due for a refit.
+
+    Raises:
+        Exception: No bar is flagged (as ``unusual_ranges``).
+    """
+    detector = await load_detector(ticker_symbol, interval)
+    crit_value = scipy.stats.norm.ppf(1 - confidence_level / 2)
+    if (
+        detector is None
+        or detector.period != period
+        or not np.isclose(detector.crit_value, crit_value)
+        or detector.updates >= max_updates
+    ):
+        return None
+    detector = copy.deepcopy(detector)
+    for stamp, close in await _bars_after(ticker_symbol, interval, detector.last_time):
+        detector.update(stamp, close)
+    ranges = detector.ranges()
+    if not ranges:
+        raise Exception("No unusual dates found with the specified threshold.")
+    return ranges
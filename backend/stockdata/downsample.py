@@ -0,0 +1,62 @@
+# stockdata/downsample.py
+"""
+Server-side downsampling of chart series to roughly the number of points a chart can draw.
+
+Bars are split into equally sized buckets and every bucket keeps its first bar, its lowest
+and highest close and its largest bar-to-bar move, so peaks, troughs and jumps (the bars
+the anomaly detector flags) survive at any zoom level. The newest bar is always kept.
+"""
+import numpy as np
+
+# Bars kept per bucket: first, minimum, maximum and largest move.
+POINTS_PER_BUCKET = 4
+MIN_MAX_POINTS = 2 * POINTS_PER_BUCKET
+
+
+def downsample_indices(values, max_points):
+    """
+    Positions of the bars to keep, in ascending order.
+
+    Parameters:
+        values (array-like): Series to preserve (e.g. close prices); NaN is never picked
+            as an extreme.
+        max_points (int): Upper bound on the number of positions returned.
+
+    Returns:
+        np.ndarray: Sorted unique positions, all of them when the series already fits.
+    """
+    values = np.asarray(values, dtype=float)
+    count = len(values)
+    if count <= max_points:
+        return np.arange(count)
+
+    # One bar is reserved for the newest one.
+    buckets = max((max_points - 1) // POINTS_PER_BUCKET, 1)
+    size = -(-count // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:count] = values
+    grid = padded.reshape(buckets, size)
+    moves = np.full(buckets * size, np.nan)
+    moves[1:count] = np.abs(np.diff(values))
+    moves = moves.reshape(buckets, size)
+
+    # Rows with nothing to compare (all NaN) fall back to their first bar.
+    filled = ~np.isnan(grid)
+    has_values = filled.any(axis=1)
+    low = np.argmin(np.where(filled, grid, np.inf), axis=1)
+    high = np.argmax(np.where(filled, grid, -np.inf), axis=1)
+    jump = np.argmax(np.where(np.isnan(moves), -np.inf, moves), axis=1)
+
+    starts = np.arange(buckets) * size
+    picks = [starts, starts + np.where(has_values, low, 0), starts + np.where(has_values, high, 0), starts + jump]
+    keep = np.unique(np.concatenate([*picks, [count - 1]]))
+    return keep[keep < count]
+
+
+def take(column, positions):
+    """
+    Select ``positions`` from a payload column (NumPy array or list).
+    """
+    if isinstance(column, np.ndarray):
+        return column[positions]
+    return [column[i] for i in positions]
@@ -0,0 +1,93 @@
+# stockdata/indicators.py
+"""
+Rolling indicators materialized per bar at ingest time.
+
+An indicator is named ``<kind>_<window>``, e.g. ``sma_20`` or ``rsi_14``:
+
+  - ``sma``: simple moving average of the close.
+  - ``return``: percentage change of the close over ``window`` bars.
+  - ``volatility``: standard deviation of the per-bar percentage returns over ``window``
+    bars (like the 30-window volatility of ``newsdata.market_direction``).
+  - ``rsi``: relative strength index over ``window`` bars, with simple averages of gains
+    and losses (Cutler's RSI), so it only depends on the last ``window`` bars.
+
+Every indicator only looks back a fixed number of bars, so new or backfilled bars only
+change the indicators of the bars from there up to that many bars later; ``utils`` uses
+``lookback`` to recompute just that stretch. The materialized set comes from the
+``STOCKDATA_INDICATORS`` setting.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+INDICATOR_PATTERN = re.compile(r"^(sma|return|volatility|rsi)_(\d+)$")
+DEFAULT_INDICATORS = ("sma_20", "sma_50", "return_20", "volatility_30", "rsi_14")
+
+
+def parse_indicator(name):
+    """
+    Split an indicator name into (kind, window).
+
+    Raises:
+        ValueError: The name is not ``<kind>_<window>`` with a known kind and window >= 1.
+    """
+    match = INDICATOR_PATTERN.match(name)
+    if match is None or int(match.group(2)) < 1:
+        raise ValueError(f"Unsupported indicator: {name}")
+    return match.group(1), int(match.group(2))
+
+
+def configured_indicators():
+    """
+    Names of the indicators materialized for every stored series.
+    """
+    names = tuple(getattr(settings, "STOCKDATA_INDICATORS", DEFAULT_INDICATORS))
+    for name in names:
+        parse_indicator(name)
+    return names
+
+
+def lookback(names):
+    """
+    Bars before a bar that its indicators depend on: a changed bar changes the
+    indicators of itself and of the next ``lookback(names)`` bars.
+    """
+    windows = [window - (kind == "sma") for kind, window in map(parse_indicator, names)]
+    return max(windows, default=0)
+
+
+def compute_indicators(closes, names):
+    """
+    Compute indicators over a run of consecutive closes.
+
+    Parameters:
+        closes (array-like): Close prices, oldest first (NaN where missing).
+        names (iterable): Indicator names.
+
+    Returns:
+        dict: name -> float64 array aligned with ``closes``; NaN until a full window is
+        available.
+    """
+    close = pd.Series(np.asarray(closes, dtype=float))
+    returns = close.pct_change(fill_method=None) * 100
+    delta = close.diff()
+    columns = {}
+    for name in names:
+        kind, window = parse_indicator(name)
+        if kind == "sma":
+            values = close.rolling(window).mean()
+        elif kind == "return":
+            values = close.pct_change(window, fill_method=None) * 100
+        elif kind == "volatility":
+            values = returns.rolling(window).std()
+        else:
+            gains = delta.clip(lower=0).rolling(window).mean()
+            losses = (-delta).clip(lower=0).rolling(window).mean()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = 100 - 100 / (1 + gains / losses)
+            # No losses in the window: RSI is 100 (50 when the price did not move at all).
+            values = values.where(losses != 0, np.where(gains > 0, 100.0, 50.0)).where(gains.notna())
+        columns[name] = values.to_numpy(dtype=float)
+    return columns
@@ -0,0 +1,244 @@
+# stockdata/metadata.py
+import asyncio
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from django.conf import settings
+
+from .cache import interval_ttl, response_cache
+from .singleflight import SingleFlight
+from .utils import normalize_ticker, run_upstream
+
+# Concurrent identical metadata requests are coalesced into one upstream call per ticker.
+metadata_flight = SingleFlight("get_stock_metadata_info")
+
+# Widest history window any figure needs: 365 calendar days back plus weekends and holidays.
+METADATA_HISTORY_PERIOD = "400d"
+
+# Payload field -> yfinance history metadata key. These practically never change.
+STATIC_METADATA_FIELDS = {
+    "currency": "currency",
+    "exchangeName": "fullExchangeName",
+    "longName": "longName",
+}
+STATIC_METADATA_TTL = getattr(settings, "STOCKDATA_STATIC_METADATA_TTL", 7 * 24 * 3600)
+
+# Largest watchlist accepted by one batch request.
+MAX_BATCH_TICKERS = 200
+
+
+def pct_changes_since(closes, days):
+    """
+    Change of the latest close against the close ``days`` calendar days earlier, for every
+    column of a close price panel at once.
+
+    The earlier close is looked up as of that date (the last bar on or before it); when the
+    history does not reach back that far the oldest bar is used instead.
+
+    Parameters:
+        closes (pd.DataFrame): Close prices, one column per ticker, indexed by naive bar
+            timestamps in ascending order. NaN where a ticker has no bar.
+        days (int): Calendar days to look back.
+
+    Returns:
+        pd.Series: Fractional change per column, NaN for columns without any close.
+    """
+    if closes.empty:
+        return pd.Series(np.nan, index=closes.columns)
+    values = closes.to_numpy(dtype=float)
+    dates = closes.index.to_numpy(dtype="datetime64[ns]")
+    present = ~np.isnan(values)
+    has_data = present.any(axis=0)
+    columns = np.arange(values.shape[1])
+
+    # First and last bar of every column.
+    first = present.argmax(axis=0)
+    last = len(values) - 1 - present[::-1].argmax(axis=0)
+
+    # As-of position of each column's reference date, never before its first bar.
+    targets = dates[last] - np.timedelta64(days, "D")
+    reference = np.maximum(np.searchsorted(dates, targets, side="right") - 1, first)
+    filled = closes.ffill().to_numpy(dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = values[last, columns] / filled[reference, columns] - 1
+    return pd.Series(np.where(has_data, change, np.nan), index=closes.columns)
+
+
+def _wall_time(history):
+    """
+    yfinance history index as naive exchange wall time.
+    """
+    index = history.index
+    return index.tz_localize(None) if index.tz is not None else index
+
+
+def price_summary(closes):
+    """
+    lastClose and the monthly/yearly changes of every column of a close price panel.
+
+    Returns:
+        dict: ticker -> {"lastClose", "montly_pct_change", "yearly_pct_change"}; tickers
+        without any close are left out (all of them when the panel has no rows).
+    """
+    present = closes.notna().to_numpy()
+    if not present.any():
+        return {}
+    last = len(closes) - 1 - present[::-1].argmax(axis=0)
+    last_dates = closes.index[last].date
+    monthly = pct_changes_since(closes, 30)
+    yearly = pct_changes_since(closes, 365)
+    return {
+        ticker: {
+            "lastClose": last_dates[i],
+            "montly_pct_change": float(monthly[ticker]),
+            "yearly_pct_change": float(yearly[ticker]),
+        }
+        for i, ticker in enumerate(closes.columns)
+        if present[:, i].any()
+    }
+
+
+async def get_static_metadata(ticker_symbol):
+    """
+    Cached currency, exchange name and long name of a ticker, or None when not cached.
+    """
+    return await response_cache.aget(response_cache.make_key("static", ticker_symbol))
+
+
+async def set_static_metadata(ticker_symbol, metadata):
+    """
+    Cache the static fields of a yfinance history metadata dict for ``STATIC_METADATA_TTL``.
+    """
+    static = {field: metadata[key] for field, key in STATIC_METADATA_FIELDS.items()}
+    await response_cache.aset(response_cache.make_key("static", ticker_symbol), static, STATIC_METADATA_TTL)
+    return static
+
+
+def _download_metadata(ticker_symbol, with_static):
+    """
+    Blocking: one history download for the widest window. The history metadata arrives with
+    the same response, so reading it afterwards makes no further request.
+    """
+    ticker = yf.Ticker(ticker_symbol)
+    history = ticker.history(period=METADATA_HISTORY_PERIOD)
+    metadata = ticker.get_history_metadata() if with_static else None
+    return history, metadata
+
+
+async def get_stock_metadata_info(ticker_symbol="AAPL"):
+    """
+    Fetch stock metadata using yfinance and extract:
+      - currency
+      - exchangeName
+      - longName
+      - lastClose (date of the latest bar)
+      - montly_pct_change and yearly_pct_change (against 30 and 365 days earlier)
+
+    Finished results are cached until the next session close, so warm requests make no
+    upstream call; cold ones make a single history download.
+
+    Parameters:
+        ticker_symbol (str): The stock ticker symbol.
+
+    Returns:
+        dict: A dictionary with the extracted information.
+    """
+    ticker_symbol = normalize_ticker(ticker_symbol)
+    cache_key = response_cache.make_key("metadata", ticker_symbol)
+    result = await response_cache.aget(cache_key)
+    if result is None:
+        result = await metadata_flight.do(ticker_symbol, _get_stock_metadata_info, ticker_symbol)
+        await response_cache.aset(cache_key, result, interval_ttl("1d"))
+    return result
+
+
+async def _get_stock_metadata_info(ticker_symbol):
+    static = await get_static_metadata(ticker_symbol)
+    history, metadata = await run_upstream(_download_metadata, ticker_symbol, static is None)
+    close = history["Close"].dropna() if "Close" in history else history
+    if close.empty:
+        raise ValueError(f"No price history for {ticker_symbol}")
+    if static is None:
+        static = await set_static_metadata(ticker_symbol, metadata)
+
+    closes = pd.DataFrame({ticker_symbol: close.to_numpy(dtype=float)}, index=_wall_time(close))
+    return {**static, **price_summary(closes)[ticker_symbol]}
+
+
+def _download_closes(ticker_symbols):
+    """
+    Blocking: close prices of many tickers in one multi-ticker download, as a panel with one
+    column per ticker (NaN where a ticker has no bar, all NaN when it failed).
+    """
+    data = yf.download(
+        ticker_symbols,
+        period=METADATA_HISTORY_PERIOD,
+        group_by="column",
+        auto_adjust=True,
+        progress=False,
+        multi_level_index=True,
+    )
+    if data is None or data.empty:
+        return pd.DataFrame(columns=ticker_symbols, dtype=float)
+    closes = data["Close"].reindex(columns=ticker_symbols)
+    return closes.set_axis(_wall_time(closes)).sort_index()
+
+
+def _download_history_metadata(ticker_symbol):
+    return yf.Ticker(ticker_symbol).get_history_metadata()
+
+
+async def get_batch_metadata(ticker_symbols):
+    """
+    Metadata of a whole watchlist: the same fields as ``get_stock_metadata_info`` for every
+    ticker, with one multi-ticker price download for all tickers not cached yet.
+
+    Static fields come from the static metadata cache and are only fetched for tickers seen
+    for the first time, so repeat watchlist loads download prices only.
+
+    Parameters:
+        ticker_symbols (list[str]): Ticker symbols; duplicates and blanks are ignored.
+
+    Returns:
+        tuple: (results, errors), both dicts keyed by normalized ticker. ``errors`` maps the
+        tickers that could not be served to a message.
+    """
+    tickers = list(dict.fromkeys(normalize_ticker(t) for t in ticker_symbols if t.strip()))
+    keys = {ticker: response_cache.make_key("metadata", ticker) for ticker in tickers}
+    cached = await asyncio.gather(*(response_cache.aget(keys[ticker]) for ticker in tickers))
+    results = {ticker: value for ticker, value in zip(tickers, cached) if value is not None}
+    errors = {}
+
+    missing = [ticker for ticker in tickers if ticker not in results]
+    if not missing:
+        return results, errors
+
+    statics = dict(zip(missing, await asyncio.gather(*(get_static_metadata(t) for t in missing))))
+    summaries = price_summary(await run_upstream(_download_closes, missing))
+    for ticker in missing:
+        if ticker not in summaries:
+            errors[ticker] = f"No price history for {ticker}"
+
+    # Static fields of first-seen tickers, fetched concurrently.
+    unseen = [ticker for ticker in missing if ticker in summaries and statics[ticker] is None]
+    fetched = await asyncio.gather(
+        *(run_upstream(_download_history_metadata, ticker) for ticker in unseen),
+        return_exceptions=True,
+    )
+    for ticker, metadata in zip(unseen, fetched):
+        try:
+            if isinstance(metadata, Exception):
+                raise metadata
+            statics[ticker] = await set_static_metadata(ticker, metadata)
+        except Exception as e:
+            errors[ticker] = str(e) or type(e).__name__
+
+    ttl = interval_ttl("1d")
+    for ticker in missing:
+        if ticker in errors:
+            continue
+        results[ticker] = {**statics[ticker], **summaries[ticker]}
+        await response_cache.aset(keys[ticker], results[ticker], ttl)
+    return results, errors
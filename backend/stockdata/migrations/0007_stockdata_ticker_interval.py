@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2025-03-01 18:20
+
+from django.db import migrations, models
+
+
+def clear_untagged_rows(apps, schema_editor):
+    # Rows written by the old wipe-and-reload path carry no ticker/interval,
+    # so they cannot be attributed to a series in the persistent store.
+    StockData = apps.get_model('stockdata', 'StockData')
+    StockData.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockdata', '0006_remove_stockdata_dividends_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_untagged_rows, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='stockdata',
+            name='ticker',
+            field=models.CharField(default='', max_length=16),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='stockdata',
+            name='interval',
+            field=models.CharField(default='', max_length=8),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='stockdata',
+            name='timestamp',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddConstraint(
+            model_name='stockdata',
+            constraint=models.UniqueConstraint(fields=('ticker', 'interval', 'timestamp'), name='unique_stockdata_bar'),
+        ),
+    ]
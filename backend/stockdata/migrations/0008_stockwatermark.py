@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockdata', '0007_stockdata_ticker_interval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=16)),
+                ('interval', models.CharField(max_length=8)),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('covered_from', models.DateTimeField(default=None, null=True)),
+                ('covers_inception', models.BooleanField(default=False)),
+                ('gaps_checked_through', models.DateTimeField(default=None, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockwatermark',
+            constraint=models.UniqueConstraint(fields=('ticker', 'interval'), name='unique_stockwatermark_series'),
+        ),
+    ]
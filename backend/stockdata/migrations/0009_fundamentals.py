@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockdata', '0008_stockwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fundamentals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=16)),
+                ('fiscal_year', models.IntegerField()),
+                ('free_cash_flow', models.FloatField(default=None, null=True)),
+                ('eps', models.FloatField(default=None, null=True)),
+                ('profit_margin', models.FloatField(default=None, null=True)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='stockdata',
+            name='eps',
+        ),
+        migrations.RemoveField(
+            model_name='stockdata',
+            name='free_cash_flow',
+        ),
+        migrations.RemoveField(
+            model_name='stockdata',
+            name='pe',
+        ),
+        migrations.RemoveField(
+            model_name='stockdata',
+            name='profit_margin',
+        ),
+        migrations.AddConstraint(
+            model_name='fundamentals',
+            constraint=models.UniqueConstraint(fields=('ticker', 'fiscal_year'), name='unique_fundamentals_year'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockdata', '0009_fundamentals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyDetectorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=16)),
+                ('interval', models.CharField(max_length=8)),
+                ('state', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='anomalydetectorstate',
+            constraint=models.UniqueConstraint(fields=('ticker', 'interval'), name='unique_anomalydetectorstate_series'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockdata', '0010_anomalydetectorstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockdata',
+            name='indicators',
+            field=models.JSONField(default=None, null=True),
+        ),
+    ]
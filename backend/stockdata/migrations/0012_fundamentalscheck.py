@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stockdata', '0011_stockdata_indicators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundamentalsCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=16, unique=True)),
+                ('checked_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,18 +1,116 @@
 from django.db import models
 
 class StockData(models.Model):
-    timestamp = models.DateTimeField(unique=True)
+    ticker = models.CharField(max_length=16)
+    interval = models.CharField(max_length=8)
+    timestamp = models.DateTimeField()
     open_price = models.FloatField(null=True)
     high_price = models.FloatField(null=True)
     low_price = models.FloatField(null=True)
     close_price = models.FloatField(null=True, default=None)  # Added default here
     volume = models.BigIntegerField(null=True, default=None)
     pct_change = models.FloatField(default=None, null=True)
-    free_cash_flow = models.FloatField(default=None, null=True)
-    eps = models.FloatField(null=True, blank=True, default=None)
-    profit_margin = models.FloatField(null=True, blank=True, default=None)
     market_cap = models.FloatField(default=None, null=True)
-    pe = models.FloatField(default=None,null=True)
+    # Rolling indicators of this bar (name -> value), see stockdata.indicators. Maintained
+    # at ingest time; not touched by bar upserts.
+    indicators = models.JSONField(default=None, null=True)
+
+    class Meta:
+        # One bar per (ticker, interval, timestamp); upserts resolve conflicts on this key.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ticker", "interval", "timestamp"],
+                name="unique_stockdata_bar",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ticker} {self.interval} {self.timestamp} - Close: {self.close_price}"
+
+
+class StockWatermark(models.Model):
+    """
+    Bounds of the stored bars for one (ticker, interval) series, used to fetch only deltas.
+    """
+    ticker = models.CharField(max_length=16)
+    interval = models.CharField(max_length=8)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    # Earliest window start that has been requested upstream. Can precede first_timestamp
+    # when the listing is younger than the requested period.
+    covered_from = models.DateTimeField(null=True, default=None)
+    # True once the series has been downloaded with period="max".
+    covers_inception = models.BooleanField(default=False)
+    # Bars up to this timestamp have already been scanned for holes.
+    gaps_checked_through = models.DateTimeField(null=True, default=None)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ticker", "interval"],
+                name="unique_stockwatermark_series",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ticker} {self.interval}: {self.first_timestamp} -> {self.last_timestamp}"
+
+
+class Fundamentals(models.Model):
+    """
+    Yearly statement figures for one ticker. Joined onto bars by fiscal year at read time
+    and refreshed from yfinance at most once a day.
+    """
+    ticker = models.CharField(max_length=16)
+    fiscal_year = models.IntegerField()
+    free_cash_flow = models.FloatField(null=True, default=None)
+    eps = models.FloatField(null=True, default=None)
+    profit_margin = models.FloatField(null=True, default=None)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ticker", "fiscal_year"],
+                name="unique_fundamentals_year",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.ticker} FY{self.fiscal_year} - EPS: {self.eps}"
+
+
+class FundamentalsCheck(models.Model):
+    """
+    When the statements of a ticker were last downloaded, whether or not they had any
+    figures. Tickers without statements (indices, ETFs) have no Fundamentals rows, so this
+    is what limits their refreshes to one a day.
+    """
+    ticker = models.CharField(max_length=16, unique=True)
+    checked_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.ticker} fundamentals checked at {self.checked_at}"
+
+
+class AnomalyDetectorState(models.Model):
+    """
+    Serialized ``StreamingAnomalyDetector`` of one (ticker, interval) series, so live
+    anomaly flags survive restarts.
+    """
+    ticker = models.CharField(max_length=16)
+    interval = models.CharField(max_length=8)
+    state = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ticker", "interval"],
+                name="unique_anomalydetectorstate_series",
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.timestamp} - Close: {self.close_price}"
\ No newline at end of file
+        return f"{self.ticker} {self.interval} detector (last bar {self.state.get('last_time')})"
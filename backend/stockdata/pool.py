@@ -0,0 +1,179 @@
+# stockdata/pool.py
+import asyncio
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+class AnalyticsBusy(RuntimeError):
+    """
+    Raised instead of queueing when the analytics pool already has ``max_pending`` tasks.
+    """
+
+
+def _init_worker(settings_module, niceness):
+    """
+    Worker initializer: lower the worker's CPU priority, set up Django and import the heavy
+    analytics dependencies once, so the first task a worker runs does not pay for them.
+    """
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+    import arch  # noqa: F401
+    import scipy.stats  # noqa: F401
+
+
+def _noop():
+    return None
+
+
+def _timed_call(func, args, kwargs):
+    """
+    Run a task in a worker and report when it started, for queue wait metrics.
+    """
+    started = time.time()
+    return started, func(*args, **kwargs)
+
+
+class AnalyticsPool:
+    """
+    Runs CPU-bound analytics (GARCH fits) outside the serving process.
+
+    A separate process per worker keeps long NumPy/Python optimizer loops from holding the
+    GIL of the process serving requests. Submissions are bounded: once ``max_pending`` tasks
+    are queued or running, ``run`` raises ``AnalyticsBusy`` rather than growing the backlog.
+    Each task has a timeout; a task that times out or whose caller is cancelled is dropped
+    from the queue if it has not started yet, otherwise its result is discarded when it
+    finishes (its slot stays taken until then).
+
+    Workers run ``niceness`` steps below the serving process's CPU priority, so request
+    handling still wins when there are fewer cores than busy workers.
+
+    With ``processes=0`` tasks run on a thread pool in this process instead (no isolation;
+    useful for tests and single-process debugging). The pool is created on first use.
+    """
+
+    def __init__(self, processes, max_pending, timeout, niceness=0):
+        self.processes = processes
+        self.niceness = niceness
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self._waits = collections.deque(maxlen=1000)
+        self.counts = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timed_out": 0, "cancelled": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.processes:
+                    # spawn rather than fork: the serving process has live threads (upstream
+                    # pool, DB connections) that must not be copied into the workers.
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "stockcompass.settings"), self.niceness),
+                    )
+                else:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=max(self.max_pending, 1), thread_name_prefix="analytics"
+                    )
+            return self._executor
+
+    def warm_up(self):
+        """
+        Start every worker now (and wait for them), instead of on the first requests.
+        """
+        executor = self._get_executor()
+        concurrent.futures.wait([executor.submit(_noop) for _ in range(self.processes or 1)])
+
+    def _release(self, future, submitted):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.counts["failed"] += 1
+                return
+            self.counts["completed"] += 1
+            self._waits.append(max(future.result()[0] - submitted, 0.0))
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """
+        Await ``func(*args, **kwargs)`` on a pool worker.
+
+        ``func`` and its arguments must be picklable (module-level functions, arrays).
+
+        Raises:
+            AnalyticsBusy: The queue is full.
+            TimeoutError: The task did not finish within ``timeout`` seconds (default: the
+                pool's timeout), counting queue wait.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.counts["rejected"] += 1
+                raise AnalyticsBusy(f"Analytics queue is full ({self.max_pending} tasks)")
+            self._pending += 1
+            self.counts["submitted"] += 1
+
+        submitted = time.time()
+        try:
+            future = executor.submit(_timed_call, func, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(lambda done: self._release(done, submitted))
+
+        try:
+            _, result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self._count("timed_out")
+            raise TimeoutError(f"Analytics task timed out after {timeout or self.timeout}s")
+        except asyncio.CancelledError:
+            future.cancel()
+            self._count("cancelled")
+            raise
+        return result
+
+    def _count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "processes": self.processes,
+                "max_pending": self.max_pending,
+                "queue_depth": self._pending,
+                **self.counts,
+                "wait_mean": sum(waits) / len(waits) if waits else None,
+                "wait_p99": waits[max(int(len(waits) * 0.99) - 1, 0)] if waits else None,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+analytics_pool = AnalyticsPool(
+    processes=getattr(settings, "STOCKDATA_ANALYTICS_PROCESSES", 2),
+    max_pending=getattr(settings, "STOCKDATA_ANALYTICS_MAX_PENDING", 32),
+    timeout=getattr(settings, "STOCKDATA_ANALYTICS_TIMEOUT", 30.0),
+    niceness=getattr(settings, "STOCKDATA_ANALYTICS_NICENESS", 10),
+)
@@ -13,9 +13,6 @@ class StockDataSerializer(serializers.ModelSerializer):
             'close_price',
             'volume',
             'pct_change',
-            'free_cash_flow',
-            'eps',
-            'profit_margin',
             'market_cap',
-            'pe'
+            'indicators'
         ]
\ No newline at end of file
@@ -0,0 +1,114 @@
+# stockdata/series_codec.py
+"""
+Decoding of price series posted to the analytics endpoints.
+
+Besides JSON, long series can be uploaded as a binary columnar body, chosen by the
+request's Content-Type:
+
+  - ``application/x-price-series``: two raw little-endian columns back to back, N int64
+    epoch timestamps followed by N float64 prices (16 * N bytes). The epoch unit is the
+    ``unit`` Content-Type parameter: ``s``, ``ms`` (default, JavaScript's ``Date.now()``),
+    ``us`` or ``ns``.
+  - ``application/vnd.apache.arrow.stream``: an Arrow IPC stream with a ``time`` column
+    (timestamp or int64 epochs in ``unit``) and a ``price`` column. Needs pyarrow.
+
+Binary bodies are viewed in place with ``np.frombuffer``: no per-point parsing or copying.
+Timestamps are UTC and returned as naive ``datetime64``, like the stored bars.
+"""
+import numpy as np
+
+RAW_SERIES_CONTENT_TYPE = "application/x-price-series"
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+BINARY_SERIES_CONTENT_TYPES = (RAW_SERIES_CONTENT_TYPE, ARROW_STREAM_CONTENT_TYPE)
+EPOCH_UNITS = ("s", "ms", "us", "ns")
+
+
+def parse_times(values):
+    """
+    ISO 8601 date/time strings to a ``datetime64[ns]`` array, in one vectorized conversion.
+    """
+    try:
+        return np.asarray(values, dtype="datetime64[ns]")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid time values: {e}") from None
+
+
+def decode_json_series(data):
+    """
+    Decode a posted ``{"time": [...], "price": [...]}`` object into (times, prices).
+    """
+    if not data or "time" not in data or "price" not in data:
+        raise ValueError("Data must contain 'time' and 'price' arrays")
+    times = parse_times(data["time"])
+    prices = np.asarray(data["price"], dtype=float)
+    if len(times) != len(prices):
+        raise ValueError("'time' and 'price' must have the same length")
+    return times, prices
+
+
+def _epoch_unit(unit):
+    unit = unit or "ms"
+    if unit not in EPOCH_UNITS:
+        raise ValueError(f"Unsupported epoch unit: {unit}")
+    return unit
+
+
+def decode_raw_series(body, unit="ms"):
+    """
+    Decode an ``application/x-price-series`` body into (times, prices) views of ``body``.
+    """
+    unit = _epoch_unit(unit)
+    if len(body) % 16:
+        raise ValueError("Series body must hold int64 times followed by as many float64 prices")
+    count = len(body) // 16
+    epochs = np.frombuffer(body, dtype="<i8", count=count)
+    prices = np.frombuffer(body, dtype="<f8", count=count, offset=8 * count)
+    return epochs.view(f"datetime64[{unit}]"), prices
+
+
+def decode_arrow_series(body, unit="ms"):
+    """
+    Decode an Arrow IPC stream body into (times, prices); columns without nulls are
+    converted without copying.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Arrow uploads are not supported: pyarrow is not installed") from None
+
+    unit = _epoch_unit(unit)
+    table = pa.ipc.open_stream(body).read_all()
+    if "time" not in table.column_names or "price" not in table.column_names:
+        raise ValueError("Arrow stream must contain 'time' and 'price' columns")
+    time = table.column("time").combine_chunks()
+    price = table.column("price").combine_chunks()
+    if pa.types.is_timestamp(time.type):
+        # Arrow stores zoned timestamps as UTC epochs, so they convert the same way.
+        times = time.to_numpy(zero_copy_only=False)
+    else:
+        times = time.cast(pa.int64()).to_numpy(zero_copy_only=False).view(f"datetime64[{unit}]")
+    prices = price.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    return times, prices
+
+
+def decode_series(body, content_type, unit=None):
+    """
+    Decode a binary series upload by Content-Type.
+
+    Parameters:
+        body (bytes): The request body.
+        content_type (str): One of ``BINARY_SERIES_CONTENT_TYPES``.
+        unit (str): Epoch unit of integer timestamps (default "ms").
+
+    Returns:
+        tuple: (times, prices) as ``datetime64`` and float64 arrays of equal length.
+    """
+    if content_type == RAW_SERIES_CONTENT_TYPE:
+        times, prices = decode_raw_series(body, unit)
+    elif content_type == ARROW_STREAM_CONTENT_TYPE:
+        times, prices = decode_arrow_series(body, unit)
+    else:
+        raise ValueError(f"Unsupported series content type: {content_type}")
+    if len(times) != len(prices):
+        raise ValueError("'time' and 'price' must have the same length")
+    return times, prices
@@ -0,0 +1,65 @@
+# stockdata/singleflight.py
+import asyncio
+import concurrent.futures
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key (the leader) runs the coroutine function; callers arriving
+    while it is in flight await the leader's result instead of starting their own, and an
+    exception raised by the leader is re-raised in every one of them. Nothing is cached:
+    once the call completes the next caller for the key starts a fresh execution.
+
+    In-flight calls are tracked with thread-safe futures, so callers are coalesced even
+    when they run on different event loops (e.g. one loop per request under async_to_sync).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Await ``func(*args, **kwargs)``, sharing one in-flight execution per ``key``.
+        """
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
@@ -1,3 +1,759 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import time
+import warnings
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from arch.utility.exceptions import StartingValueWarning
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from . import analytics, detector as anomaly_detector, utils
+from .analytics import GarchFitCache
+from .cache import interval_ttl, response_cache
+from .downsample import downsample_indices
+from .indicators import compute_indicators, lookback
+from .metadata import get_stock_metadata_info, pct_changes_since
+from .pool import AnalyticsBusy, AnalyticsPool
+from .models import Fundamentals, FundamentalsCheck, StockData, StockWatermark
+from .series_codec import RAW_SERIES_CONTENT_TYPE, decode_series
+from .singleflight import SingleFlight
+from .utils import derive_bar_columns, fetch_price_yf, fundamental_columns, fundamentals_by_year, refresh_fundamentals
+
+
+def make_history(start="2025-01-02", periods=5, freq="D", base=100.0):
+    index = pd.date_range(start, periods=periods, freq=freq, tz="America/New_York")
+    close = [base + i for i in range(periods)]
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": [c + 1 for c in close],
+            "Low": [c - 1 for c in close],
+            "Close": close,
+            "Volume": [1000] * periods,
+        },
+        index=index,
+    )
+
+
+class FakeTicker:
+    """
+    Minimal stand-in for yf.Ticker that serves a fixed price history.
+    """
+
+    def __init__(self, history, first_history=None):
+        self._history = history
+        self._first_history = first_history
+        self.history_calls = []
+
+    def history(self, period=None, interval="1d", start=None, end=None):
+        self.history_calls.append({"period": period, "start": start, "end": end})
+        data = self._history
+        if self._first_history is not None and len(self.history_calls) == 1:
+            data = self._first_history
+        wall_time = data.index.tz_localize(None)
+        if start is not None:
+            data = data[wall_time >= pd.Timestamp(start)]
+            wall_time = data.index.tz_localize(None)
+        if end is not None:
+            data = data[wall_time < pd.Timestamp(end)]
+        return data.copy()
+
+    def get_history_metadata(self):
+        return {"currency": "USD", "fullExchangeName": "NasdaqGS", "longName": "Apple Inc."}
+
+    def get_cashflow(self, freq="yearly"):
+        return pd.DataFrame({"2024-09-30": [1.0e9]}, index=["FreeCashFlow"])
+
+    def get_incomestmt(self):
+        return pd.DataFrame(
+            {"2024-09-30": [6.0, 4.0e9, 2.0e9]},
+            index=["BasicEPS", "TotalRevenue", "GrossProfit"],
+        )
+
+
+class FetchPriceStoreTests(TestCase):
+    def fetch(self, ticker_symbol, history, **kwargs):
+        return self.fetch_with(ticker_symbol, FakeTicker(history), **kwargs)
+
+    def fetch_with(self, ticker_symbol, fake, **kwargs):
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=fake):
+            return async_to_sync(fetch_price_yf)(ticker_symbol=ticker_symbol, **kwargs)
+
+    def test_tickers_are_stored_side_by_side(self):
+        self.fetch("AAPL", make_history(base=100.0), period="5d", interval="1d")
+        self.fetch("MSFT", make_history(base=400.0), period="5d", interval="1d")
+
+        self.assertEqual(StockData.objects.filter(ticker="AAPL", interval="1d").count(), 5)
+        self.assertEqual(StockData.objects.filter(ticker="MSFT", interval="1d").count(), 5)
+
+    def test_refetch_upserts_instead_of_duplicating(self):
+        self.fetch("aapl", make_history(base=100.0), period="5d", interval="1d")
+        self.fetch("AAPL", make_history(base=200.0), period="5d", interval="1d")
+
+        bars = StockData.objects.filter(ticker="AAPL", interval="1d").order_by("timestamp")
+        self.assertEqual(bars.count(), 5)
+        # Only the newest bar is re-requested on a warm series, and it is updated in place.
+        self.assertEqual(bars.first().close_price, 100.0)
+        self.assertEqual(bars.last().close_price, 204.0)
+
+    def test_warm_series_only_fetches_delta(self):
+        history = make_history(periods=10, freq="B")
+        self.fetch("AAPL", history.iloc[:8], period="1mo", interval="1d")
+
+        fake = FakeTicker(history)
+        result = self.fetch_with("AAPL", fake, period="1mo", interval="1d")
+
+        self.assertIsNone(fake.history_calls[0]["period"])
+        self.assertEqual(pd.Timestamp(fake.history_calls[0]["start"]), history.index[7].tz_localize(None))
+        # The newest stored bar is re-requested, plus the two new bars.
+        self.assertEqual(result["upstream_bars"], 3)
+        self.assertEqual(result["cache_bars"], 7)
+        self.assertEqual(StockData.objects.filter(ticker="AAPL", interval="1d").count(), 10)
+        watermark = StockWatermark.objects.get(ticker="AAPL", interval="1d")
+        self.assertEqual(watermark.last_timestamp.replace(tzinfo=None), history.index[-1].tz_localize(None))
+
+    def test_holes_are_backfilled(self):
+        history = make_history(periods=20, freq="B")
+        # The initial download comes back with a hole; later requests are complete.
+        fake = FakeTicker(history, first_history=pd.concat([history.iloc[:5], history.iloc[15:]]))
+
+        result = self.fetch_with("AAPL", fake, period="1mo", interval="1d")
+
+        self.assertEqual(len(fake.history_calls), 2)
+        self.assertEqual(result["upstream_bars"], 20)
+        self.assertEqual(StockData.objects.filter(ticker="AAPL", interval="1d").count(), 20)
+        # The bar before the hole now has its forward pct_change against the backfilled bar.
+        bar = StockData.objects.get(ticker="AAPL", interval="1d", timestamp=history.index[4].tz_localize(None))
+        self.assertAlmostEqual(bar.pct_change, (104 / 105 - 1) * 100)
+
+
+    def test_holes_beyond_the_cap_are_backfilled_by_later_requests(self):
+        history = make_history(periods=60, freq="B")
+        # Seven one-week holes: more than one request may backfill.
+        ragged = history.drop(history.index[[i for hole in range(7) for i in range(5 + 8 * hole, 10 + 8 * hole)]])
+        fake = FakeTicker(history, first_history=ragged)
+
+        with mock.patch.object(utils, "MAX_GAP_BACKFILLS", 5):
+            self.fetch_with("AAPL", fake, period="6mo", interval="1d")
+            self.assertEqual(len(fake.history_calls), 1 + 5)
+            self.fetch_with("AAPL", fake, period="6mo", interval="1d")
+
+        # The second request fetched the delta and the two remaining holes.
+        self.assertEqual(len(fake.history_calls), 6 + 1 + 2)
+        self.assertEqual(StockData.objects.filter(ticker="AAPL", interval="1d").count(), 60)
+
+
+class IndicatorTests(TestCase):
+    names = ("sma_5", "return_3", "volatility_4", "rsi_3")
+
+    def setUp(self):
+        caches[response_cache.alias].clear()
+        self.history = make_history("2024-01-02", periods=40, freq="B")
+        self.history["Close"] = 100 + np.cumsum(np.random.default_rng(2).normal(0, 1, 40))
+
+    def fetch(self, fake):
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=fake):
+            async_to_sync(fetch_price_yf)(ticker_symbol="AAPL", period="max", interval="1d")
+
+    def stored(self):
+        bars = StockData.objects.filter(ticker="AAPL", interval="1d").order_by("timestamp")
+        return [bar.indicators for bar in bars]
+
+    def test_incremental_updates_match_a_full_recompute(self):
+        history = self.history
+        # Ingest in pieces: a first download with a hole (backfilled), then new bars.
+        with self.settings(STOCKDATA_INDICATORS=list(self.names)):
+            self.fetch(FakeTicker(history, first_history=pd.concat([history.iloc[:15], history.iloc[20:30]])))
+            self.fetch(FakeTicker(history))
+
+        expected = compute_indicators(history["Close"], self.names)
+        stored = self.stored()
+        self.assertEqual(len(stored), 40)
+        for name in self.names:
+            values = np.array([np.nan if bar[name] is None else bar[name] for bar in stored])
+            np.testing.assert_allclose(values, expected[name], equal_nan=True)
+        self.assertTrue(np.isnan(expected["sma_5"][:4]).all())
+        self.assertEqual(lookback(self.names), 4)
+
+    def test_endpoint_serves_stored_indicators_from_the_cache(self):
+        with self.settings(STOCKDATA_INDICATORS=list(self.names)):
+            fake = FakeTicker(self.history)
+            params = {"stockname": "AAPL", "period": "max", "interval": "1d", "names": "sma_5,rsi_3"}
+            with mock.patch("stockdata.utils.yf.Ticker", return_value=fake):
+                data = self.client.get("/api/indicators/", params).json()
+                calls = len(fake.history_calls)
+                again = self.client.get("/api/indicators/", params).json()
+            unknown = self.client.get("/api/indicators/", {**params, "names": "sma_200"})
+
+        self.assertEqual(data["status_code"], 200)
+        self.assertEqual(set(data["indicators"]), {"time", "sma_5", "rsi_3"})
+        self.assertEqual(len(data["indicators"]["time"]), 40)
+        self.assertIsNone(data["indicators"]["sma_5"][3])
+        self.assertAlmostEqual(data["indicators"]["sma_5"][4], self.history["Close"].iloc[:5].mean())
+        self.assertEqual(again, data)
+        self.assertEqual(len(fake.history_calls), calls)
+        self.assertEqual(unknown.status_code, 400)
+
+
+class DeriveBarColumnsTests(SimpleTestCase):
+    def test_columns_match_row_wise_definitions(self):
+        data = derive_bar_columns(make_history("2024-12-30", periods=4, freq="D"))
+
+        close = data["Close"]
+        self.assertEqual(list(data["pct_change"]), list((close / close.shift(-1) - 1).fillna(0) * 100))
+        self.assertEqual(list(data["market_cap"]), list(close * 1000))
+
+    def test_fundamentals_join_by_fiscal_year(self):
+        fake = FakeTicker(None)
+        fundamentals = fundamentals_by_year(fake.get_cashflow(), fake.get_incomestmt())
+        close = [100.0, 101.0, 102.0]
+        columns = fundamental_columns([2024, 2024, 2025], close, fundamentals)
+
+        # 2024 bars pick up the 2024 statements; 2025 bars have no fundamentals yet.
+        self.assertEqual(list(columns["free_cash_flow"]), [1.0e9, 1.0e9, 0.0])
+        self.assertEqual(list(columns["profit_margin"][:2]), [0.5, 0.5])
+        self.assertEqual(list(columns["pe"][:2]), [100.0 / 6.0, 101.0 / 6.0])
+        self.assertTrue(pd.isna(columns["eps"][2]))
+        self.assertTrue(pd.isna(columns["pe"][2]))
+
+
+class FundamentalsRefreshTests(TestCase):
+    def refresh(self, fake):
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=fake) as ticker:
+            refreshed = async_to_sync(refresh_fundamentals)("aapl")
+        return refreshed, ticker.call_count
+
+    def test_statements_are_fetched_at_most_daily(self):
+        self.assertEqual(self.refresh(FakeTicker(None)), (True, 1))
+        self.assertEqual(self.refresh(FakeTicker(None)), (False, 0))
+
+        stored = Fundamentals.objects.get(ticker="AAPL", fiscal_year=2024)
+        self.assertEqual((stored.free_cash_flow, stored.eps, stored.profit_margin), (1.0e9, 6.0, 0.5))
+
+        # A day later the statements are downloaded again and updated in place.
+        FundamentalsCheck.objects.update(checked_at=stored.fetched_at - datetime.timedelta(days=1))
+        self.assertEqual(self.refresh(FakeTicker(None)), (True, 1))
+        self.assertEqual(Fundamentals.objects.count(), 1)
+
+    def test_tickers_without_statements_are_checked_at_most_daily(self):
+        fake = FakeTicker(None)
+        fake.get_cashflow = lambda freq="yearly": pd.DataFrame()
+        fake.get_incomestmt = lambda: pd.DataFrame()
+
+        self.assertEqual(self.refresh(fake), (True, 1))
+        self.assertEqual(self.refresh(fake), (False, 0))
+        self.assertFalse(Fundamentals.objects.exists())
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        caches[response_cache.alias].clear()
+
+    def test_ttl_follows_bar_interval(self):
+        new_york = ZoneInfo("America/New_York")
+        # Tuesday 10:00:30 with the market open.
+        now = datetime.datetime(2025, 3, 4, 10, 0, 30, tzinfo=new_york)
+        self.assertEqual(interval_ttl("1m", now), 60)
+        self.assertEqual(interval_ttl("1d", now), 6 * 3600 - 30)
+        # Saturday: intraday bars cannot change until Monday's open.
+        saturday = datetime.datetime(2025, 3, 8, 12, 0, tzinfo=new_york)
+        self.assertEqual(interval_ttl("60m", saturday), (48 + 9.5 - 12) * 3600)
+
+    def test_identical_requests_fetch_once(self):
+        history = make_history(periods=5, freq="B")
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=FakeTicker(history)) as ticker:
+            first = self.client.get("/api/stockdata/", {"stockname": "AAPL", "period": "5d", "interval": "1d"}).json()
+            upstream_calls = ticker.call_count
+            second = self.client.get("/api/stockdata/", {"stockname": "aapl", "period": "5d", "interval": "1d"}).json()
+
+        self.assertEqual(ticker.call_count, upstream_calls)
+        self.assertEqual(first["time_series"], second["time_series"])
+        self.assertEqual(second["source"], {"cache_bars": 5, "upstream_bars": 0})
+        self.assertGreaterEqual(response_cache.stats()["hits"], 1)
+
+
+class StockMetadataTests(TestCase):
+    def setUp(self):
+        caches[response_cache.alias].clear()
+
+    def test_one_history_download_cold_and_none_warm(self):
+        history = make_history("2024-01-02", periods=400, freq="D")
+        fake = FakeTicker(history)
+        with mock.patch("stockdata.metadata.yf.Ticker", return_value=fake):
+            cold = async_to_sync(get_stock_metadata_info)("aapl")
+            warm = async_to_sync(get_stock_metadata_info)("AAPL")
+
+        self.assertEqual(len(fake.history_calls), 1)
+        self.assertEqual(cold, warm)
+        self.assertEqual(cold["longName"], "Apple Inc.")
+        self.assertEqual(cold["lastClose"], datetime.date(2025, 2, 4))
+        # Daily closes rise by 1 a day: 30 and 365 days back are 30 and 365 bars back.
+        self.assertAlmostEqual(cold["montly_pct_change"], 499 / 469 - 1)
+        self.assertAlmostEqual(cold["yearly_pct_change"], 499 / 134 - 1)
+
+
+class BatchMetadataTests(TestCase):
+    def setUp(self):
+        caches[response_cache.alias].clear()
+
+    def download(self, tickers, **kwargs):
+        index = pd.date_range("2024-01-02", periods=400, freq="D")
+        closes = {
+            "AAPL": [100.0 + i for i in range(400)],
+            "MSFT": [400.0] * 200 + [500.0] * 200,
+            "NOPE": [float("nan")] * 400,
+        }
+        panel = pd.DataFrame({("Close", t): closes[t] for t in tickers if t in closes}, index=index)
+        return panel.set_axis(pd.MultiIndex.from_tuples(panel.columns), axis=1)
+
+    def get(self, stocknames):
+        with mock.patch("stockdata.metadata.yf.download", side_effect=self.download) as download, \
+                mock.patch("stockdata.metadata.yf.Ticker", return_value=FakeTicker(None)) as ticker:
+            data = self.client.get("/api/stock_metadata/batch/", {"stocknames": stocknames}).json()
+        return data, download.call_count, ticker.call_count
+
+    def test_one_download_per_watchlist_with_partial_failures(self):
+        data, downloads, tickers = self.get("aapl,MSFT,NOPE,AAPL")
+
+        self.assertEqual((downloads, tickers), (1, 2))
+        self.assertEqual(set(data["metadata"]), {"AAPL", "MSFT"})
+        self.assertEqual(list(data["errors"]), ["NOPE"])
+        self.assertEqual(data["metadata"]["AAPL"]["lastClose"], "2025-02-04")
+        self.assertAlmostEqual(data["metadata"]["AAPL"]["montly_pct_change"], 499 / 469 - 1)
+        self.assertAlmostEqual(data["metadata"]["MSFT"]["yearly_pct_change"], 0.25)
+
+    def test_repeat_loads_only_fetch_prices(self):
+        self.get("AAPL,MSFT")
+        # Results cached: nothing is fetched.
+        self.assertEqual(self.get("AAPL,MSFT")[1:], (0, 0))
+
+        # Once the results expire, only prices are downloaded again.
+        cache = caches[response_cache.alias]
+        cache.delete_many([response_cache.make_key("metadata", t) for t in ("AAPL", "MSFT")])
+        data, downloads, tickers = self.get("AAPL,MSFT")
+        self.assertEqual((downloads, tickers), (1, 0))
+        self.assertEqual(data["metadata"]["MSFT"]["longName"], "Apple Inc.")
+
+    def test_empty_download_reports_every_ticker_as_an_error(self):
+        self.download = lambda tickers, **kwargs: pd.DataFrame()
+        data, downloads, tickers = self.get("AAPL,MSFT")
+
+        self.assertEqual((downloads, tickers), (1, 0))
+        self.assertEqual(data["metadata"], {})
+        self.assertEqual(set(data["errors"]), {"AAPL", "MSFT"})
+        closes = pd.DataFrame(columns=["AAPL"], dtype=float)
+        self.assertTrue(pct_changes_since(closes, 30).isna().all())
+
+    def test_missing_stocknames_are_rejected(self):
+        self.assertEqual(self.client.get("/api/stock_metadata/batch/").status_code, 400)
+
+
+def make_changes(size, seed=0):
+    rng = np.random.default_rng(seed)
+    scale = np.where(np.arange(size) % 100 < 10, 3.0, 1.0)
+    return rng.normal(0, 1, size) * scale
+
+
+def simulate_garch(count, size, seed=0):
+    rng = np.random.default_rng(seed)
+    alpha = 0.05 + 0.1 * rng.random(count)
+    beta = 0.75 + 0.1 * rng.random(count)
+    variance = 0.05 / (1 - alpha - beta)
+    changes = np.empty((count, size))
+    for t in range(size):
+        shock = rng.normal(size=count) * np.sqrt(variance)
+        changes[:, t] = 3 * shock + 0.01
+        variance = 0.05 + alpha * shock * shock + beta * variance
+    return changes
+
+
+class FitGarchBatchTests(SimpleTestCase):
+    def test_matches_arch_on_ragged_panel(self):
+        changes = simulate_garch(4, 1500)
+        changes[1, :400] = np.nan  # a shorter history
+        changes[2, 700:705] = np.nan  # missing observations
+        changes[3] = np.nan  # nothing to fit
+
+        params, volatility = analytics.fit_garch_batch(changes)
+
+        for row in range(3):
+            observed = ~np.isnan(changes[row])
+            expected_params, expected_volatility = analytics.fit_garch(changes[row][observed])
+            # Stated tolerance: omega/alpha/beta and volatilities within 1e-3 relative,
+            # mu within 1e-3 of the change standard deviation.
+            np.testing.assert_allclose(params[row, 1:], expected_params[1:], rtol=1e-3)
+            self.assertLess(abs(params[row, 0] - expected_params[0]), 1e-3 * np.nanstd(changes[row]))
+            np.testing.assert_allclose(volatility[row][observed], expected_volatility, rtol=1e-3)
+            self.assertTrue(np.isnan(volatility[row][~observed]).all())
+        self.assertTrue(np.isnan(params[3]).all())
+
+
+class StreamingAnomalyDetectorTests(TestCase):
+    def setUp(self):
+        changes = simulate_garch(1, 800, seed=3)[0]
+        self.prices = 100 + np.concatenate([[0.0], np.cumsum(changes)])
+        self.times = np.datetime64("2020-01-01") + np.arange(len(self.prices))
+        self.params, _ = analytics.fit_garch(changes)
+
+    def test_streamed_bars_match_the_full_history(self):
+        full = anomaly_detector.StreamingAnomalyDetector.from_history(self.times, self.prices, self.params)
+        streamed = anomaly_detector.StreamingAnomalyDetector.from_history(self.times[:500], self.prices[:500], self.params)
+        flags = [streamed.update(t, p) for t, p in zip(self.times[500:], self.prices[500:])]
+
+        volatility = analytics.garch_volatility(np.diff(self.prices), self.params)
+        expected = np.abs(np.diff(self.prices)) > streamed.crit_value * volatility
+        self.assertEqual(flags, expected[499:].tolist())
+        self.assertAlmostEqual(streamed.variance, full.variance)
+        self.assertEqual(streamed.ranges(), full.ranges())
+        self.assertTrue(full.ranges())
+
+    def test_state_survives_a_round_trip_through_the_database(self):
+        detector = anomaly_detector.StreamingAnomalyDetector.from_history(self.times[:700], self.prices[:700], self.params)
+        async_to_sync(anomaly_detector.save_detector)("AAPL", "1d", detector)
+        restored = async_to_sync(anomaly_detector.load_detector)("AAPL", "1d")
+
+        for t, p in zip(self.times[700:], self.prices[700:]):
+            self.assertEqual(restored.update(t, p), detector.update(t, p))
+        self.assertEqual(restored.to_dict(), detector.to_dict())
+        self.assertIsNone(async_to_sync(anomaly_detector.load_detector)("MSFT", "1d"))
+
+
+class StoredUnusualRangesTests(TestCase):
+    def setUp(self):
+        caches[response_cache.alias].clear()
+        caches[analytics.garch_fit_cache.alias].clear()
+        changes = simulate_garch(1, 400, seed=3)[0]
+        self.history = make_history("2023-06-01", periods=401, freq="D")
+        self.history["Close"] = 100 + np.concatenate([[0.0], np.cumsum(changes)])
+
+    def test_ranges_come_from_stored_bars_and_are_cached(self):
+        fake = FakeTicker(self.history)
+        pool = AnalyticsPool(processes=0, max_pending=4, timeout=30)
+        params = {"stockname": "aapl", "period": "max", "interval": "1d"}
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=fake), \
+                mock.patch.object(analytics.garch_fits, "pool", pool):
+            stored = self.client.get("/api/unusual_range/", params).json()
+            history_calls = len(fake.history_calls)
+            again = self.client.get("/api/unusual_range/", params).json()
+            posted = self.client.post("/api/unusual_range/", {"data": {
+                "time": self.history.index.strftime("%Y-%m-%d").tolist(),
+                "price": self.history["Close"].tolist(),
+            }}, content_type="application/json").json()
+
+        self.assertEqual(stored["status_code"], 200)
+        self.assertTrue(stored["unusual_ranges"])
+        self.assertEqual(stored["unusual_ranges"], posted["unusual_ranges"])
+        # The repeated request touches neither yfinance nor the analytics pool.
+        self.assertEqual(again, stored)
+        self.assertEqual(len(fake.history_calls), history_calls)
+        self.assertEqual(pool.stats()["submitted"], 2)
+
+    def test_missing_data_and_stockname_is_rejected(self):
+        response = self.client.post("/api/unusual_range/", {}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_ingest_advances_the_detector_seeded_by_the_anomaly_endpoint(self):
+        pool = AnalyticsPool(processes=0, max_pending=4, timeout=30)
+        params = {"stockname": "aapl", "period": "max", "interval": "1d"}
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=FakeTicker(self.history.iloc[:300])), \
+                mock.patch.object(analytics.garch_fits, "pool", pool):
+            self.client.get("/api/unusual_range/", params)
+        seeded = async_to_sync(anomaly_detector.load_detector)("AAPL", "1d")
+        # The newest (possibly partial) bar is left for the next ingest.
+        self.assertEqual(seeded.last_time, self.history.index[298].tz_localize(None).to_datetime64())
+
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=FakeTicker(self.history)):
+            async_to_sync(fetch_price_yf)("AAPL", "max", "1d")
+        live = async_to_sync(anomaly_detector.load_detector)("AAPL", "1d")
+
+        # Every new bar but the newest went through update(), once.
+        expected = anomaly_detector.StreamingAnomalyDetector.from_dict(seeded.to_dict())
+        times = self.history.index.tz_localize(None).values
+        for t, p in zip(times[299:-1], self.history["Close"].to_numpy()[299:-1]):
+            expected.update(t, p)
+        self.assertEqual(live.to_dict(), expected.to_dict())
+        self.assertEqual(live.last_time, times[-2])
+
+    def test_new_bars_are_flagged_by_the_detector_until_a_refit_is_due(self):
+        pool = AnalyticsPool(processes=0, max_pending=4, timeout=30)
+        params = {"stockname": "aapl", "period": "max", "interval": "1d"}
+
+        def get(bars):
+            caches[response_cache.alias].clear()
+            with mock.patch("stockdata.utils.yf.Ticker", return_value=FakeTicker(self.history.iloc[:bars])), \
+                    mock.patch.object(analytics.garch_fits, "pool", pool), \
+                    mock.patch.object(analytics.garch_fits, "refit_every", 20):
+                return self.client.get("/api/unusual_range/", params).json()
+
+        get(300)
+        fits = pool.stats()["submitted"]
+        served = get(310)
+        # No fit: the stored detector, caught up on a copy, flags the new bars.
+        self.assertEqual(pool.stats()["submitted"], fits)
+        expected = async_to_sync(anomaly_detector.load_detector)("AAPL", "1d")
+        expected.update(self.history.index[309].tz_localize(None).to_datetime64(), self.history["Close"].iloc[309])
+        self.assertEqual(served["unusual_ranges"], [list(r) for r in expected.ranges()])
+
+        # Twenty bars after the fit, the series is fitted again and the detector reseeded.
+        get(321)
+        self.assertGreater(pool.stats()["submitted"], fits)
+        self.assertEqual(async_to_sync(anomaly_detector.load_detector)("AAPL", "1d").updates, 0)
+
+class SeriesUploadTests(SimpleTestCase):
+    def setUp(self):
+        changes = simulate_garch(1, 400, seed=3)[0]
+        self.prices = 100 + np.concatenate([[0.0], np.cumsum(changes)])
+        self.times = np.datetime64("2023-06-01") + np.arange(len(self.prices))
+        self.pool = AnalyticsPool(processes=0, max_pending=4, timeout=30)
+
+    def post(self, body, content_type):
+        with mock.patch.object(analytics.garch_fits, "pool", self.pool):
+            return self.client.post("/api/unusual_range/", body, content_type=content_type)
+
+    def test_raw_binary_body_matches_json(self):
+        epochs = self.times.astype("datetime64[ms]").astype("<i8")
+        raw = epochs.tobytes() + self.prices.astype("<f8").tobytes()
+        times, prices = decode_series(raw, RAW_SERIES_CONTENT_TYPE)
+        np.testing.assert_array_equal(times, self.times)
+        np.testing.assert_array_equal(prices, self.prices)
+
+        posted = self.post(raw, f"{RAW_SERIES_CONTENT_TYPE}; unit=ms").json()
+        as_json = self.post({"data": {
+            "time": self.times.astype(str).tolist(),
+            "price": self.prices.tolist(),
+        }}, "application/json").json()
+
+        self.assertEqual(posted["status_code"], 200)
+        self.assertTrue(posted["unusual_ranges"])
+        self.assertEqual(posted["unusual_ranges"], as_json["unusual_ranges"])
+
+    def test_malformed_binary_body_is_rejected(self):
+        truncated = self.post(b"\x00" * 20, RAW_SERIES_CONTENT_TYPE)
+        bad_unit = self.post(b"\x00" * 32, f"{RAW_SERIES_CONTENT_TYPE}; unit=days")
+
+        self.assertEqual(truncated.status_code, 400)
+        self.assertEqual(bad_unit.status_code, 400)
+
+
+class GarchFitCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches[analytics.garch_fit_cache.alias].clear()
+        self.fits = GarchFitCache(analytics.garch_fit_cache, AnalyticsPool(processes=0, max_pending=4, timeout=30), refit_every=3)
+
+    def volatility(self, changes, ticker="AAPL"):
+        return async_to_sync(self.fits.conditional_volatility)(changes, ticker=ticker, interval="1d")
+
+    def test_unchanged_series_skips_the_fit(self):
+        changes = make_changes(500)
+        first = self.volatility(changes)
+        second = self.volatility(changes)
+
+        self.assertEqual(self.fits.stats(), {"reused": 1, "warm": 0, "fallback": 0, "full": 1})
+        np.testing.assert_allclose(second, first, rtol=1e-10)
+
+    def test_fits_stay_out_of_the_response_cache(self):
+        before, fit_hits = response_cache.stats(), analytics.garch_fit_cache.hits
+        self.volatility(make_changes(500))
+        self.volatility(make_changes(500))
+
+        self.assertEqual(response_cache.stats(), before)
+        self.assertNotEqual(analytics.garch_fit_cache.alias, response_cache.alias)
+        self.assertEqual(analytics.garch_fit_cache.hits, fit_hits + 1)
+
+    def test_new_bars_warm_start_until_refit(self):
+        changes = make_changes(510)
+        self.volatility(changes[:500])
+        with mock.patch("stockdata.analytics.fit_garch", wraps=analytics.fit_garch) as fit:
+            self.volatility(changes[:501])
+            self.volatility(changes[:502])
+            self.volatility(changes[:503])
+
+        self.assertEqual(self.fits.stats(), {"reused": 0, "warm": 2, "fallback": 0, "full": 2})
+        # Warm starts begin from the previous params; the third new bar forces a full refit.
+        self.assertIsNotNone(fit.call_args_list[0].args[1])
+        self.assertEqual(len(fit.call_args_list[2].args), 1)
+
+    def test_rolling_windows_are_refit_as_they_move_on(self):
+        changes = make_changes(520)
+        for start in range(7):
+            self.volatility(changes[start:start + 500])
+
+        # One full fit, two warm starts (one new bar each), then a full refit, and so on.
+        self.assertEqual(self.fits.stats(), {"reused": 0, "warm": 4, "fallback": 0, "full": 3})
+
+    def test_boundary_fits_are_clipped_into_valid_starting_values(self):
+        changes = make_changes(500)
+        boundary = np.array([0.0, 1e6, 0.3, 0.75])
+        start = analytics.feasible_starting_values(changes, boundary)
+        self.assertLessEqual(start[2] + start[3], analytics.GARCH_START_MAX_PERSISTENCE + 1e-12)
+        self.assertLess(start[1], 10 * np.mean((changes - changes.mean()) ** 2))
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", StartingValueWarning)
+            self.assertTrue(analytics.warm_fit_garch(changes, boundary)[2])
+
+    def test_rejected_warm_starts_count_as_fallbacks(self):
+        changes = make_changes(510)
+        self.volatility(changes[:500])
+        with mock.patch("stockdata.analytics.feasible_starting_values", return_value=np.array([0.0, 1.0, 0.6, 0.6])):
+            self.volatility(changes[:501])
+        self.volatility(changes[:502])
+
+        # The fallback was a full fit from arch's own starting values: the next one is warm.
+        self.assertEqual(self.fits.stats(), {"reused": 0, "warm": 1, "fallback": 1, "full": 1})
+
+    def test_unnamed_series_never_warm_start(self):
+        changes = make_changes(510)
+        self.volatility(changes[:500], ticker=None)
+        self.volatility(changes[:501], ticker=None)
+
+        self.assertEqual(self.fits.stats(), {"reused": 0, "warm": 0, "fallback": 0, "full": 2})
+
+
+class AnalyticsPoolTests(SimpleTestCase):
+    def test_full_queue_rejects_and_slow_tasks_time_out(self):
+        pool = AnalyticsPool(processes=0, max_pending=1, timeout=0.05)
+
+        async def burst():
+            return await asyncio.gather(pool.run(time.sleep, 0.2), pool.run(time.sleep, 0.2), return_exceptions=True)
+
+        slow, rejected = async_to_sync(burst)()
+        pool.shutdown()
+
+        self.assertIsInstance(slow, TimeoutError)
+        self.assertIsInstance(rejected, AnalyticsBusy)
+        stats = pool.stats()
+        self.assertEqual((stats["submitted"], stats["rejected"], stats["timed_out"]), (1, 1, 1))
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_fits_run_in_worker_processes(self):
+        pool = AnalyticsPool(processes=1, max_pending=4, timeout=60)
+        changes = make_changes(500)
+        try:
+            params, volatility = async_to_sync(pool.run)(analytics.fit_garch, changes)
+        finally:
+            pool.shutdown()
+
+        expected_params, expected_volatility = analytics.fit_garch(changes)
+        np.testing.assert_allclose(params, expected_params)
+        np.testing.assert_allclose(volatility, expected_volatility)
+        self.assertEqual(pool.stats()["completed"], 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_execution(self):
+        flight = SingleFlight("test")
+        calls = []
+
+        async def upstream(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return {"value": value}
+
+        async def burst():
+            return await asyncio.gather(*(flight.do("AAPL", upstream, 1) for _ in range(5)))
+
+        results = async_to_sync(burst)()
+
+        self.assertEqual(calls, [1])
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(flight.stats(), {"calls": 5, "executions": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_errors_propagate_to_every_caller(self):
+        flight = SingleFlight("test")
+
+        async def upstream():
+            await asyncio.sleep(0.01)
+            raise ValueError("throttled")
+
+        async def burst():
+            return await asyncio.gather(
+                *(flight.do("AAPL", upstream) for _ in range(3)), return_exceptions=True
+            )
+
+        results = async_to_sync(burst)()
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.stats()["executions"], 1)
+
+
+class StockDataLayoutTests(TestCase):
+    def setUp(self):
+        caches[response_cache.alias].clear()
+
+    def get(self, **params):
+        history = make_history("2024-12-30", periods=3, freq="D", base=100.123)
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=FakeTicker(history)):
+            return self.client.get(
+                "/api/stockdata/", {"stockname": "AAPL", "period": "5d", "interval": "1d", **params}
+            ).json()
+
+    def test_row_layout(self):
+        data = self.get()
+
+        self.assertEqual(data["time_series"][0], {"time": "2024-12-30", "close_price": 100.12, "volume": 1000})
+        self.assertEqual(data["fin_data"][0]["pe"], round(100.123 / 6.0, 2))
+        # No fundamentals for 2025 yet: missing values are rendered as null.
+        self.assertIsNone(data["fin_data"][2]["eps"])
+
+    def test_other_methods_are_rejected(self):
+        response = self.client.post("/api/stockdata/")
+
+        self.assertEqual(response.status_code, 405)
+
+    def test_columnar_layout_matches_rows(self):
+        rows = self.get()
+        columns = self.get(layout="columnar")
+
+        self.assertEqual(columns["time_series"]["time"], ["2024-12-30", "2024-12-31", "2025-01-01"])
+        self.assertEqual(columns["time_series"]["close_price"], [row["close_price"] for row in rows["time_series"]])
+        self.assertEqual(columns["fin_data"]["eps"], [row["eps"] for row in rows["fin_data"]])
+
+
+class DownsampleTests(TestCase):
+    def test_extremes_and_jumps_are_kept(self):
+        values = np.sin(np.linspace(0, 20, 5000)) + np.linspace(0, 1, 5000)
+        values[1234] += 5  # a one-bar spike
+        values[3000:] += 2  # a level shift
+
+        keep = downsample_indices(values, 200)
+
+        self.assertLessEqual(len(keep), 200)
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        for position in (0, 1234, 3000, 4999, int(np.argmin(values)), int(np.argmax(values))):
+            self.assertIn(position, keep)
+        np.testing.assert_array_equal(downsample_indices(values[:150], 200), np.arange(150))
+
+    def test_stockdata_max_points(self):
+        caches[response_cache.alias].clear()
+        history = make_history("2020-01-01", periods=600, freq="D")
+        history["Close"] = 100 + np.cumsum(np.random.default_rng(4).normal(0, 1, 600))
+        params = {"stockname": "AAPL", "period": "max", "interval": "1d", "layout": "columnar"}
+        with mock.patch("stockdata.utils.yf.Ticker", return_value=FakeTicker(history)):
+            full = self.client.get("/api/stockdata/", params).json()
+            reduced = self.client.get("/api/stockdata/", {**params, "max_points": 100}).json()
+            too_few = self.client.get("/api/stockdata/", {**params, "max_points": 3}).json()
+
+        series = reduced["time_series"]
+        self.assertLessEqual(len(series["time"]), 100)
+        self.assertEqual(len(reduced["fin_data"]["time"]), len(series["time"]))
+        self.assertEqual(max(series["close_price"]), max(full["time_series"]["close_price"]))
+        self.assertEqual(min(series["close_price"]), min(full["time_series"]["close_price"]))
+        self.assertEqual(series["time"][-1], full["time_series"]["time"][-1])
+        self.assertEqual(too_few["status_code"], 500)
+        # Each max_points level is cached under its own key.
+        cached = response_cache.make_key("stockdata", "AAPL", "max", "1d", 100)
+        self.assertIsNotNone(async_to_sync(response_cache.aget)(cached))
+
+        # A max_points level made from the cached full payload is one hit, not a miss and a hit.
+        before = response_cache.stats()
+        self.client.get("/api/stockdata/", {**params, "max_points": 200})
+        after = response_cache.stats()
+        self.assertEqual((after["hits"] - before["hits"], after["misses"] - before["misses"]), (1, 0))
@@ -6,4 +6,7 @@ urlpatterns = [
     path('api/stockdata/', stock_data_api, name='stock_data_api'),
     path('api/unusual_range/', unusual_ranges_api, name='unusual_range_api'),
     path('api/stock_metadata/', stock_metadata_api, name='stock_metadata_api'),
+    path('api/stock_metadata/batch/', batch_stock_metadata_api, name='batch_stock_metadata_api'),
+    path('api/indicators/', indicators_api, name='indicators_api'),
+    path('api/cache_stats/', cache_stats_api, name='cache_stats_api'),
 ]
@@ -1,272 +1,673 @@
 import asyncio
+import concurrent.futures
+import functools
+import re
 import yfinance as yf
+from asgiref.sync import sync_to_async
 import datetime
 import numpy as np
+import orjson
 import pandas as pd
-import scipy.stats
 
 from django.conf import settings
-from .models import StockData
-from django.db import connection
-from arch import arch_model
+from django.utils import timezone
+from .detector import advance_detector
+from .indicators import compute_indicators, configured_indicators, lookback
+from .models import Fundamentals, FundamentalsCheck, StockData, StockWatermark
+from .singleflight import SingleFlight
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max, Min
+
+
+
+# Blocking yfinance calls run here rather than in the loop's small default executor, so one
+# ASGI process can hold hundreds of concurrent upstream waits.
+UPSTREAM_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=getattr(settings, "STOCKDATA_UPSTREAM_THREADS", 256),
+    thread_name_prefix="upstream",
+)
+
+# Concurrent identical upstream fetches are coalesced into one call per key.
+price_flight = SingleFlight("fetch_price_yf")
+fundamentals_flight = SingleFlight("refresh_fundamentals")
+
+# Yearly statements change a few times a year; re-download them at most once a day.
+FUNDAMENTALS_MAX_AGE = datetime.timedelta(days=1)
+FUNDAMENTALS_FIELDS = ["free_cash_flow", "eps", "profit_margin"]
+
+# Columns refreshed when an incoming bar collides with a stored one.
+UPSERT_FIELDS = [
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "pct_change",
+    "market_cap",
+]
+
+
+def run_upstream(func, *args, **kwargs):
+    """
+    Await a blocking upstream call (yfinance) on the dedicated upstream thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(UPSTREAM_EXECUTOR, functools.partial(func, *args, **kwargs))
+
 
+def normalize_ticker(ticker_symbol):
+    """
+    Canonical form used for the ticker column, so 'aapl ' and 'AAPL' share one series.
+    """
+    return ticker_symbol.strip().upper()
 
 
-async def fetch_price_yf(ticker_symbol="AAPL", period="1d", interval="60m"):
+# yfinance bar size for each supported interval string.
+INTERVAL_DELTAS = {
+    "1m": pd.Timedelta(minutes=1),
+    "2m": pd.Timedelta(minutes=2),
+    "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15),
+    "30m": pd.Timedelta(minutes=30),
+    "60m": pd.Timedelta(hours=1),
+    "90m": pd.Timedelta(minutes=90),
+    "1h": pd.Timedelta(hours=1),
+    "1d": pd.Timedelta(days=1),
+    "5d": pd.Timedelta(days=5),
+    "1wk": pd.Timedelta(weeks=1),
+    "1mo": pd.Timedelta(days=31),
+    "3mo": pd.Timedelta(days=92),
+}
+
+# Holes shorter than this are treated as market closures (overnight, weekends, holidays).
+MIN_GAP_TOLERANCE = pd.Timedelta(days=4)
+
+# Upper bound on hole backfills per request, so a ragged series cannot fan out upstream calls.
+MAX_GAP_BACKFILLS = 5
+
+PERIOD_PATTERN = re.compile(r"^(\d+)(d|wk|mo|y)$")
+
+
+def interval_delta(interval):
     """
-    Asynchronously fetch historical stock data from Yahoo Finance, wipe the existing data,
-    and store the new data in the StockData table. Optimized for speed.
+    Bar size of a yfinance interval string such as '60m' or '1d'.
     """
-    # Wipe the entire StockData table asynchronously.
-    await asyncio.to_thread(reset_table, StockData)
-    print("Existing stock data wiped from the database (yfinance).")
+    try:
+        return INTERVAL_DELTAS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported interval: {interval}")
 
-    # Create a ticker object using yfinance.
-    ticker = yf.Ticker(ticker_symbol)
 
-    # Fetch historical price data, cash flow, and income statement concurrently.
-    data, cf_df, income_stmt_df = await asyncio.gather(
-        asyncio.to_thread(ticker.history, period=period, interval=interval),
-        asyncio.to_thread(ticker.get_cashflow, freq='yearly'),
-        asyncio.to_thread(ticker.get_incomestmt)
-    )
+def gap_tolerance(interval):
+    """
+    Largest spacing between consecutive stored bars that is not treated as a hole.
+    """
+    return max(interval_delta(interval) * 1.5, MIN_GAP_TOLERANCE)
+
+
+def period_start(period, latest):
+    """
+    Earliest timestamp covered by a yfinance ``period`` string, measured back from the
+    newest stored bar. Day periods count sessions (business days), like yfinance does.
+
+    Parameters:
+        period (str): yfinance period, e.g. '1d', '5d', '1mo', '1y', 'ytd' or 'max'.
+        latest (datetime): Timestamp of the newest bar in the series.
+
+    Returns:
+        datetime or None: Naive start of the window, or None for 'max'.
+    """
+    if period == "max":
+        return None
+    session = pd.Timestamp(latest).tz_localize(None).normalize()
+    if period == "ytd":
+        return session.replace(month=1, day=1).to_pydatetime()
+    match = PERIOD_PATTERN.match(period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period}")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        start = session - pd.offsets.BDay(count - 1)
+    elif unit == "wk":
+        start = session - pd.DateOffset(weeks=count)
+    elif unit == "mo":
+        start = session - pd.DateOffset(months=count)
+    else:
+        start = session - pd.DateOffset(years=count)
+    return start.to_pydatetime()
+
+
+def _naive(timestamp):
+    """
+    Drop tzinfo from a stored timestamp. Bars are stored as exchange wall time, which is
+    also how yfinance interprets naive start/end arguments.
+    """
+    return timestamp.replace(tzinfo=None)
+
 
-    # Compute percentage change for the Close price.
-    data['pct_change'] = data['Close'].pct_change(periods=-1).fillna(0) * 100
+def _label_years(labels):
+    """
+    Fiscal year of each financial statement column label (a date, or a plain year as a
+    fallback). Unparseable labels map to NaN.
+    """
+    labels = pd.Index(labels)
+    years = pd.to_datetime(labels, errors="coerce").year.to_numpy(dtype=float)
+    fallback = pd.to_numeric(labels, errors="coerce").to_numpy(dtype=float)
+    return np.where(np.isnan(years), fallback, years)
+
+
+def _by_year(values, years):
+    """
+    Series of ``values`` indexed by fiscal year; later duplicates win, unknown years are dropped.
+    """
+    series = pd.Series(np.asarray(values, dtype=float), index=years)
+    series = series[~np.isnan(years)]
+    return series[~series.index.duplicated(keep="last")]
 
-    # Extract years from the index for vectorized operations.
-    data['year'] = data.index.year
 
-    # Build mappings for free cash flow, EPS, and profit margin.
-    fcf_mapping = {}
+def fundamentals_by_year(cf_df, income_stmt_df):
+    """
+    Yearly free cash flow, EPS and profit margin from yfinance statements, indexed by year.
+    """
+    columns = {}
     if "FreeCashFlow" in cf_df.index:
-        fcf_series = cf_df.loc["FreeCashFlow"]
-        for col in fcf_series.index:
-            try:
-                year = pd.to_datetime(col).year
-            except Exception:
-                try:
-                    year = int(col)
-                except Exception:
-                    continue
-            fcf_mapping[year] = fcf_series[col]
-
-    eps_mapping = {}
-    profit_margin_mapping = {}
-    income_stmt_transposed = income_stmt_df.T
-    for period_label, row in income_stmt_transposed.iterrows():
-        try:
-            year = pd.to_datetime(period_label).year
-        except Exception:
-            try:
-                year = int(period_label)
-            except Exception:
-                continue
-        eps_mapping[year] = row.get("BasicEPS", None)
-        total_revenue = row.get("TotalRevenue", None)
-        gross_profit = row.get("GrossProfit", None)
-        if total_revenue and total_revenue != 0:
-            profit_margin_mapping[year] = gross_profit / total_revenue
-        else:
-            profit_margin_mapping[year] = None
+        fcf = cf_df.loc["FreeCashFlow"]
+        columns["free_cash_flow"] = _by_year(fcf.to_numpy(dtype=float), _label_years(fcf.index))
+
+    income = income_stmt_df.T
+    years = _label_years(income.index)
+    missing = np.full(len(income), np.nan)
+    eps = income["BasicEPS"].to_numpy(dtype=float) if "BasicEPS" in income else missing
+    revenue = income["TotalRevenue"].to_numpy(dtype=float) if "TotalRevenue" in income else missing
+    gross = income["GrossProfit"].to_numpy(dtype=float) if "GrossProfit" in income else missing
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margin = np.where(revenue == 0, np.nan, gross / revenue)
+    columns["eps"] = _by_year(eps, years)
+    columns["profit_margin"] = _by_year(margin, years)
+
+    return pd.DataFrame(columns, columns=FUNDAMENTALS_FIELDS, dtype=float)
 
-    # Map free cash flow, EPS, and profit margin using vectorized operations.
-    data['free_cash_flow'] = data['year'].map(fcf_mapping).fillna(0)
-    data['eps'] = data['year'].map(eps_mapping)
-    data['profit_margin'] = data['year'].map(profit_margin_mapping)
 
-    # Compute market cap and PE ratio.
-    data['market_cap'] = data['Volume'] * data['Close']
-    data['pe'] = data.apply(lambda row: 0 if (row['eps'] in [None, 0]) else row['Close'] / row['eps'], axis=1)
+def derive_bar_columns(data):
+    """
+    Add the derived StockData columns to a yfinance history frame, column-wise.
+
+    Parameters:
+        data (pd.DataFrame): yfinance history with Open/High/Low/Close/Volume columns.
+
+    Returns:
+        pd.DataFrame: ``data`` with pct_change and market_cap columns.
+    """
+    close = data['Close'].to_numpy(dtype=float)
+    volume = data['Volume'].to_numpy(dtype=float)
 
-    # Prepare data for bulk insert.
+    # Forward percentage change: each bar against the next one, 0 for the newest bar.
+    pct_change = np.zeros(len(close))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change[:-1] = (close[:-1] / close[1:] - 1) * 100
+    data['pct_change'] = np.where(np.isnan(pct_change), 0.0, pct_change)
+    data['market_cap'] = volume * close
+    return data
+
+
+def fundamental_columns(years, close, fundamentals):
+    """
+    Join yearly fundamentals onto bars by fiscal year.
+
+    Parameters:
+        years (array-like): Calendar year of every bar.
+        close (array-like): Close price of every bar.
+        fundamentals (pd.DataFrame): Yearly figures indexed by year, as returned by
+            ``fundamentals_by_year`` or ``load_fundamentals``.
+
+    Returns:
+        dict: free_cash_flow, eps, profit_margin and pe arrays aligned with the bars.
+    """
+    close = np.asarray(close, dtype=float)
+    yearly = fundamentals.reindex(np.asarray(years))
+    eps = yearly['eps'].to_numpy(dtype=float)
+    # PE ratio is 0 when EPS is 0 and missing when EPS is unknown.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pe = np.where(eps == 0, 0.0, close / eps)
+    return {
+        "free_cash_flow": np.nan_to_num(yearly['free_cash_flow'].to_numpy(dtype=float), nan=0.0),
+        "eps": eps,
+        "profit_margin": yearly['profit_margin'].to_numpy(dtype=float),
+        "pe": pe,
+    }
+
+
+def _stored(timestamp):
+    """
+    Label a naive exchange wall time the way the DB returns stored bars (as UTC), for ORM
+    lookups and writes.
+    """
+    return timestamp.replace(tzinfo=datetime.timezone.utc)
+
+
+async def _download_bars(ticker, **history_kwargs):
+    """
+    Fetch a slice of price history and derive the stored columns.
+    """
+    data = await run_upstream(ticker.history, **history_kwargs)
+    if data.empty:
+        return data
+    return derive_bar_columns(data)
+
+
+async def refresh_fundamentals(ticker_symbol="AAPL"):
+    """
+    Make sure the stored yearly fundamentals of a ticker are at most a day old.
+
+    Returns:
+        bool: True when the statements were downloaded again.
+    """
+    ticker_symbol = normalize_ticker(ticker_symbol)
+    return await fundamentals_flight.do(ticker_symbol, _refresh_fundamentals, ticker_symbol)
+
+
+async def _refresh_fundamentals(ticker_symbol):
+    check = await FundamentalsCheck.objects.filter(ticker=ticker_symbol).afirst()
+    if check is not None:
+        checked_at = check.checked_at
+    else:
+        # Statements stored before checks were recorded.
+        stored = Fundamentals.objects.filter(ticker=ticker_symbol)
+        checked_at = (await stored.aaggregate(fetched_at=Max("fetched_at")))["fetched_at"]
+    if checked_at is not None and timezone.now() - checked_at < FUNDAMENTALS_MAX_AGE:
+        return False
+
+    # Fetch cash flow and income statement concurrently.
+    ticker = yf.Ticker(ticker_symbol)
+    cf_df, income_stmt_df = await asyncio.gather(
+        run_upstream(ticker.get_cashflow, freq='yearly'),
+        run_upstream(ticker.get_incomestmt)
+    )
+    yearly = fundamentals_by_year(cf_df, income_stmt_df)
+
+    # Tickers without statements (indices, ETFs) store no figures, only the check.
+    now = timezone.now()
     records = [
-        StockData(
-            timestamp=timestamp.to_pydatetime().replace(tzinfo=None),
-            open_price=row['Open'],
-            high_price=row['High'],
-            low_price=row['Low'],
-            close_price=row['Close'],
-            volume=int(row['Volume']),
-            pct_change=row['pct_change'],
-            free_cash_flow=row['free_cash_flow'],
-            eps=row['eps'],
-            profit_margin=row['profit_margin'],
-            market_cap=row['market_cap'],
-            pe=row['pe']
+        Fundamentals(
+            ticker=ticker_symbol,
+            fiscal_year=int(year),
+            fetched_at=now,
+            **{name: None if np.isnan(value) else float(value) for name, value in values.items()},
         )
-        for timestamp, row in data.iterrows()
+        for year, values in yearly.iterrows()
     ]
+    await Fundamentals.objects.abulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=["ticker", "fiscal_year"],
+        update_fields=[*FUNDAMENTALS_FIELDS, "fetched_at"],
+    )
+    await FundamentalsCheck.objects.aupdate_or_create(ticker=ticker_symbol, defaults={"checked_at": now})
+    return True
 
-    # Perform bulk insert.
-    await asyncio.to_thread(StockData.objects.bulk_create, records)
-    print("Stock data fetched from yfinance and stored successfully.")
 
+async def load_fundamentals(ticker_symbol="AAPL"):
+    """
+    Stored yearly fundamentals of a ticker as a DataFrame indexed by fiscal year.
+    """
+    stored = Fundamentals.objects.filter(ticker=normalize_ticker(ticker_symbol))
+    rows = [row async for row in stored.values_list("fiscal_year", *FUNDAMENTALS_FIELDS)]
+    frame = pd.DataFrame.from_records(rows, columns=["fiscal_year", *FUNDAMENTALS_FIELDS])
+    return frame.set_index("fiscal_year").astype(float)
 
-async def fetch_price_av():
-    pass
 
+def _nullable(values):
+    """
+    Column as a Python object array with NaN replaced by None, ready for DB-API parameters.
+    """
+    values = np.asarray(values, dtype=float)
+    column = values.astype(object)
+    column[np.isnan(values)] = None
+    return column
 
-def reset_table(model):
+
+def bar_rows(ticker_symbol, interval, data):
     """
-    Synchronously wipes all rows from the model's table and resets the auto-increment counter.
-    
-    Parameters:
-        model: The Django model class whose table you want to truncate.
+    Build the parameter tuples for ``upsert_bar_rows`` from a derived history frame, one
+    column at a time instead of one model instance per row.
     """
-    table_name = model._meta.db_table  # Get the actual database table name
-    with connection.cursor() as cursor:
-        if connection.vendor == "postgresql":
-            cursor.execute(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE;")
-        elif connection.vendor == "mysql":
-            cursor.execute(f"TRUNCATE TABLE {table_name};")
-        elif connection.vendor == "sqlite":
-            cursor.execute(f"DELETE FROM {table_name};")
-            cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}';")
-        else:
-            cursor.execute(f"DELETE FROM {table_name};")
+    adapt = connection.ops.adapt_datetimefield_value
+    timestamps = [adapt(ts) for ts in data.index.tz_localize(None).to_pydatetime()]
+    volume = data['Volume'].astype("Int64").to_numpy(dtype=object, na_value=None)
+    count = len(data)
+    return list(zip(
+        [ticker_symbol] * count,
+        [interval] * count,
+        timestamps,
+        _nullable(data['Open']),
+        _nullable(data['High']),
+        _nullable(data['Low']),
+        _nullable(data['Close']),
+        [None if v is None else int(v) for v in volume],
+        _nullable(data['pct_change']),
+        _nullable(data['market_cap']),
+    ))
+
+
+def _upsert_sql():
+    """
+    INSERT ... ON CONFLICT statement for StockData bars in the current DB dialect.
+    """
+    quote = connection.ops.quote_name
+    opts = StockData._meta
+    key_fields = ["ticker", "interval", "timestamp"]
+    columns = [quote(opts.get_field(name).column) for name in key_fields + UPSERT_FIELDS]
+    updates = [quote(opts.get_field(name).column) for name in UPSERT_FIELDS]
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO {quote(opts.db_table)} ({', '.join(columns)}) VALUES ({placeholders})"
+    if connection.vendor == "mysql":
+        assignments = ", ".join(f"{col} = VALUES({col})" for col in updates)
+        return f"{sql} ON DUPLICATE KEY UPDATE {assignments}"
+    keys = ", ".join(columns[:len(key_fields)])
+    assignments = ", ".join(f"{col} = EXCLUDED.{col}" for col in updates)
+    return f"{sql} ON CONFLICT ({keys}) DO UPDATE SET {assignments}"
+
+
+def upsert_bar_rows(rows, batch_size=None):
+    """
+    Synchronously upsert ``bar_rows`` output with executemany, in batches of
+    ``STOCKDATA_INGEST_BATCH_SIZE`` rows inside one transaction. No model instances are built.
+    """
+    batch_size = batch_size or getattr(settings, "STOCKDATA_INGEST_BATCH_SIZE", 2000)
+    sql = _upsert_sql()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[offset:offset + batch_size])
 
-import numpy as np
-import pandas as pd
-import scipy.stats
-from arch import arch_model
-from sklearn.ensemble import IsolationForest
-import asyncio
 
-async def unusual_ranges(data, confidence_level=0.05):
+def _indicator_update_sql():
     """
-    Identify unusual date ranges using GARCH-based volatility and a statistical test.
-    No machine learning is used.
+    UPDATE statement setting the materialized indicators of one StockData bar.
     """
-    # Input validation
-    if not data or "time" not in data or "price" not in data:
-        raise ValueError("Data must contain 'time' and 'price' arrays")
-    
-    # Prepare data
-    times = np.array([np.datetime64(t) for t in data["time"]])
-    prices = np.array(data["price"], dtype=float)
-    if len(prices) < 2:
-        raise ValueError("Not enough price data to compute daily changes.")
-    
-    # Compute daily changes and dates
-    daily_changes = np.diff(prices)
-    daily_dates = times[1:]
-    
-    # Fit GARCH model
-    garch_fit = await asyncio.to_thread(
-        lambda: arch_model(daily_changes, vol='Garch', p=1, q=1).fit(disp='off')
+    quote = connection.ops.quote_name
+    opts = StockData._meta
+    key = " AND ".join(
+        f"{quote(opts.get_field(name).column)} = %s" for name in ["ticker", "interval", "timestamp"]
     )
-    forecast = garch_fit.conditional_volatility
-    
-    # Compute critical value for the specified confidence level
-    crit_value = scipy.stats.norm.ppf(1 - confidence_level / 2)
-    
-    # Identify unusual dates using GARCH-based volatility and statistical test
-    mask = (np.abs(daily_changes) > (crit_value * forecast))
-    unusual_dates = daily_dates[mask]
-    
-    if unusual_dates.size == 0:
-        raise Exception("No unusual dates found with the specified threshold.")
-    
-    # Sort the unusual dates
-    unusual_dates = np.sort(unusual_dates)
-    
-    # Compute gaps between consecutive unusual dates
-    gaps = np.diff(unusual_dates)
-    gaps_in_days = gaps.astype('timedelta64[D]').astype(int)
-    
-    # Group unusual dates into ranges based on gaps
-    gap_threshold = np.mean(gaps_in_days) + np.std(gaps_in_days)
-    gap_indices = np.where(gaps_in_days > gap_threshold)[0]
-    
-    if gap_indices.size == 0:
-        ranges = [(unusual_dates[0], unusual_dates[-1])]
-    else:
-        start_indices = np.r_[0, gap_indices + 1]
-        end_indices = np.r_[gap_indices, unusual_dates.size - 1]
-        ranges = [(unusual_dates[s], unusual_dates[e]) for s, e in zip(start_indices, end_indices) if s != e]
-    
-    # Format and adjust ranges
-    max_date = times.max()
-    adjusted_ranges = []
-    for start, end in ranges:
-        if start == end:
-            if start < max_date:
-                end = start + np.timedelta64(2, 'D')
-            else:
-                start = start - np.timedelta64(2, 'D')
-        adjusted_ranges.append((str(start.astype('M8[D]')), str(end.astype('M8[D]'))))
-    
-    return adjusted_ranges
+    return f"UPDATE {quote(opts.db_table)} SET {quote(opts.get_field('indicators').column)} = %s WHERE {key}"
 
 
-async def get_stock_metadata_info(ticker_symbol="AAPL"):
+def write_indicator_rows(rows, batch_size=None):
     """
-    Asynchronously fetch stock metadata using yfinance and extract:
-      - currency
-      - exchangeName
-      - longName
-      - last close price (using 'previousClose')
-    
-    Parameters:
-        ticker_symbol (str): The stock ticker symbol (default "AAPL").
-    
+    Synchronously store (indicators JSON, ticker, interval, timestamp) rows with
+    executemany, in batches inside one transaction.
+    """
+    batch_size = batch_size or getattr(settings, "STOCKDATA_INGEST_BATCH_SIZE", 2000)
+    sql = _indicator_update_sql()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[offset:offset + batch_size])
+
+
+async def update_indicators(ticker_symbol, interval, start=None, end=None, names=None):
+    """
+    Recompute the materialized indicators of the stored bars from ``start`` through
+    ``end`` (aware timestamps; None for the whole series) and of the bars after ``end``
+    whose windows reach back into that stretch.
+
+    Only the ``lookback`` bars before ``start`` are read for context, so an ingest of a
+    few new bars costs a few rows whatever the length of the stored series.
+
     Returns:
-        dict: A dictionary with the extracted information.
+        int: Number of bars whose indicators were written.
     """
+    names = names or configured_indicators()
+    depth = lookback(names)
+    fields = ("timestamp", "close_price")
+    series = StockData.objects.filter(ticker=ticker_symbol, interval=interval)
+
+    before = []
+    if start is not None:
+        context = series.filter(timestamp__lt=start).order_by("-timestamp").values_list(*fields)[:depth]
+        before = [row async for row in context][::-1]
+        series = series.filter(timestamp__gte=start)
+    after = []
+    if end is not None:
+        following = series.filter(timestamp__gt=end).order_by("timestamp").values_list(*fields)[:depth]
+        after = [row async for row in following]
+        series = series.filter(timestamp__lte=end)
+    rows = before + [row async for row in series.order_by("timestamp").values_list(*fields)] + after
+    if len(rows) <= len(before):
+        return 0
+
+    stamps, closes = zip(*rows)
+    columns = compute_indicators(np.array(closes, dtype=float), names)
+    adapt = connection.ops.adapt_datetimefield_value
+    updates = []
+    for i in range(len(before), len(rows)):
+        values = {name: None if np.isnan(column[i]) else float(column[i]) for name, column in columns.items()}
+        updates.append((orjson.dumps(values).decode(), ticker_symbol, interval, adapt(stamps[i])))
+    await sync_to_async(write_indicator_rows)(updates)
+    return len(updates)
+
+
+async def _store_bars(ticker_symbol, interval, data, before=None):
+    """
+    Upsert a downloaded slice into StockData and return the stored (naive) timestamps.
 
-    print("In the util function")
+    When ``before`` is given, rows at or after it are dropped: they are already stored and
+    were only fetched so the preceding row's forward pct_change could be computed.
+    """
+    if before is not None:
+        data = data[data.index.tz_localize(None) < before]
+    if data.empty:
+        return data.index.tz_localize(None)
+
+    # New bars are inserted, bars already stored are refreshed in place.
+    await sync_to_async(upsert_bar_rows)(bar_rows(ticker_symbol, interval, data))
+    stamps = data.index.tz_localize(None)
+    # Then the indicators of the stored bars these change.
+    await update_indicators(ticker_symbol, interval, _stored(stamps[0]), _stored(stamps[-1]))
+    # And the streaming anomaly detector of the series, if it has one, takes the new bars.
+    await advance_detector(ticker_symbol, interval)
+    return stamps
+
+
+async def _refresh_watermark(ticker_symbol, interval, **fields):
+    """
+    Recompute the stored bounds of a series and save them on its watermark.
+    """
+    bounds = await StockData.objects.filter(ticker=ticker_symbol, interval=interval).aaggregate(
+        first=Min("timestamp"), last=Max("timestamp")
+    )
+    if bounds["last"] is None:
+        return None
+    values = {
+        "first_timestamp": bounds["first"],
+        "last_timestamp": bounds["last"],
+        "updated_at": timezone.now(),
+        **fields,
+    }
+    # Plain UPDATE-then-INSERT rather than update_or_create: its SELECT ... FOR UPDATE
+    # transaction cannot upgrade its lock on SQLite while another request is writing.
+    series = StockWatermark.objects.filter(ticker=ticker_symbol, interval=interval)
+    if not await series.aupdate(**values):
+        try:
+            return await StockWatermark.objects.acreate(ticker=ticker_symbol, interval=interval, **values)
+        except IntegrityError:
+            # A concurrent request created it first.
+            await series.aupdate(**values)
+    return await series.aget()
 
-    # Create the Ticker object.
-    ticker = yf.Ticker(ticker_symbol)
 
-    test_data = ticker.get_history_metadata()
+async def _find_gaps(ticker_symbol, interval, since):
+    """
+    Return (before, after) pairs of consecutive stored bars further apart than the gap tolerance.
+    """
+    timestamps = StockData.objects.filter(
+        ticker=ticker_symbol, interval=interval, timestamp__gte=since
+    ).order_by("timestamp").values_list("timestamp", flat=True)
+    stamps = pd.DatetimeIndex([ts async for ts in timestamps])
+    if len(stamps) < 2:
+        return []
+    holes = np.flatnonzero(np.diff(stamps.asi8) > gap_tolerance(interval).value)
+    return [(stamps[i].to_pydatetime(), stamps[i + 1].to_pydatetime()) for i in holes]
 
-    print("test data fetched")
 
-    # Run the synchronous call in a separate thread.
-    metadata = await asyncio.to_thread(ticker.get_history_metadata)
-    
-    print("metadata fetched")
-
-    # Navigate the nested metadata structure.
-    # Typically the useful info is nested inside the 'chart' key.
-    currency = metadata["currency"]
-    exchangeName = metadata["fullExchangeName"]
-    longName = metadata["longName"]
-    hist = ticker.history(period="1d")
-    lastClose = hist.index[-1].date()  
-    # Calculate monthly percentage change:
-    # Retrieve approximately 35 days of data to cover "30 days ago".
-    hist_month = await asyncio.to_thread(ticker.history, period="35d")
-
-    print("hist month fetched")
-
-    if not hist_month.empty:
-        price_today_month = hist_month["Close"].iloc[-1]
-        price_30_days_ago = hist_month["Close"].iloc[0]
-        monthly_pct_change = (price_today_month / price_30_days_ago) - 1
-    else:
-        monthly_pct_change = None
+async def fetch_price_yf(ticker_symbol="AAPL", period="1d", interval="60m"):
+    """
+    Single-flight entry point for ``_fetch_price_yf``: concurrent calls for the same
+    (ticker, period, interval) share one upstream refresh and its result.
+    """
+    ticker_symbol = normalize_ticker(ticker_symbol)
+    return await price_flight.do(
+        (ticker_symbol, period, interval), _fetch_price_yf, ticker_symbol, period, interval
+    )
+
+
+async def _fetch_price_yf(ticker_symbol, period, interval):
+    """
+    Asynchronously bring the stored (ticker, interval) series up to date and make sure it
+    covers the requested period. Rows are upserted into StockData, keyed by
+    (ticker, interval, timestamp), and kept across requests.
 
-    # Calculate annual percentage change:
-    # Retrieve approximately 400 days of data to cover "365 days ago".
-    hist_year = await asyncio.to_thread(ticker.history, period="400d")
+    A series seen for the first time is downloaded for the whole ``period``. After that only
+    bars newer than the series watermark are requested, the window is backfilled when the
+    requested period reaches further back than what is stored, and holes inside the window
+    are detected and backfilled once.
 
-    print("hist year fetched")
+    Returns:
+        dict or None: ``window_start`` (earliest timestamp of the requested period, None for
+        'max'), ``cache_bars`` and ``upstream_bars`` (how many bars in the window were served
+        from the store vs. downloaded by this call). None if yfinance returned no data.
+    """
+    ticker_symbol = normalize_ticker(ticker_symbol)
+    step = interval_delta(interval)
 
-    if not hist_year.empty:
-        price_today_year = hist_year["Close"].iloc[-1]
-        price_365_days_ago = hist_year["Close"].iloc[0]
-        yearly_pct_change = (price_today_year / price_365_days_ago) - 1
+    # Create a ticker object using yfinance.
+    ticker = yf.Ticker(ticker_symbol)
+    fetched = []
+
+    watermark = await StockWatermark.objects.filter(ticker=ticker_symbol, interval=interval).afirst()
+
+    if watermark is None:
+        # Cold series: download the whole requested period.
+        data = await _download_bars(ticker, period=period, interval=interval)
+        if data.empty:
+            return None
+        fetched.append(await _store_bars(ticker_symbol, interval, data))
+        latest = data.index[-1].tz_localize(None)
+        watermark = await _refresh_watermark(
+            ticker_symbol,
+            interval,
+            covered_from=_stored(period_start(period, latest) or latest),
+            covers_inception=(period == "max"),
+        )
     else:
-        yearly_pct_change = None
+        # Delta: re-request the newest stored bar (it may have been a partial bar) and
+        # everything after it.
+        data = await _download_bars(
+            ticker, start=_naive(watermark.last_timestamp), interval=interval
+        )
+        fetched.append(await _store_bars(ticker_symbol, interval, data))
+        watermark = await _refresh_watermark(ticker_symbol, interval)
+
+    window_start = period_start(period, watermark.last_timestamp)
+
+    # Backfill: the requested period reaches further back than the stored series.
+    if not watermark.covers_inception:
+        first = _naive(watermark.first_timestamp)
+        if window_start is None:
+            data = await _download_bars(ticker, period="max", interval=interval)
+            fetched.append(await _store_bars(ticker_symbol, interval, data))
+            watermark = await _refresh_watermark(
+                ticker_symbol, interval, covers_inception=True
+            )
+        elif window_start < _naive(watermark.covered_from):
+            # Overlap the first stored bar so the last backfilled row gets its pct_change.
+            data = await _download_bars(
+                ticker, start=window_start, end=first + step, interval=interval
+            )
+            fetched.append(await _store_bars(ticker_symbol, interval, data, before=first))
+            watermark = await _refresh_watermark(
+                ticker_symbol, interval, covered_from=_stored(window_start)
+            )
+
+    # Gap detection: scan the part of the window not checked before and backfill holes.
+    scan_from = window_start or _naive(watermark.first_timestamp)
+    if watermark.gaps_checked_through is not None:
+        scan_from = max(scan_from, _naive(watermark.gaps_checked_through))
+    gaps = await _find_gaps(ticker_symbol, interval, _stored(scan_from))
+    for before, after in gaps[:MAX_GAP_BACKFILLS]:
+        data = await _download_bars(
+            ticker, start=_naive(before), end=_naive(after) + step, interval=interval
+        )
+        fetched.append(await _store_bars(ticker_symbol, interval, data, before=_naive(after)))
+    # Holes beyond the cap are left for the next requests: only mark the series checked up
+    # to the last hole backfilled.
+    checked_through = gaps[MAX_GAP_BACKFILLS - 1][1] if len(gaps) > MAX_GAP_BACKFILLS else watermark.last_timestamp
+    watermark = await _refresh_watermark(
+        ticker_symbol, interval, gaps_checked_through=checked_through
+    )
 
+    window_filter = {"ticker": ticker_symbol, "interval": interval}
+    if window_start is not None:
+        window_filter["timestamp__gte"] = _stored(window_start)
+    window_bars = await StockData.objects.filter(**window_filter).acount()
+    fetched = pd.DatetimeIndex([]).append(fetched).unique()
+    if window_start is not None:
+        fetched = fetched[fetched >= window_start]
+    upstream_bars = len(fetched)
+
+    print(f"Stock data for {ticker_symbol} ({interval}): {upstream_bars} bars from yfinance, "
+          f"{window_bars - upstream_bars} from the store.")
     return {
-        "currency": currency,
-        "exchangeName": exchangeName,
-        "longName": longName,
-        "lastClose": lastClose,
-        "montly_pct_change": monthly_pct_change,
-        "yearly_pct_change": yearly_pct_change
-    }
\ No newline at end of file
+        "window_start": _stored(window_start) if window_start is not None else None,
+        "cache_bars": window_bars - upstream_bars,
+        "upstream_bars": upstream_bars,
+    }
+
+
+async def load_closes(ticker_symbol, interval, since=None):
+    """
+    Stored close prices of a series as NumPy arrays, oldest first.
+
+    Parameters:
+        ticker_symbol (str): Normalized ticker symbol.
+        interval (str): Bar interval.
+        since (datetime, optional): Only bars at or after this (aware) timestamp.
+
+    Returns:
+        tuple: (datetime64[ns] exchange wall times, float64 close prices); bars without a
+        close are left out.
+    """
+    bars = StockData.objects.filter(ticker=ticker_symbol, interval=interval, close_price__isnull=False)
+    if since is not None:
+        bars = bars.filter(timestamp__gte=since)
+    rows = [row async for row in bars.order_by("timestamp").values_list("timestamp", "close_price")]
+    if not rows:
+        return np.array([], dtype="datetime64[ns]"), np.array([], dtype=float)
+    stamps, closes = zip(*rows)
+    stamps = pd.DatetimeIndex(stamps)
+    if stamps.tz is not None:
+        stamps = stamps.tz_convert(None)
+    return stamps.values, np.array(closes, dtype=float)
+
+
+async def fetch_price_av():
+    pass
+
+
+def reset_table(model):
+    """
+    Synchronously wipes all rows from the model's table and resets the auto-increment counter.
+    
+    Parameters:
+        model: The Django model class whose table you want to truncate.
+    """
+    table_name = model._meta.db_table  # Get the actual database table name
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE;")
+        elif connection.vendor == "mysql":
+            cursor.execute(f"TRUNCATE TABLE {table_name};")
+        elif connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {table_name};")
+            cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}';")
+        else:
+            cursor.execute(f"DELETE FROM {table_name};")
@@ -1,77 +1,182 @@
-from asgiref.sync import async_to_sync, sync_to_async
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from stockcompass.api import async_api_view, json_body, json_response
 from .utils import *
+from newsdata.market_direction import market_events
+from .analytics import detect_unusual_ranges, garch_fits, stored_unusual_ranges
+from .cache import interval_ttl, response_cache
+from .downsample import MIN_MAX_POINTS, downsample_indices, take
+from .pool import AnalyticsBusy, analytics_pool
+from .metadata import MAX_BATCH_TICKERS, get_batch_metadata, get_stock_metadata_info, metadata_flight
 from .models import StockData
-from .serializers import StockDataSerializer
-from datetime import datetime
+from .series_codec import BINARY_SERIES_CONTENT_TYPES, decode_json_series, decode_series
 
+# Numeric fields of each payload section, with the decimals they are rounded to.
+TIME_SERIES_FIELDS = {"close_price": 2}
+FIN_DATA_FIELDS = {
+    "free_cash_flow": 3,
+    "eps": 2,
+    "profit_margin": 2,
+    "market_cap": 2,
+    "pct_change": 2,
+    "pe": 2,
+}
+# Fin data fields stored per bar; the rest are joined from the yearly fundamentals.
+STORED_FIN_FIELDS = ["market_cap", "pct_change"]
+PAYLOAD_LAYOUTS = ("rows", "columnar")
 
-@api_view(['GET'])
-def stock_data_api(request):
-    # Wrap the async view so that it runs synchronously.
-    return async_to_sync(async_stock_data_api)(request)
 
-async def async_stock_data_api(request):
+@async_api_view(['GET'])
+async def stock_data_api(request):
     try:
         # Get parameters with defaults if not provided
-        stock_name = request.query_params.get('stockname', 'AAPL')
-        period = request.query_params.get('period', '1d')
-        interval = request.query_params.get('interval', '60m')
-    
-        # Call the async data fetching function
-        await fetch_price_yf(ticker_symbol=stock_name, period=period, interval=interval)
-    
-        # Retrieve all stored stock data asynchronously
-        stock_data = await sync_to_async(list)(StockData.objects.all().order_by('timestamp'))
-    
-        # Serialize the data
-        serializer = StockDataSerializer(stock_data, many=True)
-    
-        # Format the data:
-        # - Format time to "YYYY-MM-DD"
-        # - Round numeric fields to 2 decimal places (if not None)
-        time_series = [
-            {
-                "time": datetime.fromisoformat(item["timestamp"].replace('Z','')).strftime("%Y-%m-%d"),
-                "close_price": round(item["close_price"], 2) if item["close_price"] is not None else None,
-                "volume": item["volume"],
+        stock_name = request.GET.get('stockname', 'AAPL')
+        period = request.GET.get('period', '1d')
+        interval = request.GET.get('interval', '60m')
+        layout = request.GET.get('layout', 'rows')
+        if layout not in PAYLOAD_LAYOUTS:
+            raise ValueError(f"Unsupported layout: {layout}")
+        max_points = request.GET.get('max_points')
+        if max_points is not None:
+            max_points = int(max_points)
+            if max_points < MIN_MAX_POINTS:
+                raise ValueError(f"max_points must be at least {MIN_MAX_POINTS}")
 
+        # Serve the finished payload from the response cache while it is fresh. Downsampled
+        # payloads are cached per max_points, next to the full one they are made from.
+        full_key = response_cache.make_key("stockdata", normalize_ticker(stock_name), period, interval)
+        cache_key = full_key if max_points is None else response_cache.make_key(
+            "stockdata", normalize_ticker(stock_name), period, interval, max_points
+        )
+        # One lookup in the cache stats, whichever of the two keys answers.
+        hit_key, response_data = await response_cache.aget_first(*dict.fromkeys([cache_key, full_key]))
+        if hit_key != cache_key and response_data is not None:
+            response_data = downsample_payload(response_data, max_points)
+            await response_cache.aset(cache_key, response_data, interval_ttl(interval))
+        if response_data is not None:
+            # Everything in a cached payload was served without touching the store or yfinance.
+            response_data["source"] = {
+                "cache_bars": len(response_data["time_series"]["time"]),
+                "upstream_bars": 0,
             }
-            for item in serializer.data
-        ]
-        fin_data = [
-            {
-                "time": datetime.fromisoformat(item["timestamp"].replace('Z','')).strftime("%Y-%m-%d"),
-                "free_cash_flow": round(item["free_cash_flow"], 3) if item["free_cash_flow"] is not None else None,
-                "eps": round(item["eps"], 2) if item["eps"] is not None else None,
-                "profit_margin": round(item["profit_margin"], 2) if item["profit_margin"] is not None else None,
-                "market_cap": round(item["market_cap"], 2) if item["market_cap"] is not None else None,
-                "pct_change": round(item["pct_change"], 2) if item["pct_change"] is not None else None,
-                "pe": round(item["pe"], 2) if item["pe"] is not None else None,
-            }
-            for item in serializer.data
-        ]
-    
-        # Prepare the final response data
-        response_data = {
-            "status_code": 200,
-            "time_series": time_series,
-            "fin_data": fin_data,
-        }
+        else:
+            response_data = await build_stock_data_payload(stock_name, period, interval)
+            await response_cache.aset(full_key, response_data, interval_ttl(interval))
+            if max_points is not None:
+                response_data = downsample_payload(response_data, max_points)
+                await response_cache.aset(cache_key, response_data, interval_ttl(interval))
     except Exception as e:
         # If an exception occurs, return an error status and message.
-        response_data = {
+        return json_response({
             "status_code": 500,
             "error": str(e)
+        })
+
+    if layout == "rows":
+        response_data["time_series"] = columns_to_rows(response_data["time_series"])
+        response_data["fin_data"] = columns_to_rows(response_data["fin_data"])
+    return json_response(response_data)
+
+async def build_stock_data_payload(stock_name, period, interval):
+    """
+    Bring the stored series up to date and build the columnar stock data payload for it:
+    each section maps field names to equally long arrays (missing values are NaN and
+    render as null).
+    """
+    # Update the bars and, at most daily, the yearly fundamentals concurrently
+    fetch_result, _ = await asyncio.gather(
+        fetch_price_yf(ticker_symbol=stock_name, period=period, interval=interval),
+        refresh_fundamentals(stock_name),
+    )
+
+    # Read the stored bars for this ticker/interval inside the requested period as plain tuples
+    fields = ["timestamp", "volume", *TIME_SERIES_FIELDS, *STORED_FIN_FIELDS]
+    rows = []
+    source = {"cache_bars": 0, "upstream_bars": 0}
+    if fetch_result is not None:
+        window = StockData.objects.filter(ticker=normalize_ticker(stock_name), interval=interval)
+        if fetch_result["window_start"] is not None:
+            window = window.filter(timestamp__gte=fetch_result["window_start"])
+        rows = [row async for row in window.order_by('timestamp').values_list(*fields)]
+        source = {
+            "cache_bars": fetch_result["cache_bars"],
+            "upstream_bars": fetch_result["upstream_bars"],
         }
-    
-    return Response(response_data)
+    columns = dict(zip(fields, zip(*rows))) if rows else {field: () for field in fields}
+
+    # Format time to "YYYY-MM-DD" and round numeric fields, one column at a time.
+    stamps = pd.DatetimeIndex(columns["timestamp"])
+    if stamps.tz is not None:
+        stamps = stamps.tz_convert(None)
+    time = stamps.values.astype("datetime64[D]").astype(str).tolist()
+
+    # Join the fundamentals of each bar's fiscal year (and the PE derived from them).
+    fin_columns = {name: columns[name] for name in STORED_FIN_FIELDS}
+    fin_columns.update(fundamental_columns(
+        stamps.year, np.array(columns["close_price"], dtype=float), await load_fundamentals(stock_name)
+    ))
+
+    return {
+        "status_code": 200,
+        "time_series": {
+            "time": time,
+            **{name: _round_column(columns[name], decimals) for name, decimals in TIME_SERIES_FIELDS.items()},
+            "volume": _volume_column(columns["volume"]),
+        },
+        "fin_data": {
+            "time": time,
+            **{name: _round_column(fin_columns[name], decimals) for name, decimals in FIN_DATA_FIELDS.items()},
+        },
+        "source": source,
+    }
 
-@api_view(['POST'])
-def unusual_ranges_api(request):
+def downsample_payload(payload, max_points):
+    """
+    Columnar stock data payload reduced to at most ``max_points`` bars, picked on the close
+    price so extremes and jumps are kept (see ``downsample``).
+    """
+    time_series = payload["time_series"]
+    positions = downsample_indices(time_series["close_price"], max_points)
+    return {
+        **payload,
+        "time_series": {name: take(column, positions) for name, column in time_series.items()},
+        "fin_data": {name: take(column, positions) for name, column in payload["fin_data"].items()},
+    }
+
+def _round_column(values, decimals):
+    """
+    Float column rounded to ``decimals`` places; None becomes NaN (rendered as null).
+    """
+    return np.round(np.array(values, dtype=float), decimals)
+
+def _volume_column(values):
+    """
+    Integer column when complete, otherwise a list keeping None for missing volumes.
+    """
+    if None in values:
+        return list(values)
+    return np.array(values, dtype=np.int64)
+
+def columns_to_rows(columns):
+    """
+    Turn a columnar payload section into the row layout: one dict per bar.
+    """
+    names = list(columns)
+    values = [
+        column.tolist() if isinstance(column, np.ndarray) else column
+        for column in columns.values()
+    ]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+@async_api_view(['GET', 'POST'])
+async def unusual_ranges_api(request):
     """
     API endpoint to calculate unusual date ranges.
+
+    Either for a stored series, read server-side from the stock data store:
+        GET /api/unusual_range/?stockname=AAPL&period=1y&interval=1d
+        (or the same fields in a POST body without "data"; period defaults to "1y",
+        interval to "1d")
+
+    or for posted prices:
     
     Expected request JSON structure:
     {
@@ -79,9 +184,23 @@ def unusual_ranges_api(request):
             "2025-01-01": [0.05],
             "2025-01-02": [0.02],
             ...
-        }
+        },
+        "stockname": "AAPL",   (optional, enables cached/warm-started GARCH fits)
+        "interval": "1d"       (optional, defaults to "1d" when stockname is given)
     }
+
+    Long posted series can instead be sent as a binary body (see ``series_codec``), with
+    stockname and interval in the query string:
+        POST /api/unusual_range/?stockname=AAPL&interval=1d
+        Content-Type: application/x-price-series; unit=ms
+        (N int64 epoch times, then N float64 prices)
+    or Content-Type: application/vnd.apache.arrow.stream (needs pyarrow on the server).
     
+    With "market" (an index symbol such as "^GSPC", in the body or query string) every
+    range is also compared with that index (see ``market_direction.event_study``) and
+    the response gains "events"; "exclude_market_moves": true additionally drops the
+    ranges the market explains.
+
     Response JSON structure on success:
     {
         "status_code": 200,
@@ -89,31 +208,83 @@ def unusual_ranges_api(request):
             [ "2025-01-10", "2025-01-15" ],
             [ "2025-02-03", "2025-02-04" ],
             ...
+        ],
+        "events": [            (only with "market")
+            {"start": "2025-01-10", "end": "2025-01-15", "stock_return": -0.08,
+             "market_return": -0.01, "beta": 1.2, "abnormal_return": -0.065,
+             "t_stat": -3.1, "same_direction": true, "market_driven": false},
+            ...
         ]
     }
     
-    On error, it returns a 500 status with the error message.
+    On error, it returns a 500 status with the error message (503 when the analytics
+    queue is full, 504 when the computation timed out).
     """
-    # Extract input data from the request body.
-    input_data = request.data.get('data', None)
-    if input_data is None:
-        return Response({"status_code": 400, "error": "Missing 'data' in request"}, status=400)
-    
+    # Extract input data from the query string or the request body.
+    series = None
+    if request.method == 'GET':
+        body = request.GET
+    elif request.content_type in BINARY_SERIES_CONTENT_TYPES:
+        # Binary series upload; the other fields come from the query string.
+        body = request.GET
+        try:
+            series = decode_series(request.body, request.content_type, request.content_params.get('unit'))
+        except ValueError as e:
+            return json_response({"status_code": 400, "error": str(e)}, status=400)
+    else:
+        try:
+            body = json_body(request)
+        except ValueError:
+            return json_response({"status_code": 400, "error": "Malformed JSON body"}, status=400)
+    input_data = body.get('data', None)
+    stock_name = body.get('stockname')
+    if series is None and input_data is None and not stock_name:
+        return json_response({"status_code": 400, "error": "Missing 'data' or 'stockname' in request"}, status=400)
+
     try:
-        # Call the async unusual_ranges function using async_to_sync.
-        ranges = async_to_sync(unusual_ranges)(input_data)
-        return Response({
+        ticker = normalize_ticker(stock_name) if stock_name else None
+        interval = body.get('interval', '1d') if ticker else None
+        if series is None and input_data is not None:
+            series = decode_json_series(input_data)
+        if series is not None:
+            ranges = await detect_unusual_ranges(*series, ticker=ticker, interval=interval)
+        else:
+            ranges = await stored_unusual_ranges(stock_name, period=body.get('period', '1y'), interval=interval)
+        response_data = {
             "status_code": 200,
             "unusual_ranges": ranges
-        })
+        }
+
+        # Compare every range with the market in one pass, optionally dropping the ranges
+        # the market explains before any news is looked up for them.
+        market = body.get('market')
+        if market:
+            if series is None:
+                series = await load_closes(ticker, interval)
+            events = await market_events(*series, ranges, index_symbol=market)
+            if body.get('exclude_market_moves') in (True, 'true', '1'):
+                events = [event for event in events if not event["market_driven"]]
+                response_data["unusual_ranges"] = [[event["start"], event["end"]] for event in events]
+            response_data["events"] = events
+        return json_response(response_data)
+    except AnalyticsBusy as e:
+        return json_response({
+            "status_code": 503,
+            "error": str(e)
+        }, status=503)
+    except TimeoutError as e:
+        return json_response({
+            "status_code": 504,
+            "error": str(e)
+        }, status=504)
     except Exception as e:
-        return Response({
+        return json_response({
             "status_code": 500,
             "error": str(e)
         }, status=500)
     
-@api_view(["GET"])
-def stock_metadata_api(request):
+@async_api_view(["GET"])
+async def stock_metadata_api(request):
     """
     API endpoint to fetch stock metadata.
 
@@ -126,24 +297,147 @@ def stock_metadata_api(request):
         - exchangeName
         - longName
         - lastClose
+        - montly_pct_change
+        - yearly_pct_change
     """
     # Get the ticker symbol from query parameters (default to AAPL)
-    ticker_symbol = request.query_params.get("stockname", "AAPL")
-    print(ticker_symbol)
+    ticker_symbol = request.GET.get("stockname", "AAPL")
     
     try:
-        # Wrap the async function to run synchronously.
-
-        print("ready to get metadata")
-
-        data = async_to_sync(get_stock_metadata_info)(ticker_symbol)
+        data = await get_stock_metadata_info(ticker_symbol)
         response_data = {
             "status_code": 200,
             "metadata": data
         }
-        return Response(response_data, status=200)
+        return json_response(response_data, status=200)
+    except Exception as e:
+        return json_response({
+            "status_code": 500,
+            "error": str(e)
+        }, status=500)
+
+@async_api_view(["GET"])
+async def batch_stock_metadata_api(request):
+    """
+    API endpoint to fetch the metadata of a whole watchlist in one request.
+
+    Query Parameters:
+      - stocknames: Comma-separated ticker symbols, e.g. "AAPL,MSFT,NVDA".
+
+    Returns:
+      JSON response containing:
+        - metadata: ticker -> the fields returned by /api/stock_metadata/
+        - errors: ticker -> message, for tickers that could not be served
+    """
+    ticker_symbols = [name for name in request.GET.get("stocknames", "").split(",") if name.strip()]
+    if not ticker_symbols:
+        return json_response({"status_code": 400, "error": "No stocknames provided"}, status=400)
+    if len(ticker_symbols) > MAX_BATCH_TICKERS:
+        return json_response({
+            "status_code": 400,
+            "error": f"At most {MAX_BATCH_TICKERS} stocknames per request"
+        }, status=400)
+
+    try:
+        data, errors = await get_batch_metadata(ticker_symbols)
+        return json_response({
+            "status_code": 200,
+            "metadata": data,
+            "errors": errors
+        }, status=200)
+    except Exception as e:
+        return json_response({
+            "status_code": 500,
+            "error": str(e)
+        }, status=500)
+
+@async_api_view(["GET"])
+async def indicators_api(request):
+    """
+    API endpoint serving the rolling indicators materialized for a stored series.
+
+    Query Parameters:
+      - stockname (optional): The stock ticker symbol (default "AAPL").
+      - period, interval (optional): As for /api/stockdata/ (defaults "1d" and "60m").
+      - names (optional): Comma-separated indicator names, e.g. "sma_20,rsi_14"
+        (default: all configured indicators).
+
+    Returns:
+      JSON response containing "indicators": {"time": [...], "<name>": [...], ...}, one
+      entry per bar (null until an indicator has a full window).
+    """
+    stock_name = request.GET.get('stockname', 'AAPL')
+    period = request.GET.get('period', '1d')
+    interval = request.GET.get('interval', '60m')
+    names = [name for name in request.GET.get('names', '').split(',') if name.strip()]
+    try:
+        configured = configured_indicators()
+        unknown = [name for name in names if name not in configured]
+        if unknown:
+            return json_response({
+                "status_code": 400,
+                "error": f"Indicators not materialized: {', '.join(unknown)}"
+            }, status=400)
+
+        # Same freshness as the price payload: cached until the next bar can change.
+        cache_key = response_cache.make_key("indicators", normalize_ticker(stock_name), period, interval)
+        columns = await response_cache.aget(cache_key)
+        if columns is None:
+            columns = await build_indicator_payload(stock_name, period, interval, configured)
+            await response_cache.aset(cache_key, columns, interval_ttl(interval))
     except Exception as e:
-        return Response({
+        return json_response({
             "status_code": 500,
             "error": str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+    return json_response({
+        "status_code": 200,
+        "indicators": {"time": columns["time"], **{name: columns[name] for name in names or configured}},
+    })
+
+async def build_indicator_payload(stock_name, period, interval, names):
+    """
+    Bring the stored series up to date (which refreshes its indicators) and read the
+    indicator columns of the requested period.
+    """
+    fetch_result = await fetch_price_yf(ticker_symbol=stock_name, period=period, interval=interval)
+    rows = []
+    if fetch_result is not None:
+        window = StockData.objects.filter(ticker=normalize_ticker(stock_name), interval=interval)
+        if fetch_result["window_start"] is not None:
+            window = window.filter(timestamp__gte=fetch_result["window_start"])
+        rows = [row async for row in window.order_by('timestamp').values_list("timestamp", "indicators")]
+
+    stamps = pd.DatetimeIndex([stamp for stamp, _ in rows])
+    if stamps.tz is not None:
+        stamps = stamps.tz_convert(None)
+    columns = {"time": stamps.values.astype("datetime64[D]").astype(str).tolist()}
+    for name in names:
+        columns[name] = np.array(
+            [np.nan if not values or values.get(name) is None else values[name] for _, values in rows],
+            dtype=float,
+        )
+    return columns
+
+@async_api_view(["GET"])
+async def cache_stats_api(request):
+    """
+    API endpoint exposing the per-process response cache and single-flight counters.
+
+    Returns:
+      JSON response containing:
+        - response_cache: hits, misses and hit_rate of the stock data response cache
+        - garch_fits: GARCH fits reused, warm-started and run from scratch
+        - analytics_pool: queue depth, task outcomes and queue wait times of the analytics pool
+        - singleflight: calls, executions and coalesced callers per upstream fetcher
+    """
+    return json_response({
+        "status_code": 200,
+        "response_cache": response_cache.stats(),
+        "garch_fits": {**garch_fits.stats(), "cache": garch_fits.cache.stats()},
+        "analytics_pool": analytics_pool.stats(),
+        "singleflight": {
+            flight.name: flight.stats() for flight in (price_flight, fundamentals_flight, metadata_flight)
+        },
+    })
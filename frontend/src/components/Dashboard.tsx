@@ -288,7 +288,10 @@ export default function Dashboard() {
           ),
           price: displayChartData.map(item => Number(item.close_price)),
           volume: displayChartData.map(item => Number(item.volume))
-        }
+        },
+        // Lets the backend reuse and warm-start its GARCH fits for this series
+        stockname: ticker,
+        interval: "1d"
       };
 
       console.log("Fetching unusual ranges with:", requestBody);
@@ -327,7 +330,7 @@ export default function Dashboard() {
       setEventRanges([]);
       setShowEventHighlights(false);
     }
-  }, [displayChartData]);
+  }, [displayChartData, ticker]);
 
   // 1) Add extra state:
   const [shouldAnalyzeEvents, setShouldAnalyzeEvents] = useState(false);